@@ -1,9 +1,13 @@
+import atexit
 from flask import Flask, render_template
 from config import config
 import logging
 from logging.handlers import RotatingFileHandler
+import multiprocessing
 import os
-from app.extensions import db, login_manager
+from app.extensions import db, login_manager, migrate
+from app.blobstore import init_blob_store
+from app.stats import ensure_counters
 from app.scheduler import create_scheduler, validate_scheduler_config, TaskScheduler
 
 # 全局scheduler实例
@@ -70,7 +74,9 @@ def create_app(config_name='default'):
 
     # 初始化扩展
     db.init_app(app)
+    migrate.init_app(app, db)
     login_manager.init_app(app)
+    init_blob_store(app)
 
     # 配置日志
     if not app.debug:
@@ -95,30 +101,37 @@ def create_app(config_name='default'):
     app.register_blueprint(tasks_bp)
     app.register_blueprint(auth_bp)
 
+    # 注册命令行命令
+    from app.commands import register_commands
+    register_commands(app)
+
     # 创建数据库表
     with app.app_context():
         db.create_all()
+        ensure_counters()
 
-    # 初始化任务调度器
-    if not app.config.get('TESTING'):
+    # 初始化任务调度器（脚本执行子进程中不启动调度器）
+    if not app.config.get('TESTING') and multiprocessing.current_process().name == 'MainProcess':
         scheduler = init_scheduler_with_app(app)
         if scheduler:
             app.scheduler = scheduler
         else:
             app.logger.error('Failed to initialize scheduler')
 
-    # 注册清理函数
-    @app.teardown_appcontext
-    def shutdown_scheduler(exception=None):
+    # 注册清理函数（进程退出时关闭调度器；不能挂在 teardown_appcontext 上，
+    # 否则每个请求和每次任务执行结束都会把调度器关掉，延迟重试等一次性任务无法触发）
+    def shutdown_scheduler():
         global scheduler_instance
         if scheduler_instance and hasattr(scheduler_instance, 'scheduler'):
             try:
                 if scheduler_instance.scheduler.running:
-                    scheduler_instance.scheduler.shutdown(wait=True)
+                    scheduler_instance.shutdown()
                     app.logger.info('Task Scheduler shut down successfully')
             except Exception as e:
                 app.logger.error(f'Error shutting down scheduler: {str(e)}')
 
+    atexit.register(shutdown_scheduler)
+
     # 添加健康检查路由
     @app.route('/health')
     def health_check():
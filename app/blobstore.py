@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+import zlib
+
+from flask import current_app
+
+from app.extensions import db
+from app.models import TaskLog
+
+logger = logging.getLogger(__name__)
+
+
+class BlobStore:
+    """
+    内容寻址的压缩输出存储：内容按 zlib 压缩后以 SHA-256 命名保存在本地目录，相同内容只保存一份。
+    超过 threshold 字节的执行输出写入此处，TaskLog 中只保留引用和开头的预览。
+    每次写入（含内容已存在时）都会刷新文件的修改时间，回收时跳过 gc_grace 秒内写入过的文件：
+    写入与引用提交之间的内容即使尚未被任何已提交的日志引用，也不会被其他进程回收
+    """
+
+    def __init__(self, root, threshold=64 * 1024, preview_size=4 * 1024, level=6, gc_grace=3600):
+        self.root = root
+        self.threshold = int(threshold)
+        self.preview_size = int(preview_size)
+        self.level = level
+        self.gc_grace = gc_grace
+
+    def _path(self, ref):
+        return os.path.join(self.root, ref[:2], ref[2:4], ref)
+
+    def put(self, text):
+        """保存内容并返回引用（内容的 SHA-256），内容已存在时只刷新修改时间"""
+        data = text.encode('utf-8', errors='replace')
+        ref = hashlib.sha256(data).hexdigest()
+        path = self._path(ref)
+        try:
+            os.utime(path)
+            return ref
+        except FileNotFoundError:
+            pass
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # 先写临时文件再原子替换，读取方不会看到写了一半的文件；并发写入相同内容时结果相同
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(zlib.compress(data, self.level))
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return ref
+
+    def get(self, ref):
+        """读取内容，不存在或已损坏时返回 None"""
+        try:
+            with open(self._path(ref), 'rb') as f:
+                return zlib.decompress(f.read()).decode('utf-8', errors='replace')
+        except FileNotFoundError:
+            logger.warning(f"Blob {ref} not found")
+        except Exception as e:
+            logger.error(f"Failed to read blob {ref}: {e}")
+        return None
+
+    def delete(self, ref):
+        """
+        回收内容，gc_grace 秒内写入过的内容保留，返回是否已删除。
+        先把文件改名移出原路径再检查修改时间：改名之前刷新过修改时间的写入方会使文件被放回，
+        改名之后的写入方找不到文件而重新写入，因此不会删除刚写入、引用尚未提交的内容
+        """
+        path = self._path(ref)
+        removed = f'{path}.gc-{os.getpid()}-{threading.get_ident()}'
+        try:
+            os.rename(path, removed)
+        except FileNotFoundError:
+            return False
+        if time.time() - os.stat(removed).st_mtime < self.gc_grace:
+            # 内容相同，覆盖期间重新写入的文件也没有影响
+            os.replace(removed, path)
+            return False
+        os.remove(removed)
+        return True
+
+    def offload(self, text):
+        """
+        超过阈值的内容写入存储
+        Returns:
+            tuple: (保存在 TaskLog 中的内容或预览, 引用)，未超过阈值或写入失败时引用为 None
+        """
+        if not text or len(text.encode('utf-8', errors='replace')) <= self.threshold:
+            return text, None
+        try:
+            ref = self.put(text)
+        except Exception as e:
+            logger.error(f"Failed to offload output to blob store, keeping it inline: {e}")
+            return text, None
+        # 预览保留开头和结尾（错误信息的关键内容通常在末尾）
+        half = self.preview_size // 2
+        return f"{text[:half]}\n... [共 {len(text)} 个字符，完整内容已压缩存储] ...\n{text[-half:]}", ref
+
+
+def init_blob_store(app):
+    config = app.config
+    app.blob_store = BlobStore(
+        config.get('LOG_BLOB_PATH'),
+        threshold=config.get('LOG_BLOB_THRESHOLD', 64 * 1024),
+        preview_size=config.get('LOG_BLOB_PREVIEW_SIZE', 4 * 1024),
+        gc_grace=config.get('LOG_BLOB_GC_GRACE', 3600)
+    )
+    return app.blob_store
+
+
+def get_blob_store():
+    return getattr(current_app, 'blob_store', None)
+
+
+def store_output(task_log, output, error):
+    """写入执行输出和错误信息，超过阈值的部分转存到 BlobStore"""
+    store = get_blob_store()
+    if store is None:
+        task_log.log_output, task_log.output_ref = output, None
+        task_log.error_message, task_log.error_ref = error, None
+        return
+    task_log.log_output, task_log.output_ref = store.offload(output)
+    task_log.error_message, task_log.error_ref = store.offload(error)
+
+
+def load_output(task_log):
+    """
+    读取完整的执行输出和错误信息
+    Returns:
+        tuple: (log_output, error_message)，内容已丢失时退回预览
+    """
+    store = get_blob_store()
+    output, error = task_log.log_output, task_log.error_message
+    if store is not None:
+        if task_log.output_ref:
+            output = store.get(task_log.output_ref) or output
+        if task_log.error_ref:
+            error = store.get(task_log.error_ref) or error
+    return output, error
+
+
+def release_blobs(refs):
+    """删除已不再被任何执行日志引用的内容（需在删除日志的事务提交后调用）"""
+    store = get_blob_store()
+    refs = {ref for ref in refs if ref}
+    if store is None or not refs:
+        return 0
+    try:
+        referenced = {ref for (ref,) in db.session.query(TaskLog.output_ref).filter(TaskLog.output_ref.in_(refs))}
+        referenced |= {ref for (ref,) in db.session.query(TaskLog.error_ref).filter(TaskLog.error_ref.in_(refs))}
+        # 未被引用但刚写入的内容可能属于尚未提交的执行日志（可能在其他进程中），由 delete 按修改时间保留
+        released = sum(1 for ref in refs - referenced if store.delete(ref))
+        if released:
+            logger.info(f"Released {released} unreferenced blobs")
+        return released
+    except Exception as e:
+        logger.error(f"Failed to release blobs: {e}")
+        return 0
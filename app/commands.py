@@ -0,0 +1,24 @@
+import click
+from flask import current_app
+
+from app.retention import purge_logs
+from app.stats import rebuild_counters
+
+
+def register_commands(app):
+    """注册 flask 命令行命令"""
+
+    @app.cli.command('purge-logs')
+    def purge_logs_command():
+        """按保留策略立即汇总并清理执行日志"""
+        result = purge_logs(current_app.config)
+        click.echo(f"Purged {result['deleted']} logs of {result['tasks']} tasks in {result['duration']:.2f}s")
+
+    @app.cli.command('rebuild-stats')
+    def rebuild_stats_command():
+        """从原始数据重新计算监控页的统计计数器"""
+        result = rebuild_counters()
+        if result is None:
+            raise click.ClickException('Failed to rebuild stat counters')
+        for name, (old, new) in result.items():
+            click.echo(f"{name}: {old} -> {new}" if old != new else f"{name}: {new}")
@@ -0,0 +1,215 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from sqlalchemy import func, literal, select
+from sqlalchemy.exc import IntegrityError
+
+from app.models import SchedulerLease
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseCoordinator:
+    """
+    基于数据库租约的主节点选举：
+    所有实例都运行调度器，但只有持有租约的实例处于运行状态并触发任务，其余实例保持暂停。
+    租约通过带条件的 UPDATE（比较并交换）获取和续期，主节点失联后最迟 ttl + renew_interval 秒内由其他实例接管。
+    租约表中的时间一律取数据库的当前时间，各实例的本地时钟不一致也不影响判断；
+    持有者本地的到期时间为发出续期语句前的单调时钟加 ttl，总是早于数据库中记录的到期时间
+    """
+
+    def __init__(self, engine, name='scheduler', ttl=30, renew_interval=10,
+                 on_acquire=None, on_release=None, on_tick=None):
+        """
+        Args:
+            on_acquire: 成为主节点时的回调
+            on_release: 失去主节点身份时的回调
+            on_tick: 每轮续期/竞选后的回调，参数为当前是否为主节点
+        """
+        if renew_interval >= ttl:
+            raise ValueError("Lease renew interval must be shorter than its TTL")
+        self.engine = engine
+        self.name = name
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self.on_acquire = on_acquire
+        self.on_release = on_release
+        self.on_tick = on_tick
+        self.holder_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.table = SchedulerLease.__table__
+
+        self.is_leader = False
+        self.token = None
+        self.deadline = 0.0  # 本地租约到期时间（time.monotonic）
+        self.leader = None  # 最近一次观察到的租约持有者
+        self.acquired = 0
+        self.lost = 0
+        self.last_failover_gap = None
+        self.max_failover_gap = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._ensure_row()
+        self.tick()
+        self._thread = threading.Thread(target=self._run, name='scheduler-lease', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止续期并主动释放租约，其他实例可立即接管"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(self.renew_interval + 5)
+        self.release()
+
+    def release(self):
+        """让出租约：本地立即停止触发，数据库中的租约仍属于本实例时将其置为到期，其他实例可立即接管"""
+        token = self.token
+        if not self.is_leader:
+            return
+        self._step_down()
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(self.table.update().where(
+                    self.table.c.name == self.name,
+                    self.table.c.holder == self.holder_id,
+                    self.table.c.token == token
+                ).values(expires_at=0))
+        except Exception as e:
+            logger.error(f"Failed to release scheduler lease: {e}")
+
+    def _db_now(self):
+        """数据库当前时间（UNIX 时间戳）的 SQL 表达式"""
+        dialect = self.engine.dialect.name
+        if dialect == 'sqlite':
+            return (func.julianday('now') - 2440587.5) * 86400.0
+        if dialect == 'postgresql':
+            return func.extract('epoch', func.clock_timestamp())
+        if dialect in ('mysql', 'mariadb'):
+            return func.unix_timestamp(func.now(6))
+        # 其他数据库退回本地时钟，各实例需保持时钟同步
+        return literal(time.time())
+
+    def _ensure_row(self):
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(self.table.insert().values(name=self.name, token=0, expires_at=0))
+        except IntegrityError:
+            pass  # 其他实例已创建
+
+    def _run(self):
+        while not self._stop.wait(self.renew_interval):
+            self.tick()
+
+    def tick(self):
+        """续期或竞选一次"""
+        try:
+            if self.is_leader:
+                self._renew()
+            else:
+                self._try_acquire()
+        except Exception as e:
+            logger.error(f"Scheduler lease check failed: {e}")
+            # 无法确认租约时，在租约到期前主动让出，避免与新的主节点同时触发
+            if self.is_leader and time.monotonic() >= self.deadline - self.renew_interval:
+                self._step_down()
+
+        if self.on_tick:
+            try:
+                self.on_tick(self.is_leader)
+            except Exception as e:
+                logger.error(f"Lease tick callback failed: {e}")
+
+    def _renew(self):
+        deadline = time.monotonic() + self.ttl
+        now = self._db_now()
+        statement = self.table.update().where(
+            self.table.c.name == self.name,
+            self.table.c.holder == self.holder_id,
+            self.table.c.token == self.token
+        ).values(expires_at=now + self.ttl, renewed_at=now)
+        with self.engine.begin() as conn:
+            renewed = conn.execute(statement).rowcount == 1
+        if renewed:
+            self.deadline = deadline
+        else:
+            logger.warning(f"Scheduler lease lost by {self.holder_id}")
+            self._step_down()
+
+    def _try_acquire(self):
+        with self.engine.connect() as conn:
+            row = conn.execute(select(self.table, self._db_now().label('db_now')).where(
+                self.table.c.name == self.name)).first()
+        if row is None:
+            self._ensure_row()
+            return
+        now = row.db_now
+        self.leader = row.holder if row.expires_at > now else None
+        if row.expires_at > now:
+            return
+
+        # 仅当租约仍是刚才读取到的状态时才能接管（比较并交换）
+        deadline = time.monotonic() + self.ttl
+        db_now = self._db_now()
+        statement = self.table.update().where(
+            self.table.c.name == self.name,
+            self.table.c.token == row.token,
+            self.table.c.expires_at == row.expires_at
+        ).values(holder=self.holder_id, token=row.token + 1, expires_at=db_now + self.ttl,
+                 acquired_at=db_now, renewed_at=db_now)
+        with self.engine.begin() as conn:
+            if conn.execute(statement).rowcount != 1:
+                return
+
+        with self._lock:
+            self.is_leader = True
+            self.token = row.token + 1
+            self.deadline = deadline
+            self.leader = self.holder_id
+            self.acquired += 1
+            # 故障切换间隔：上一任主节点最后一次续期到本实例接管（主动释放的租约也计入）
+            if row.holder and row.holder != self.holder_id and row.renewed_at:
+                gap = now - row.renewed_at
+                self.last_failover_gap = gap
+                self.max_failover_gap = max(gap, self.max_failover_gap or 0)
+        logger.info(f"Scheduler lease acquired by {self.holder_id} (token {self.token}, "
+                    f"previous holder {row.holder or '-'})")
+        if self.on_acquire:
+            self.on_acquire()
+
+    def holds_lease(self):
+        """
+        本实例当前是否持有未过期的租约：续期线程停滞（如长时间 GC 或阻塞在数据库调用中）时，
+        is_leader 仍为 True，但本地记录的到期时间过后其他实例可能已经接管，此时返回 False
+        """
+        return self.is_leader and time.monotonic() < self.deadline
+
+    def _step_down(self):
+        with self._lock:
+            if not self.is_leader:
+                return
+            self.is_leader = False
+            self.lost += 1
+        if self.on_release:
+            self.on_release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'holder_id': self.holder_id,
+                'is_leader': self.is_leader,
+                'leader': self.leader,
+                'token': self.token,
+                'expires_in': max(0.0, self.deadline - time.monotonic()) if self.is_leader else None,
+                'ttl': self.ttl,
+                'renew_interval': self.renew_interval,
+                'acquired': self.acquired,
+                'lost': self.lost,
+                'last_failover_gap': self.last_failover_gap,
+                'max_failover_gap': self.max_failover_gap
+            }
@@ -0,0 +1,377 @@
+import calendar
+import re
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import pytz
+from apscheduler.triggers.base import BaseTrigger
+from apscheduler.triggers.cron import CronTrigger
+
+BEIJING_TZ = pytz.timezone('Asia/Shanghai')
+
+# 字段名、取值范围，以及未指定时的默认值（与 APScheduler CronTrigger 一致：
+# 比最后一个指定字段更精细的字段取最小值，更粗的字段为 *）
+FIELDS = ('year', 'month', 'day', 'day_of_week', 'hour', 'minute', 'second')
+RANGES = {
+    'second': (0, 59),
+    'minute': (0, 59),
+    'hour': (0, 23),
+    'day': (1, 31),
+    'month': (1, 12),
+    'day_of_week': (0, 6),  # 与 APScheduler 相同，0 为周一
+    'year': (1970, 2099)
+}
+DEFAULTS = {'year': '*', 'month': '1', 'day': '1', 'day_of_week': '*', 'hour': '0', 'minute': '0', 'second': '0'}
+CRONTAB_FIELDS = ('minute', 'hour', 'day', 'month', 'day_of_week', 'year')
+
+NAMES = {
+    'month': {name: i + 1 for i, name in enumerate(
+        ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'))},
+    'day_of_week': {name: i for i, name in enumerate(('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun'))}
+}
+_TOKEN = re.compile(r'^(?:(?P<all>\*)|(?P<first>\w+)(?:-(?P<last>\w+))?)(?:/(?P<step>\d+))?$')
+# 编译引擎不支持、交给 CronTrigger 处理的写法（如 last、1st mon）
+_SPECIAL = re.compile(r'(last|\d+(st|nd|rd|th))', re.IGNORECASE)
+
+WEEKDAY_NAMES = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+
+
+def _next_bit(mask, value):
+    """mask 中不小于 value 的最小位，没有时返回 None"""
+    rest = mask >> value
+    if not rest:
+        return None
+    return value + (rest & -rest).bit_length() - 1
+
+
+def _parse_value(field, text):
+    text = text.lower()
+    if text in NAMES.get(field, {}):
+        return NAMES[field][text]
+    if not text.isdigit():
+        raise ValueError(f"Invalid value '{text}' for field {field}")
+    return int(text)
+
+
+def _compile_field(field, expression):
+    """把单个字段的表达式编译为位图，第 i 位表示取值 i"""
+    minimum, maximum = RANGES[field]
+    mask = 0
+    for token in str(expression).strip().split(','):
+        match = _TOKEN.match(token.strip())
+        if not match:
+            raise ValueError(f"Invalid expression '{token}' for field {field}")
+        step = int(match.group('step')) if match.group('step') else None
+        if step == 0:
+            raise ValueError(f"Step must be positive in field {field}")
+        if match.group('all'):
+            first, last = minimum, maximum
+            span = maximum - minimum
+        else:
+            named = not match.group('first').isdigit()
+            if named and step:
+                raise ValueError(f"Step is not allowed with names in field {field}: {token}")
+            first = _parse_value(field, match.group('first'))
+            if match.group('last') is not None:
+                last = _parse_value(field, match.group('last'))
+            else:
+                last = maximum if step else first
+            span = (last if match.group('last') is not None else maximum) - first
+        if not minimum <= first <= maximum or not minimum <= last <= maximum:
+            raise ValueError(f"Value out of range ({minimum}-{maximum}) in field {field}: {token}")
+        if first > last:
+            raise ValueError(f"Range start greater than end in field {field}: {token}")
+        # 与 CronTrigger 相同，步长不能超过表达式的取值跨度
+        if step and step > span:
+            raise ValueError(f"Step {step} is higher than the range of field {field}: {token}")
+        step = step or 1
+        for value in range(first, last + 1, step):
+            mask |= 1 << value
+    return mask
+
+
+class CompiledCron:
+    """
+    编译后的 cron 表达式：每个字段为一个位图，计算下次执行时间只需按位查找，
+    不再逐个字段对象求值。语义与 APScheduler CronTrigger 相同（各字段同时满足，day_of_week 0 为周一）；
+    last、1st mon 等特殊写法由 CronTrigger 计算
+    """
+
+    __slots__ = ('fields', 'masks', 'timezone', '_fallback')
+
+    def __init__(self, fields, timezone=BEIJING_TZ):
+        """
+        Args:
+            fields: {字段名: 表达式}，与 CronTrigger 的关键字参数相同
+        Raises:
+            ValueError: 字段名或表达式无效
+        """
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unsupported cron fields: {', '.join(sorted(unknown))}")
+        self.timezone = timezone
+        self.fields = {}
+        remaining = dict(fields)
+        assign_defaults = False
+        for field in FIELDS:
+            if field in remaining:
+                self.fields[field] = str(remaining.pop(field)).strip()
+                assign_defaults = not remaining
+            else:
+                self.fields[field] = DEFAULTS[field] if assign_defaults else '*'
+
+        self._fallback = None
+        self.masks = {}
+        if any(_SPECIAL.search(expression) for expression in self.fields.values()):
+            # CronTrigger 负责校验并计算特殊写法
+            self._fallback = CronTrigger(timezone=timezone, **self.fields)
+        else:
+            for field in FIELDS:
+                self.masks[field] = _compile_field(field, self.fields[field])
+
+    @classmethod
+    def from_crontab(cls, expression, timezone=BEIJING_TZ):
+        """解析 5 段（分 时 日 月 周）或 6 段（附加年）的 cron 表达式，秒固定为 0"""
+        parts = (expression or '').split()
+        if len(parts) not in (5, 6):
+            raise ValueError("Cron expression must have 5 or 6 fields")
+        fields = dict(zip(CRONTAB_FIELDS, parts))
+        fields['second'] = '0'
+        return cls(fields, timezone)
+
+    def _day_matches(self, year, month, day):
+        if not self.masks['day'] >> day & 1:
+            return False
+        return bool(self.masks['day_of_week'] >> calendar.weekday(year, month, day) & 1)
+
+    def next_fire_time(self, now):
+        """不早于 now 的第一个执行时间（带时区），不存在时返回 None"""
+        if self._fallback is not None:
+            return self._fallback.get_next_fire_time(None, now)
+
+        local = now.astimezone(self.timezone).replace(tzinfo=None)
+        if local.microsecond:
+            local = local.replace(microsecond=0) + timedelta(seconds=1)
+        candidate = self._next_local(local)
+        while candidate is not None:
+            try:
+                return self.timezone.localize(candidate, is_dst=None)
+            except pytz.NonExistentTimeError:
+                # 夏令时跳过的时间不存在，顺延到之后的下一个匹配时间
+                candidate = self._next_local(candidate + timedelta(seconds=1))
+            except pytz.AmbiguousTimeError:
+                return self.timezone.localize(candidate, is_dst=False)
+        return None
+
+    def _next_local(self, start):
+        """在本地时间（不带时区）上按位图查找下一个匹配时间"""
+        masks = self.masks
+        year, month, day = start.year, start.month, start.day
+        hour, minute, second = start.hour, start.minute, start.second
+        # 星期与闰年的组合每 28 年重复一次，之后仍无匹配则不存在
+        limit = min(year + 28, RANGES['year'][1])
+
+        while year <= limit:
+            next_year = _next_bit(masks['year'], year)
+            if next_year is None or next_year > limit:
+                return None
+            if next_year != year:
+                year, month, day, hour, minute, second = next_year, 1, 1, 0, 0, 0
+
+            next_month = _next_bit(masks['month'], month)
+            if next_month is None:
+                year, month, day, hour, minute, second = year + 1, 1, 1, 0, 0, 0
+                continue
+            if next_month != month:
+                month, day, hour, minute, second = next_month, 1, 0, 0, 0
+
+            days_in_month = calendar.monthrange(year, month)[1]
+            while day <= days_in_month and not self._day_matches(year, month, day):
+                day, hour, minute, second = day + 1, 0, 0, 0
+            if day > days_in_month:
+                year, month, day, hour, minute, second = (year, month + 1, 1, 0, 0, 0) if month < 12 \
+                    else (year + 1, 1, 1, 0, 0, 0)
+                continue
+
+            next_hour = _next_bit(masks['hour'], hour)
+            if next_hour is None:
+                day, hour, minute, second = day + 1, 0, 0, 0
+                if day > days_in_month:
+                    year, month, day = (year, month + 1, 1) if month < 12 else (year + 1, 1, 1)
+                continue
+            if next_hour != hour:
+                hour, minute, second = next_hour, 0, 0
+
+            next_minute = _next_bit(masks['minute'], minute)
+            if next_minute is None:
+                hour, minute, second = hour + 1, 0, 0
+                if hour > 23:
+                    day, hour = day + 1, 0
+                    if day > days_in_month:
+                        year, month, day = (year, month + 1, 1) if month < 12 else (year + 1, 1, 1)
+                continue
+            if next_minute != minute:
+                minute, second = next_minute, 0
+
+            next_second = _next_bit(masks['second'], second)
+            if next_second is None:
+                minute, second = minute + 1, 0
+                if minute > 59:
+                    hour, minute = hour + 1, 0
+                    if hour > 23:
+                        day, hour = day + 1, 0
+                        if day > days_in_month:
+                            year, month, day = (year, month + 1, 1) if month < 12 else (year + 1, 1, 1)
+                continue
+            return datetime(year, month, day, hour, minute, next_second)
+        return None
+
+    def next_fire_times(self, now, count=5):
+        """从 now 开始的 count 个执行时间"""
+        times = []
+        fire_time = self.next_fire_time(now)
+        while fire_time is not None and len(times) < count:
+            times.append(fire_time)
+            fire_time = self.next_fire_time(fire_time + timedelta(seconds=1))
+        return times
+
+    def fire_times_between(self, start, end):
+        """[start, end] 内的全部执行时间（生成器）"""
+        fire_time = self.next_fire_time(start)
+        while fire_time is not None and fire_time <= end:
+            yield fire_time
+            fire_time = self.next_fire_time(fire_time + timedelta(seconds=1))
+
+    def describe(self):
+        """人类可读的描述"""
+        f = self.fields
+        plain_day = f['day'] == '*' and f['month'] == '*' and f['year'] == '*'
+        fixed_time = f['hour'].isdigit() and f['minute'].isdigit() and f['second'] == '0'
+        if f['second'] == '0' and plain_day and f['day_of_week'] == '*':
+            interval = re.match(r'^\*/(\d+)$', f['minute'])
+            if f['hour'] == '*' and (interval or f['minute'] == '*'):
+                return f"每{interval.group(1)}分钟" if interval else "每分钟"
+            interval = re.match(r'^\*/(\d+)$', f['hour'])
+            if f['minute'].isdigit() and (interval or f['hour'] == '*'):
+                prefix = f"每{interval.group(1)}小时" if interval else "每小时"
+                return f"{prefix}（第{f['minute']}分）"
+        if fixed_time:
+            time_text = f"{int(f['hour']):02d}:{int(f['minute']):02d}"
+            if plain_day and f['day_of_week'] == '*':
+                return f"每天 {time_text}"
+            if plain_day and f['day_of_week'].isdigit():
+                return f"每{WEEKDAY_NAMES[int(f['day_of_week'])]} {time_text}"
+            if f['day'].isdigit() and f['month'] == '*' and f['year'] == '*' and f['day_of_week'] == '*':
+                return f"每月{f['day']}日 {time_text}"
+        labels = (('year', '年'), ('month', '月'), ('day', '日'), ('day_of_week', '星期'),
+                  ('hour', '时'), ('minute', '分'), ('second', '秒'))
+        return '，'.join(f"{label} {f[field]}" for field, label in labels if f[field] != '*')
+
+    def __str__(self):
+        return ' '.join(f"{field}='{self.fields[field]}'" for field in FIELDS if self.fields[field] != '*')
+
+
+@lru_cache(maxsize=4096)
+def _compile(fields, timezone):
+    return CompiledCron(dict(fields), timezone)
+
+
+def compile_cron(fields, timezone=BEIJING_TZ):
+    """
+    按字段编译并缓存（同一表达式只编译一次）
+    Args:
+        fields: {字段名: 表达式} 或 5/6 段的 cron 字符串
+    Raises:
+        ValueError: 表达式无效
+    """
+    if isinstance(fields, str):
+        parts = fields.split()
+        if len(parts) not in (5, 6):
+            raise ValueError("Cron expression must have 5 or 6 fields")
+        fields = dict(zip(CRONTAB_FIELDS, parts), second='0')
+    return _compile(tuple(sorted((k, str(v)) for k, v in fields.items())), timezone)
+
+
+def validate_cron(expression):
+    """校验 cron 表达式，返回 (是否有效, 错误信息)"""
+    try:
+        compile_cron(expression)
+        return True, None
+    except (ValueError, TypeError) as e:
+        return False, str(e)
+
+
+def next_fire_times_batch(expressions, now=None, count=5):
+    """
+    批量计算多个表达式的后续执行时间，相同的表达式只编译和计算一次
+    Args:
+        expressions: 可迭代的 cron 字符串或字段字典
+    Returns:
+        list: 与输入一一对应，无效的表达式为 None
+    """
+    now = now or datetime.now(BEIJING_TZ)
+    results, computed = [], {}
+    for expression in expressions:
+        key = expression if isinstance(expression, str) else tuple(sorted(expression.items()))
+        if key not in computed:
+            try:
+                computed[key] = compile_cron(expression).next_fire_times(now, count)
+            except ValueError:
+                computed[key] = None
+        results.append(computed[key])
+    return results
+
+
+def fire_time_histogram(expressions, start, end):
+    """
+    统计一组表达式在 [start, end] 内每秒的执行次数，相同的表达式只计算一次，无效的表达式忽略
+    Returns:
+        dict: {UNIX 秒: 执行次数}
+    """
+    groups = {}
+    for expression in expressions:
+        key = expression if isinstance(expression, str) else tuple(sorted(expression.items()))
+        groups[key] = groups.get(key, 0) + 1
+
+    counts = {}
+    for key, weight in groups.items():
+        try:
+            cron = compile_cron(key if isinstance(key, str) else dict(key))
+        except ValueError:
+            continue
+        for fire_time in cron.fire_times_between(start, end):
+            second = int(fire_time.timestamp())
+            counts[second] = counts.get(second, 0) + weight
+    return counts
+
+
+class CompiledCronTrigger(BaseTrigger):
+    """由 CompiledCron 计算执行时间的 APScheduler 触发器"""
+
+    __slots__ = ('cron',)
+
+    def __init__(self, cron):
+        self.cron = cron
+
+    @property
+    def timezone(self):
+        return self.cron.timezone
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        # 与 CronTrigger 相同：从上次执行时间之后开始计算，错过的执行由调度器按 misfire/coalesce 处理
+        start = now
+        if previous_fire_time is not None:
+            start = min(now, previous_fire_time + timedelta(microseconds=1))
+        return self.cron.next_fire_time(start)
+
+    def __getstate__(self):
+        return {'version': 1, 'fields': self.cron.fields, 'timezone': self.cron.timezone}
+
+    def __setstate__(self, state):
+        self.cron = compile_cron(state['fields'], state['timezone'])
+
+    def __str__(self):
+        return f"cron[{self.cron}]"
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} ({self.cron}, timezone='{self.cron.timezone}')>"
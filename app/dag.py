@@ -0,0 +1,211 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import pytz
+from flask import current_app
+
+from app.extensions import db
+from app.models import Task, TaskLog, TaskDependency, DagRun
+
+logger = logging.getLogger(__name__)
+
+BEIJING_TZ = pytz.timezone('Asia/Shanghai')
+
+_lock = threading.Lock()
+# (dag_run_id, task_id) -> 触发时间，多个上游同时完成时避免重复触发下游；
+# 运行结束时清除，中途被放弃（如实例重启）的运行超过 TRIGGERED_TTL 后清除
+_triggered = {}
+TRIGGERED_TTL = 24 * 3600
+
+_graph_lock = threading.Lock()
+_graph_cache = {'graph': None, 'expires_at': 0.0, 'generation': 0}
+
+
+def _creates_cycle(task_id, upstream_ids):
+    """沿上游方向遍历依赖图，若能从新的上游回到 task_id 则会形成循环"""
+    upstreams_of = defaultdict(list)
+    for child, parent in db.session.query(TaskDependency.task_id, TaskDependency.upstream_id):
+        if child != task_id:
+            upstreams_of[child].append(parent)
+
+    stack, seen = list(upstream_ids), set()
+    while stack:
+        current = stack.pop()
+        if current == task_id:
+            return True
+        if current in seen:
+            continue
+        seen.add(current)
+        stack.extend(upstreams_of[current])
+    return False
+
+
+def set_upstreams(task, upstream_ids):
+    """
+    设置任务的上游依赖（不提交事务）
+    Raises:
+        ValueError: 未选择上游、依赖自身、上游不存在或形成循环依赖
+    """
+    upstream_ids = {int(i) for i in upstream_ids}
+    if not upstream_ids:
+        raise ValueError('请选择至少一个上游任务')
+    if task.id in upstream_ids:
+        raise ValueError('任务不能依赖自身')
+    upstreams = Task.query.filter(Task.id.in_(upstream_ids)).all()
+    if len(upstreams) != len(upstream_ids):
+        raise ValueError('上游任务不存在')
+    if task.id is not None and _creates_cycle(task.id, upstream_ids):
+        raise ValueError('依赖关系存在循环')
+    task.upstreams = upstreams
+
+
+def _load_dependency_graph():
+    downstreams, upstreams = defaultdict(list), defaultdict(list)
+    rows = db.session.query(TaskDependency.task_id, TaskDependency.upstream_id) \
+        .join(Task, Task.id == TaskDependency.task_id) \
+        .filter(Task.is_active.is_(True), Task.schedule_type == 'dependent')
+    for child, parent in rows:
+        downstreams[parent].append(child)
+        upstreams[child].append(parent)
+    return dict(downstreams), dict(upstreams)
+
+
+def _dependency_graph():
+    """
+    活动的依赖任务及其上游：(upstream_id -> [task_id], task_id -> [upstream_id])。
+    每次执行都要判断任务有没有下游，依赖图缓存在内存中，最多 DAG_GRAPH_CACHE_TTL 秒后重新加载。
+    本进程修改依赖时由 invalidate_dependency_graph 立即清除；清除只作用于本进程的缓存，
+    其他进程或节点的修改不会通知到这里，只能等缓存到期后生效
+    """
+    now = time.monotonic()
+    with _graph_lock:
+        if _graph_cache['graph'] is not None and _graph_cache['expires_at'] > now:
+            return _graph_cache['graph']
+        generation = _graph_cache['generation']
+    graph = _load_dependency_graph()
+    with _graph_lock:
+        # 加载期间被清除的不写入缓存，避免缓存修改前的依赖图（generation 只在本进程内递增）
+        if _graph_cache['generation'] == generation:
+            _graph_cache['graph'] = graph
+            _graph_cache['expires_at'] = now + current_app.config.get('DAG_GRAPH_CACHE_TTL', 30)
+    return graph
+
+
+def invalidate_dependency_graph():
+    """依赖关系、任务启用状态或调度类型修改并提交后调用"""
+    with _graph_lock:
+        _graph_cache['graph'] = None
+        _graph_cache['generation'] += 1
+
+
+def _members(root_id, downstreams):
+    """一次运行包含的任务：根任务及其全部下游"""
+    members, stack = set(), [root_id]
+    while stack:
+        current = stack.pop()
+        if current not in members:
+            members.add(current)
+            stack.extend(downstreams.get(current, ()))
+    return members
+
+
+def begin_dag_run(task, dag_run_id=None):
+    """
+    返回本次执行所属的 DAG 运行 id：由上游触发的执行沿用上游的运行，
+    有下游任务的任务直接执行时创建新的运行，否则返回 None
+    """
+    if dag_run_id:
+        return dag_run_id
+    downstreams, _ = _dependency_graph()
+    if task.id not in downstreams:
+        return None
+    run = DagRun(root_task_id=task.id, status='RUNNING', start_time=datetime.now(BEIJING_TZ))
+    db.session.add(run)
+    db.session.flush()
+    logger.info(f"DAG run {run.id} started from task {task.id}")
+    return run.id
+
+
+def _finish_run(run, status):
+    end_time = datetime.now(BEIJING_TZ)
+    start_time = run.start_time
+    if start_time.tzinfo is None:
+        start_time = BEIJING_TZ.localize(start_time)
+    run.status = status
+    run.end_time = end_time
+    run.duration = (end_time - start_time).total_seconds()
+    db.session.commit()
+    for key in [key for key in _triggered if key[0] == run.id]:
+        del _triggered[key]
+    logger.info(f"DAG run {run.id} finished with status {status} in {run.duration:.3f}s")
+
+
+def _expire_triggered():
+    """在持有 _lock 时清除中途被放弃的运行留下的触发记录"""
+    deadline = time.monotonic() - TRIGGERED_TTL
+    for key in [key for key, triggered_at in _triggered.items() if triggered_at < deadline]:
+        del _triggered[key]
+
+
+def on_execution_finished(task, task_log, status, retrying):
+    """
+    任务执行结束后推进所属的 DAG 运行：成功时触发全部上游均已成功的下游任务（各分支并行执行），
+    失败且不再重试时运行失败，全部任务成功时记录端到端耗时
+    """
+    run_id = task_log.dag_run_id
+    if not run_id:
+        return
+    try:
+        with _lock:
+            _expire_triggered()
+            run = DagRun.query.get(run_id)
+            if run is None or run.status != 'RUNNING':
+                return
+            if status != 'SUCCESS':
+                if not retrying:
+                    _finish_run(run, 'FAILED')
+                return
+
+            downstreams, upstreams = _dependency_graph()
+            members = _members(run.root_task_id, downstreams)
+            succeeded = {task_id for (task_id,) in db.session.query(TaskLog.task_id).filter(
+                TaskLog.dag_run_id == run_id, TaskLog.status == 'SUCCESS').distinct()}
+
+            ready, blocked = [], False
+            for child_id in downstreams.get(task.id, ()):
+                if (run_id, child_id) in _triggered or child_id in succeeded:
+                    continue
+                parents = upstreams.get(child_id, ())
+                if not all(parent in succeeded for parent in parents if parent in members):
+                    continue
+                # 不属于本次运行的上游以其最近一次执行结果为准
+                outside = [parent for parent in parents if parent not in members]
+                if outside and Task.query.filter(
+                        Task.id.in_(outside),
+                        db.or_(Task.last_status.is_(None), Task.last_status != 'SUCCESS')).first() is not None:
+                    logger.warning(f"DAG run {run_id}: task {child_id} blocked by failed upstream outside the run")
+                    blocked = True
+                    continue
+                _triggered[(run_id, child_id)] = time.monotonic()
+                ready.append(child_id)
+
+            if blocked:
+                _finish_run(run, 'FAILED')
+                return
+            if not ready and members <= succeeded:
+                _finish_run(run, 'SUCCESS')
+                return
+
+        scheduler = getattr(current_app, 'scheduler', None)
+        for child in Task.query.filter(Task.id.in_(ready)).all():
+            if scheduler is None or not scheduler.trigger_task(child, dag_run_id=run_id):
+                logger.error(f"DAG run {run_id}: failed to trigger task {child.id}")
+                with _lock:
+                    _finish_run(DagRun.query.get(run_id), 'FAILED')
+                break
+    except Exception as e:
+        logger.error(f"Failed to advance DAG run {run_id}: {e}", exc_info=True)
+        db.session.rollback()
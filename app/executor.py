@@ -0,0 +1,955 @@
+import ast
+import asyncio
+import builtins
+import concurrent.futures
+import contextvars
+import ctypes
+import hashlib
+import importlib
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import lru_cache
+from types import MappingProxyType
+
+from apscheduler.executors.base import BaseExecutor
+from apscheduler.executors.base_py3 import run_coroutine_job
+
+from app.metering import ResourceMeter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+# 支持的脚本执行后端
+EXECUTION_BACKENDS = ('thread', 'process')
+
+_process_pool = None
+_process_pool_info = {'recycled': 0}
+_process_pool_lock = threading.Lock()
+# 各进程池中正在等待结果的执行 {进程池: {future: 是否已超时放弃}}
+_pool_inflight = {}
+_recycling_pools = set()
+
+# 工作进程内的状态（仅在子进程中使用）
+_worker_state = {'started_at': 0.0}
+
+# 当前执行上下文的输出缓冲区（线程/协程各自独立）
+_current_output = contextvars.ContextVar('task_output', default=None)
+_router_lock = threading.Lock()
+
+
+class OutputRouter:
+    """
+    标准输出代理：写入当前执行上下文绑定的缓冲区，
+    不在任务执行中的写入（应用自身的 print 等）落到原始输出
+    """
+
+    def __init__(self, fallback):
+        self._fallback = fallback
+
+    def _target(self):
+        buffer = _current_output.get()
+        return self._fallback if buffer is None else buffer
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def writelines(self, lines):
+        self._target().writelines(lines)
+
+    def flush(self):
+        target = self._target()
+        if hasattr(target, 'flush'):
+            target.flush()
+
+    def __getattr__(self, name):
+        # encoding、fileno、isatty 等属性交给原始输出
+        return getattr(self._fallback, name)
+
+
+def install_output_router():
+    """将 sys.stdout 替换为 OutputRouter（幂等，只在首次或被外部替换后安装）"""
+    if isinstance(sys.stdout, OutputRouter):
+        return sys.stdout
+
+    with _router_lock:
+        if not isinstance(sys.stdout, OutputRouter):
+            sys.stdout = OutputRouter(sys.stdout)
+        return sys.stdout
+
+
+@contextmanager
+def capture_output(buffer=None):
+    """在当前线程/上下文中捕获标准输出，不影响其他并发执行"""
+    install_output_router()
+    if buffer is None:
+        buffer = TaskOutputStream()
+    token = _current_output.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _current_output.reset(token)
+
+
+# 进程池模式下，子进程自身的超时机制失效时父进程额外等待的时间（秒）
+PROCESS_TIMEOUT_GRACE = 5
+
+
+class ExecutionTimeout(BaseException):
+    """脚本执行超时（继承 BaseException，避免被脚本中的 except Exception 吞掉）"""
+    pass
+
+
+class ExecutionWatchdog:
+    """
+    执行超时看门狗：
+    线程模式下脚本在独立线程中运行，调度线程最多等待到超时，随即释放工作线程，
+    并向脚本线程注入 ExecutionTimeout 尝试中断；进程模式的超时也在此计数。
+    阻塞在 C 调用或 time.sleep 中的脚本线程要等调用返回后才会中断，
+    这样超时后仍在运行的线程按 key（任务）记录，由调用方据此避免同一任务并发执行
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.fired = 0
+        self.last_fired_at = None
+        self._orphans = []  # 超时后仍未退出的脚本线程 (key, 线程)
+
+    def run_in_thread(self, func, timeout=None, on_poll=None, poll_interval=1.0, on_timeout=None, key=None):
+        """
+        在独立线程中执行 func，超时时先调用 on_timeout 再中断脚本线程
+        Args:
+            key: 超时后仍未退出的线程记在此 key 下，见 orphaned
+        Returns:
+            tuple: (是否在超时前完成, func 的返回值)
+        """
+        box = {}
+
+        def target():
+            try:
+                box['value'] = func()
+            except ExecutionTimeout:
+                pass
+            except BaseException as e:
+                box['error'] = e
+
+        thread = threading.Thread(target=target, name='task-script', daemon=True)
+        thread.start()
+
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            wait = poll_interval
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.monotonic(), 0))
+            thread.join(wait)
+            if not thread.is_alive():
+                break
+            if on_poll:
+                on_poll()
+            if deadline is not None and time.monotonic() >= deadline:
+                if on_timeout:
+                    on_timeout()
+                self._interrupt(thread)
+                self.record()
+                with self._lock:
+                    self._orphans.append((key, thread))
+                return False, None
+
+        if 'error' in box:
+            raise box['error']
+        return True, box.get('value')
+
+    @staticmethod
+    def _interrupt(thread):
+        """向线程注入 ExecutionTimeout；阻塞在 C 调用中的线程会在调用返回后收到"""
+        ctypes.pythonapi.PyThreadState_SetAsyncExc(
+            ctypes.c_ulong(thread.ident), ctypes.py_object(ExecutionTimeout)
+        )
+
+    def record(self):
+        """记录一次超时"""
+        with self._lock:
+            self.fired += 1
+            self.last_fired_at = time.time()
+
+    def orphaned(self, key):
+        """key 下超时后仍在运行的脚本线程数"""
+        with self._lock:
+            self._orphans = [(k, t) for k, t in self._orphans if t.is_alive()]
+            return sum(1 for k, _ in self._orphans if k == key)
+
+    def stats(self):
+        with self._lock:
+            self._orphans = [(k, t) for k, t in self._orphans if t.is_alive()]
+            return {
+                'fired': self.fired,
+                'last_fired_at': self.last_fired_at,
+                'orphaned_threads': len(self._orphans)
+            }
+
+
+watchdog = ExecutionWatchdog()
+
+
+def _timeout_result(output, timeout):
+    return {
+        'status': 'TIMEOUT',
+        'output': output.getvalue(),
+        'error': f"Execution exceeded timeout of {timeout} seconds"
+    }
+
+
+# 输出流默认限制（字符数 / 秒）
+DEFAULT_OUTPUT_HEAD_LIMIT = 512 * 1024
+DEFAULT_OUTPUT_TAIL_LIMIT = 512 * 1024
+DEFAULT_OUTPUT_FLUSH_SIZE = 16 * 1024
+DEFAULT_OUTPUT_FLUSH_INTERVAL = 5
+
+
+class TaskOutputStream:
+    """
+    有界的脚本输出流：
+    - 保留最先输出的 head_limit 个字符和最近输出的 tail_limit 个字符，中间部分丢弃并计数
+    - 累计 flush_size 个字符或距上次持久化超过 flush_interval 秒时，通过 on_flush 回调增量持久化
+    """
+
+    def __init__(self, head_limit=DEFAULT_OUTPUT_HEAD_LIMIT, tail_limit=DEFAULT_OUTPUT_TAIL_LIMIT,
+                 flush_size=DEFAULT_OUTPUT_FLUSH_SIZE, flush_interval=DEFAULT_OUTPUT_FLUSH_INTERVAL,
+                 on_flush=None):
+        self.head_limit = head_limit
+        self.tail_limit = tail_limit
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.dropped = 0
+        self.total = 0
+        self._head = []
+        self._head_size = 0
+        self._tail = deque()
+        self._tail_size = 0
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        # 脚本线程写入，等待线程定时持久化，两者通过锁同步（持久化 I/O 在锁外进行）
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        if not text:
+            return 0
+
+        with self._lock:
+            rest = text
+            room = self.head_limit - self._head_size
+            if room > 0:
+                part = text[:room]
+                self._head.append(part)
+                self._head_size += len(part)
+                rest = text[room:]
+
+            if rest:
+                self._tail.append(rest)
+                self._tail_size += len(rest)
+                self._trim_tail()
+
+            self.total += len(text)
+            self._pending += len(text)
+            full = self._pending >= self.flush_size
+
+        if full:
+            self.persist()
+        else:
+            self.flush()
+        return len(text)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def _trim_tail(self):
+        while self._tail_size > self.tail_limit:
+            excess = self._tail_size - self.tail_limit
+            first = self._tail[0]
+            if len(first) <= excess:
+                self._tail.popleft()
+                self._tail_size -= len(first)
+                self.dropped += len(first)
+            else:
+                self._tail[0] = first[excess:]
+                self._tail_size -= excess
+                self.dropped += excess
+
+    def getvalue(self):
+        """当前保留的输出（头部 + 截断提示 + 尾部）"""
+        with self._lock:
+            return self._render()
+
+    def _render(self):
+        if len(self._head) > 1:
+            self._head = [''.join(self._head)]
+        head = self._head[0] if self._head else ''
+        tail = ''.join(self._tail)
+        if self.dropped:
+            return f"{head}\n... [输出过长，已省略 {self.dropped} 个字符] ...\n{tail}"
+        return head + tail
+
+    def flush(self):
+        """距上次持久化超过 flush_interval 时持久化（脚本频繁 flush 不会放大写入）"""
+        if self._pending and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.persist()
+
+    def persist(self):
+        """将当前输出交给 on_flush 回调持久化"""
+        if self.on_flush is None:
+            return
+        with self._lock:
+            if not self._pending:
+                return
+            self._pending = 0
+            self._last_flush = time.monotonic()
+            snapshot = self._render()
+        try:
+            self.on_flush(snapshot)
+        except Exception as e:
+            logger.warning(f"Failed to persist partial output: {e}")
+
+
+def output_limits(config):
+    """从应用配置读取输出流限制"""
+    return {
+        'head_limit': config.get('TASK_OUTPUT_HEAD_LIMIT', DEFAULT_OUTPUT_HEAD_LIMIT),
+        'tail_limit': config.get('TASK_OUTPUT_TAIL_LIMIT', DEFAULT_OUTPUT_TAIL_LIMIT),
+        'flush_size': config.get('TASK_OUTPUT_FLUSH_SIZE', DEFAULT_OUTPUT_FLUSH_SIZE),
+        'flush_interval': config.get('TASK_OUTPUT_FLUSH_INTERVAL', DEFAULT_OUTPUT_FLUSH_INTERVAL)
+    }
+
+
+class CompiledScriptCache:
+    """脚本字节码缓存：以脚本内容的哈希为键，超出容量时按 LRU 淘汰"""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.compile_time = 0.0
+
+    @staticmethod
+    def make_key(script_content):
+        return hashlib.sha256(script_content.encode('utf-8')).hexdigest()
+
+    def get(self, script_content):
+        """
+        获取脚本的字节码，未命中时编译并放入缓存
+        Raises:
+            SyntaxError: 脚本存在语法错误
+        """
+        key = self.make_key(script_content)
+        with self._lock:
+            code = self._entries.get(key)
+            if code is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return code
+            self.misses += 1
+
+        # 编译放在锁外，避免大脚本编译阻塞其他执行
+        start = time.perf_counter()
+        code = compile(script_content, '<task_script>', 'exec')
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.compile_time += elapsed
+            self._entries[key] = code
+            self._entries.move_to_end(key)
+            self._evict()
+        return code
+
+    def resize(self, maxsize):
+        """调整缓存容量"""
+        with self._lock:
+            self.maxsize = max(1, int(maxsize))
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """缓存命中统计"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'compile_time': self.compile_time
+            }
+
+
+# 进程内共享的字节码缓存（进程池的每个工作进程各自持有一份）
+script_cache = CompiledScriptCache()
+
+
+class NamespaceTemplate:
+    """
+    脚本执行作用域模板：基础作用域只构建一次并冻结，
+    每次执行只做一次小字典的浅拷贝，再叠加本次执行的少量变量
+    """
+
+    def __init__(self, modules=()):
+        base = {'__builtins__': builtins, '__name__': '__main__'}
+        exposed = []
+        for spec in modules:
+            # 支持 "module" 与 "module as alias" 两种写法
+            name, _, alias = (part.strip() for part in spec.partition(' as '))
+            try:
+                module = importlib.import_module(name)
+            except ImportError as e:
+                logger.warning(f"Namespace module '{name}' could not be imported: {e}")
+                continue
+            if alias:
+                base[alias] = module
+            else:
+                # 与 import a.b 语义一致，绑定顶层包名
+                top = name.split('.')[0]
+                base[top] = sys.modules[top]
+            exposed.append(spec)
+
+        self.modules = tuple(exposed)
+        self._base = MappingProxyType(base)
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.build_time = 0.0
+
+    def new_scope(self, overlay=None):
+        """基于模板创建一次执行使用的作用域"""
+        start = time.perf_counter()
+        scope = dict(self._base)
+        if overlay:
+            scope.update(overlay)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.builds += 1
+            self.build_time += elapsed
+        return scope
+
+    def stats(self):
+        """作用域构建开销统计"""
+        with self._lock:
+            return {
+                'modules': list(self.modules),
+                'size': len(self._base),
+                'scope_bytes': sys.getsizeof(dict(self._base)),
+                'builds': self.builds,
+                'avg_build_time': self.build_time / self.builds if self.builds else 0.0
+            }
+
+
+# 默认暴露给脚本的模块，可通过 SCRIPT_NAMESPACE_MODULES 覆盖
+DEFAULT_NAMESPACE_MODULES = ('os', 'sys', 'time', 'datetime', 'json', 're', 'math', 'random', 'logging')
+
+_namespace_templates = {}
+_namespace_lock = threading.Lock()
+
+
+def get_namespace_template(modules=None):
+    """获取（按模块列表缓存的）作用域模板"""
+    key = tuple(DEFAULT_NAMESPACE_MODULES if modules is None else modules)
+    template = _namespace_templates.get(key)
+    if template is None:
+        with _namespace_lock:
+            template = _namespace_templates.get(key)
+            if template is None:
+                template = NamespaceTemplate(key)
+                _namespace_templates[key] = template
+    return template
+
+
+def resolve_backend(task, config):
+    """
+    确定任务使用的执行后端：任务自身配置优先，否则使用全局配置；
+    以 async def main() 为入口的脚本在线程模式下改由共享事件循环执行
+    """
+    backend = task.execution_backend or config.get('SCHEDULER_EXECUTION_BACKEND', 'thread')
+    if backend not in EXECUTION_BACKENDS:
+        logger.warning(f"Unknown execution backend '{backend}' for task {task.id}, falling back to thread")
+        backend = 'thread'
+    if backend == 'thread' and getattr(task, 'is_async', False):
+        backend = 'asyncio'
+    return backend
+
+
+def _loads_main(nodes):
+    """模块级代码（不含函数体和类体）中是否引用了 main"""
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            # 装饰器和默认参数在模块级求值
+            stack.extend(getattr(node, 'decorator_list', []))
+            args = getattr(node, 'args', None)
+            if args:
+                stack.extend(args.defaults + [d for d in args.kw_defaults if d is not None])
+            continue
+        if isinstance(node, ast.Name) and node.id == 'main' and isinstance(node.ctx, ast.Load):
+            return True
+        stack.extend(ast.iter_child_nodes(node))
+    return False
+
+
+@lru_cache(maxsize=256)
+def is_async_script(script_content):
+    """
+    脚本是否以 async def main() 为入口：
+    模块级定义了协程函数 main 且没有自行调用（自行 asyncio.run(main()) 的脚本仍按普通脚本执行）
+    """
+    try:
+        tree = ast.parse(script_content)
+    except SyntaxError:
+        return False
+    defines_main = False
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and node.name == 'main':
+            defines_main = isinstance(node, ast.AsyncFunctionDef)
+    return defines_main and not _loads_main(tree.body)
+
+
+def run_script(script_content, namespace_modules=None, output=None):
+    """
+    在当前进程中执行脚本
+    Args:
+        output: 输出流，默认使用带默认限制的 TaskOutputStream
+    Returns:
+        dict: {'status', 'output', 'error'}
+    """
+    result = {'status': 'FAILED', 'output': '', 'error': None}
+    if output is None:
+        output = TaskOutputStream()
+
+    # 基于预构建模板创建本次执行的作用域
+    exec_scope = get_namespace_template(namespace_modules).new_scope()
+
+    # 捕获脚本标准输出（仅当前执行上下文）
+    with capture_output(output):
+        try:
+            code = script_cache.get(script_content)
+            exec(code, exec_scope)
+            if is_async_script(script_content):
+                # 协程入口脚本在线程/进程模式下使用独立事件循环运行
+                asyncio.run(exec_scope['main']())
+            result['status'] = 'SUCCESS'
+        except Exception as script_exec_error:
+            result['error'] = str(script_exec_error)
+        finally:
+            result['output'] = output.getvalue()
+
+    return result
+
+
+async def run_async_script(script_content, namespace_modules=None, output=None, timeout=None):
+    """
+    在当前事件循环中执行协程入口脚本：模块级代码同步执行，随后等待 main() 完成
+    输出捕获基于 contextvars，每个 asyncio 任务拥有独立的上下文，并发执行互不干扰；
+    共享线程上无法区分单个脚本的资源消耗，因此不记录资源指标
+    Returns:
+        dict: {'status', 'output', 'error'}
+    """
+    result = {'status': 'FAILED', 'output': '', 'error': None}
+    if output is None:
+        output = TaskOutputStream()
+
+    exec_scope = get_namespace_template(namespace_modules).new_scope()
+
+    with capture_output(output):
+        try:
+            code = script_cache.get(script_content)
+            exec(code, exec_scope)
+            main = asyncio.ensure_future(exec_scope['main']())
+            done, _ = await asyncio.wait({main}, timeout=timeout)
+            if not done:
+                # 超时取消协程，给脚本一点时间处理 CancelledError 后即释放
+                main.cancel()
+                await asyncio.wait({main}, timeout=1)
+                watchdog.record()
+                return _timeout_result(output, timeout)
+            main.result()
+            result['status'] = 'SUCCESS'
+        except Exception as script_exec_error:
+            result['error'] = str(script_exec_error)
+        finally:
+            result['output'] = output.getvalue()
+
+    return result
+
+
+class EventLoopExecutor(BaseExecutor):
+    """
+    共享事件循环执行器：在少量后台线程中各运行一个事件循环，
+    协程任务提交到当前未完成任务最少的事件循环上，I/O 密集的脚本可以大量并发
+    """
+
+    def __init__(self, loops=1):
+        super().__init__()
+        self.loop_count = max(int(loops), 1)
+        self._loops = []
+        self._threads = []
+        self._pending = []
+        self._futures = set()
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+
+    def start(self, scheduler, alias):
+        super().start(scheduler, alias)
+        for i in range(self.loop_count):
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name=f'task-asyncio-{i}', daemon=True)
+            thread.start()
+            self._loops.append(loop)
+            self._threads.append(thread)
+            self._pending.append(0)
+
+    def shutdown(self, wait=True):
+        if wait:
+            # 与线程池一致：等待已提交的协程执行完毕
+            with self._lock:
+                futures = list(self._futures)
+            concurrent.futures.wait(futures)
+        for loop in self._loops:
+            loop.call_soon_threadsafe(loop.stop)
+        if wait:
+            for thread in self._threads:
+                thread.join(5)
+        self._loops = []
+        self._threads = []
+        self._pending = []
+
+    def _do_submit_job(self, job, run_times):
+        with self._lock:
+            index = min(range(len(self._loops)), key=self._pending.__getitem__)
+            self._pending[index] += 1
+            self.submitted += 1
+            loop = self._loops[index]
+
+        def callback(future):
+            with self._lock:
+                if index < len(self._pending):
+                    self._pending[index] -= 1
+                self._futures.discard(future)
+                self.completed += 1
+            try:
+                events = future.result()
+            except BaseException:
+                self._run_job_error(job.id, *sys.exc_info()[1:])
+            else:
+                self._run_job_success(job.id, events)
+
+        coro = run_coroutine_job(job, job._jobstore_alias, run_times, self._logger.name)
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(callback)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loops': len(self._loops),
+                'running': sum(self._pending),
+                'submitted': self.submitted,
+                'completed': self.completed
+            }
+
+
+def run_in_thread(script_content, namespace_modules=None, output=None, timeout=None, key=None):
+    """
+    在独立线程中执行脚本，由看门狗强制超时，等待期间定时持久化输出
+    Args:
+        key: 超时后仍未退出的脚本线程的归属（任务 id），见 ExecutionWatchdog.orphaned
+    """
+    if output is None:
+        output = TaskOutputStream()
+
+    submitted_at = time.perf_counter()
+    metrics = {}  # 由脚本线程/看门狗写入的计量数据
+    meter = ResourceMeter('thread')
+
+    def target():
+        metrics['start_latency'] = time.perf_counter() - submitted_at
+        meter.start()
+        result = run_script(script_content, namespace_modules, output)
+        result['usage'] = meter.stop()
+        return result
+
+    def on_timeout():
+        # 中断前从外部读取脚本线程的资源消耗
+        metrics['usage'] = meter.stop(from_other_thread=True)
+
+    poll_interval = min(1.0, output.flush_interval)
+    finished, result = watchdog.run_in_thread(
+        target,
+        timeout=timeout,
+        on_poll=output.flush,
+        poll_interval=poll_interval,
+        on_timeout=on_timeout,
+        key=key
+    )
+    if not finished:
+        result = _timeout_result(output, timeout)
+        result['usage'] = metrics['usage']
+    result['start_latency'] = metrics.get('start_latency')
+    return result
+
+
+def _raise_timeout(signum, frame):
+    raise ExecutionTimeout()
+
+
+def _init_worker(preload_modules):
+    """工作进程初始化：导入预加载模块（forkserver 模式下模块已在 fork server 中导入，此处只是查表）"""
+    _worker_state['started_at'] = time.time()
+    for name in preload_modules:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"Preload module '{name}' could not be imported: {e}")
+
+
+def _warmup():
+    """预热任务：促使进程池提前启动全部工作进程"""
+    time.sleep(0.05)
+    return os.getpid()
+
+
+def _run_script_in_worker(script_content, namespace_modules, limits, timeout, submitted_at):
+    """进程池工作进程入口（输出受同样的内存上限约束，在执行结束后一次性返回）"""
+    start_latency = time.time() - submitted_at
+    # 工作进程是在本次提交之后才启动的，即为冷启动
+    cold_start = _worker_state['started_at'] >= submitted_at
+
+    output = TaskOutputStream(**limits)
+    meter = ResourceMeter('process').start()
+    # 任务在工作进程主线程中执行，可以用定时信号中断
+    use_alarm = bool(timeout) and hasattr(signal, 'setitimer')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        result = run_script(script_content, namespace_modules, output)
+    except ExecutionTimeout:
+        result = _timeout_result(output, timeout)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    result['usage'] = meter.stop()
+
+    result['start_latency'] = start_latency
+    result['cold_start'] = cold_start
+    return result
+
+
+class StartLatencyStats:
+    """进程池冷/热启动延迟统计，用于调整预加载模块列表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {True: [0, 0.0], False: [0, 0.0]}
+
+    def record(self, cold_start, latency):
+        if latency is None:
+            return
+        with self._lock:
+            entry = self._data[bool(cold_start)]
+            entry[0] += 1
+            entry[1] += latency
+
+    def stats(self):
+        with self._lock:
+            cold_count, cold_total = self._data[True]
+            warm_count, warm_total = self._data[False]
+            return {
+                'cold_starts': cold_count,
+                'warm_starts': warm_count,
+                'avg_cold_latency': cold_total / cold_count if cold_count else None,
+                'avg_warm_latency': warm_total / warm_count if warm_count else None
+            }
+
+
+start_latency_stats = StartLatencyStats()
+
+
+def get_process_pool(config):
+    """
+    获取（必要时创建）脚本执行进程池
+    forkserver 模式下 fork server 预先导入执行器和 SCHEDULER_PRELOAD_MODULES，
+    之后的工作进程都从这份已初始化的状态 fork 出来，免去每个进程重复导入
+    """
+    global _process_pool
+
+    with _process_pool_lock:
+        if _process_pool is None:
+            max_workers = config.get('SCHEDULER_PROCESS_WORKERS') or multiprocessing.cpu_count()
+            start_method = config.get('SCHEDULER_PROCESS_START_METHOD', 'forkserver')
+            if start_method not in multiprocessing.get_all_start_methods():
+                logger.warning(f"Start method '{start_method}' is not available, falling back to spawn")
+                start_method = 'spawn'
+            preload = list(config.get('SCHEDULER_PRELOAD_MODULES') or [])
+
+            mp_context = multiprocessing.get_context(start_method)
+            if start_method == 'forkserver':
+                mp_context.set_forkserver_preload(['app.executor'] + preload)
+
+            _process_pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=mp_context,
+                initializer=_init_worker,
+                initargs=(preload,)
+            )
+            _process_pool_info.update(workers=max_workers, start_method=start_method, preload=preload)
+            logger.info(f"Process pool started with {max_workers} workers ({start_method}, preload={preload})")
+        return _process_pool
+
+
+def prewarm_process_pool(config):
+    """提前启动全部工作进程，使首次执行也是热启动"""
+    pool = get_process_pool(config)
+    for _ in range(_process_pool_info['workers']):
+        pool.submit(_warmup)
+
+
+def process_pool_stats():
+    """进程池配置与冷/热启动延迟统计"""
+    with _process_pool_lock:
+        info = dict(_process_pool_info, running=_process_pool is not None)
+    info.update(start_latency_stats.stats())
+    return info
+
+
+def run_in_process_pool(script_content, config, timeout=None):
+    """在进程池中执行脚本，阻塞等待结果"""
+    pool = get_process_pool(config)
+    wait = timeout + PROCESS_TIMEOUT_GRACE if timeout else None
+    try:
+        future = pool.submit(
+            _run_script_in_worker, script_content, config.get('SCRIPT_NAMESPACE_MODULES'),
+            output_limits(config), timeout, time.time()
+        )
+    except BrokenProcessPool as e:
+        return _process_pool_broken(pool, e)
+
+    with _process_pool_lock:
+        _pool_inflight.setdefault(pool, {})[future] = False
+    try:
+        result = future.result(timeout=wait)
+    except concurrent.futures.TimeoutError:
+        # 子进程未能自行中断（如阻塞在 C 调用或屏蔽信号的调用中），回收所在的进程池以终止它
+        logger.error(f"Worker process did not stop within {wait} seconds, recycling the process pool")
+        watchdog.record()
+        _recycle_process_pool(pool, future)
+        return {
+            'status': 'TIMEOUT',
+            'output': '',
+            'error': f"Execution exceeded timeout of {timeout} seconds"
+        }
+    except BrokenProcessPool as e:
+        return _process_pool_broken(pool, e)
+    finally:
+        with _process_pool_lock:
+            inflight = _pool_inflight.get(pool)
+            if inflight is not None and not inflight.get(future):
+                inflight.pop(future, None)
+
+    if result['status'] == 'TIMEOUT':
+        watchdog.record()
+    start_latency_stats.record(result['cold_start'], result['start_latency'])
+    return result
+
+
+def _process_pool_broken(pool, error):
+    """工作进程异常退出（如脚本调用 os._exit），重建进程池"""
+    global _process_pool
+
+    logger.error(f"Process pool is broken, recreating: {error}")
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+        if pool not in _recycling_pools:
+            _pool_inflight.pop(pool, None)
+    pool.shutdown(wait=False)
+    return {'status': 'FAILED', 'output': '', 'error': f"Worker process terminated abruptly: {error}"}
+
+
+def _recycle_process_pool(pool, future):
+    """
+    回收有执行超时卡住的进程池：之后的执行改由新建的进程池承担，
+    旧进程池中的其他执行结束后（最长为各自的超时时间）终止其全部工作进程。
+    ProcessPoolExecutor 中任一工作进程被终止都会使整个池失效，因此不能只终止卡住的那一个
+    """
+    global _process_pool
+
+    with _process_pool_lock:
+        _pool_inflight.setdefault(pool, {})[future] = True
+        if _process_pool is not pool:
+            return  # 已在回收中
+        _process_pool = None
+        _process_pool_info['recycled'] += 1
+        _recycling_pools.add(pool)
+    threading.Thread(target=_reap_process_pool, args=(pool,), name='process-pool-reaper', daemon=True).start()
+
+
+def _reap_process_pool(pool):
+    while True:
+        with _process_pool_lock:
+            running = [f for f, abandoned in _pool_inflight.get(pool, {}).items() if not abandoned and not f.done()]
+        if not running:
+            break
+        concurrent.futures.wait(running, timeout=1.0)
+
+    with _process_pool_lock:
+        abandoned = len(_pool_inflight.pop(pool, {}))
+        _recycling_pools.discard(pool)
+    processes = _kill_workers(pool)
+    pool.shutdown(wait=False)
+    logger.warning(f"Recycled process pool: killed {processes} workers, {abandoned} timed-out executions")
+
+
+def _kill_workers(pool):
+    """终止进程池的全部工作进程，返回终止的进程数"""
+    killed = 0
+    for process in list((getattr(pool, '_processes', None) or {}).values()):
+        if process.is_alive():
+            process.kill()
+            killed += 1
+    return killed
+
+
+def shutdown_process_pool(wait=True):
+    """关闭脚本执行进程池"""
+    global _process_pool
+
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=wait)
+            _process_pool = None
+            logger.info("Process pool shut down")
+        recycling = list(_recycling_pools)
+    # 尚在回收中的进程池直接终止
+    for pool in recycling:
+        _kill_workers(pool)
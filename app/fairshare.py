@@ -0,0 +1,275 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+
+from apscheduler.executors.base import run_job
+from apscheduler.executors.pool import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 执行器饱和时到期任务的处理方式
+OVERFLOW_POLICIES = ('queue', 'coalesce', 'skip', 'shed')
+
+
+class _UserQueue:
+    """单个用户的等待队列与统计"""
+
+    def __init__(self, user_id, quota, weight):
+        self.user_id = user_id
+        self.quota = quota
+        self.weight = weight
+        self.heap = []  # [-优先级, 序号, 入队时间, job, run_times]
+        self.running = 0
+        self.vtime = 0.0  # 加权公平队列的虚拟时间
+        self.dispatched = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def stats(self):
+        return {
+            'user_id': self.user_id,
+            'queued': len(self.heap),
+            'running': self.running,
+            'quota': self.quota,
+            'weight': self.weight,
+            'dispatched': self.dispatched,
+            'avg_wait': self.wait_total / self.dispatched if self.dispatched else 0.0,
+            'max_wait': self.wait_max
+        }
+
+
+class FairShareExecutor(ThreadPoolExecutor):
+    """
+    公平调度的线程池执行器：
+    - 到期任务先进入所属用户的队列，用户内按任务优先级（高者先）和到期顺序排列
+    - 有空闲线程时，在未达到并发配额的用户中选择虚拟时间最小者出队（加权公平队列），
+      每出队一次该用户的虚拟时间增加 1/权重，管理员的配额和权重更高
+    - 排队总数不超过 max_queue_depth，无法立即执行的任务按其溢出策略入队、合并、跳过或挤出低优先级任务
+    - 单个任务的并发数仍由 max_instances 限制
+    - 并发线程数由出队时的 max_workers 检查限制，内部线程池按上限 pool_limit 创建（线程按需启动），
+      运行时调整 max_workers 无需改动线程池
+    """
+
+    def __init__(self, max_workers=20, owner_resolver=None, user_quota=5, admin_quota=10,
+                 user_weight=1, admin_weight=2, max_queue_depth=200, pool_limit=None, pool_kwargs=None):
+        """
+        Args:
+            owner_resolver: 根据 Job 返回 (user_id, is_admin, priority, overflow_policy) 的回调
+            pool_limit: 运行时可调整到的最大线程数，默认为 max_workers
+        """
+        self.max_workers = int(max_workers)
+        self.pool_limit = max(int(pool_limit or 0), self.max_workers)
+        super().__init__(self.pool_limit, pool_kwargs)
+        self.owner_resolver = owner_resolver
+        self.user_quota = user_quota
+        self.admin_quota = admin_quota
+        self.user_weight = user_weight
+        self.admin_weight = admin_weight
+        self.max_queue_depth = int(max_queue_depth)
+        self._queues = {}
+        self._queued = 0
+        self._running = 0
+        self._vtime = 0.0  # 系统虚拟时间：最近一次出队时的用户虚拟时间
+        self._counter = itertools.count()
+        self._fair_lock = threading.Lock()
+        self._dropped = dict.fromkeys(('rejected', 'skipped', 'coalesced', 'shed'), 0)
+        self._recent_drops = deque(maxlen=20)
+        self._saturated = False
+
+    def _resolve(self, job):
+        if self.owner_resolver is None:
+            return None, False, 0, 'queue'
+        try:
+            return self.owner_resolver(job)
+        except Exception as e:
+            logger.error(f"Failed to resolve owner of job {job.id}: {e}")
+            return None, False, 0, 'queue'
+
+    def submit_job(self, job, run_times):
+        """
+        基类先按 max_instances 检查再调用 _do_submit_job，排队中的执行也计入实例数，
+        同一任务已在排队时再次触发会直接达到 max_instances 而无法合并。
+        合并策略的任务在这里先与排队中的执行合并（不计入实例数），其余情况交给基类
+        """
+        user_id, _, _, policy = self._resolve(job)
+        if policy == 'coalesce':
+            with self._fair_lock:
+                queue = self._queues.get(user_id)
+                waiting = next((entry for entry in queue.heap if entry[3].id == job.id), None) if queue else None
+                if waiting is not None:
+                    # 排队中的执行改用最新的计划时间，避免合并后因等待过久被判定为错过
+                    waiting[4] = run_times
+            if waiting is not None:
+                self._record_drop(job, 'coalesced')
+                return
+        super().submit_job(job, run_times)
+
+    def _do_submit_job(self, job, run_times):
+        user_id, is_admin, priority, policy = self._resolve(job)
+        with self._fair_lock:
+            queue = self._queues.get(user_id)
+            if queue is None:
+                queue = _UserQueue(user_id,
+                                   self.admin_quota if is_admin else self.user_quota,
+                                   self.admin_weight if is_admin else self.user_weight)
+                self._queues[user_id] = queue
+            if not queue.heap and not queue.running:
+                # 空闲后重新活跃的用户不能用积攒的虚拟时间插队
+                queue.vtime = max(queue.vtime, self._vtime)
+            entry = [-(priority or 0), next(self._counter), time.monotonic(), job, run_times]
+            dropped = self._admit(queue, entry, policy)
+            ready = self._select()
+            self._check_saturation()
+        for dropped_job, reason in dropped:
+            self._drop(dropped_job, reason)
+        self._start(ready)
+
+    def _admit(self, queue, entry, policy):
+        """
+        在持有 _fair_lock 时按溢出策略处理到期任务
+        Returns:
+            list: 被丢弃的 (job, 原因)，需在释放锁后通知调度器
+        """
+        job = entry[3]
+        can_start = self._running < self.max_workers and queue.running < queue.quota and not queue.heap
+        if not can_start and policy == 'skip':
+            return [(job, 'skipped')]
+        # 合并策略已在 submit_job 中与排队中的执行合并，到这里时没有可合并的执行，按排队处理
+
+        dropped = []
+        if self._queued >= self.max_queue_depth:
+            victim = self._lowest_priority() if policy == 'shed' else None
+            if victim is None or victim[1][0] <= entry[0]:
+                return [(job, 'rejected')]
+            victim_queue, victim_entry = victim
+            victim_queue.heap.remove(victim_entry)
+            heapq.heapify(victim_queue.heap)
+            self._queued -= 1
+            dropped.append((victim_entry[3], 'shed'))
+
+        heapq.heappush(queue.heap, entry)
+        self._queued += 1
+        return dropped
+
+    def _lowest_priority(self):
+        """排队任务中优先级最低且最晚入队的一个 (队列, 条目)"""
+        lowest = None
+        for queue in self._queues.values():
+            for entry in queue.heap:
+                if lowest is None or (entry[0], entry[1]) > (lowest[1][0], lowest[1][1]):
+                    lowest = (queue, entry)
+        return lowest
+
+    def _check_saturation(self):
+        """队列深度超过上限的 80% 时告警，回落到一半以下时解除"""
+        if not self._saturated and self._queued >= self.max_queue_depth * 0.8:
+            self._saturated = True
+            logger.warning(f"Executor saturated: {self._queued}/{self.max_queue_depth} jobs queued, "
+                           f"{self._running}/{self.max_workers} running")
+        elif self._saturated and self._queued < self.max_queue_depth * 0.5:
+            self._saturated = False
+            logger.info(f"Executor queue drained to {self._queued} jobs")
+
+    def _record_drop(self, job, reason):
+        with self._fair_lock:
+            self._dropped[reason] += 1
+            self._recent_drops.append({'job_id': job.id, 'reason': reason, 'at': time.time()})
+        logger.warning(f"Job {job.id} {reason} by admission control")
+
+    def _drop(self, job, reason):
+        """丢弃未执行的任务：计数并释放调度器为其记录的运行实例"""
+        self._record_drop(job, reason)
+        self._run_job_success(job.id, [])
+
+    def _select(self):
+        """在持有 _fair_lock 时选出可以立即执行的任务"""
+        ready = []
+        now = time.monotonic()
+        while self._running < self.max_workers:
+            candidates = [q for q in self._queues.values() if q.heap and q.running < q.quota]
+            if not candidates:
+                break
+            queue = min(candidates, key=lambda q: (q.vtime, q.heap[0][0], q.heap[0][1]))
+            _, _, enqueued_at, job, run_times = heapq.heappop(queue.heap)
+            self._queued -= 1
+            self._vtime = queue.vtime
+            queue.vtime += 1.0 / queue.weight
+            queue.running += 1
+            self._running += 1
+
+            wait = now - enqueued_at
+            queue.dispatched += 1
+            queue.wait_total += wait
+            queue.wait_max = max(queue.wait_max, wait)
+            ready.append((queue, job, run_times))
+        return ready
+
+    def _start(self, ready):
+        for queue, job, run_times in ready:
+            def callback(f, queue=queue, job=job):
+                # 先释放配额并调度下一批，再通知调度器（避免在持有 _fair_lock 时获取基类的锁）
+                with self._fair_lock:
+                    queue.running -= 1
+                    self._running -= 1
+                    following = self._select()
+                self._start(following)
+
+                exc, tb = (f.exception_info() if hasattr(f, 'exception_info') else
+                           (f.exception(), getattr(f.exception(), '__traceback__', None)))
+                if exc:
+                    self._run_job_error(job.id, exc, tb)
+                else:
+                    self._run_job_success(job.id, f.result())
+
+            f = self._pool.submit(run_job, job, job._jobstore_alias, run_times, self._logger.name)
+            f.add_done_callback(callback)
+
+    def resize(self, max_workers):
+        """
+        运行时调整并发线程数（不超过 pool_limit）：扩容后立即调度排队任务；
+        缩容时正在执行的任务继续运行，完成后不再补位，直到执行数回落到新的上限以下
+        Raises:
+            ValueError: 超出 pool_limit
+        """
+        max_workers = int(max_workers)
+        if not 1 <= max_workers <= self.pool_limit:
+            raise ValueError(f"max_workers must be between 1 and {self.pool_limit}")
+        with self._fair_lock:
+            self.max_workers = max_workers
+            ready = self._select()
+        self._start(ready)
+        logger.info(f"Executor resized to {self.max_workers} workers")
+
+    def shutdown(self, wait=True):
+        with self._fair_lock:
+            dropped = sum(len(q.heap) for q in self._queues.values())
+            for queue in self._queues.values():
+                queue.heap = []
+            self._queued = 0
+        if dropped:
+            logger.warning(f"Dropped {dropped} queued jobs on shutdown")
+        super().shutdown(wait)
+
+    def stats(self):
+        """全局及各用户的排队、并发、等待时间和丢弃统计"""
+        now = time.monotonic()
+        with self._fair_lock:
+            users = [q.stats() for q in self._queues.values()]
+            oldest = min((entry[2] for q in self._queues.values() for entry in q.heap), default=None)
+            dispatched = sum(q.dispatched for q in self._queues.values())
+            return {
+                'max_workers': self.max_workers,
+                'running': self._running,
+                'queued': self._queued,
+                'max_queue_depth': self.max_queue_depth,
+                'saturated': self._saturated,
+                'oldest_wait': now - oldest if oldest is not None else 0.0,
+                'avg_wait': (sum(q.wait_total for q in self._queues.values()) / dispatched
+                             if dispatched else 0.0),
+                'dropped': dict(self._dropped),
+                'recent_drops': list(self._recent_drops),
+                'users': sorted(users, key=lambda u: -u['avg_wait'])
+            }
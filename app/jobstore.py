@@ -0,0 +1,298 @@
+import heapq
+import itertools
+import logging
+import re
+import threading
+import time
+
+from apscheduler.jobstores.base import BaseJobStore, JobLookupError
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.util import datetime_to_utc_timestamp, utc_timestamp_to_datetime
+from sqlalchemy import select, func, and_
+
+from app.models import Task
+
+logger = logging.getLogger(__name__)
+
+# 由任务表派生的周期任务 ID
+TASK_JOB_ID = re.compile(r'^task_(\d+)$')
+
+
+class NextFireIndex:
+    """
+    内存中的下次执行时间索引：以最小堆按下次执行时间排序，任务变化时惰性删除旧堆节点。
+    由任务存储在增删改（含每次触发后写入新的下次执行时间）时维护，
+    状态查询和健康检查无需再从数据库加载并反序列化全部任务
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # job_id -> 任务信息
+        self._heap = []  # (时间戳, 序号, job_id)
+        self._counter = itertools.count()
+        self._removed = {}  # job_id -> 移除时间，重建索引时用于判断快照是否过期
+        self.rebuilt_at = None
+
+    @staticmethod
+    def _describe(job, alias):
+        return {
+            'id': job.id,
+            'name': job.name,
+            'next_run_time': job.next_run_time,
+            'trigger': str(job.trigger),
+            'pending': False,
+            'jobstore': alias,
+            '_updated': time.monotonic()
+        }
+
+    def _push(self, info):
+        if info['next_run_time'] is not None:
+            seq = next(self._counter)
+            info['_seq'] = seq
+            heapq.heappush(self._heap, (info['next_run_time'].timestamp(), seq, info['id']))
+        # 失效节点过多时重建堆
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [entry for entry in self._heap if self._valid(entry)]
+            heapq.heapify(self._heap)
+
+    def _valid(self, entry):
+        info = self._entries.get(entry[2])
+        return info is not None and info.get('_seq') == entry[1]
+
+    def set(self, job, alias):
+        """记录任务的最新状态，O(log n)"""
+        info = self._describe(job, alias)
+        with self._lock:
+            self._entries[job.id] = info
+            self._removed.pop(job.id, None)
+            self._push(info)
+
+    def remove(self, job_id):
+        with self._lock:
+            self._entries.pop(job_id, None)
+            self._removed[job_id] = time.monotonic()
+
+    def remove_store(self, alias):
+        with self._lock:
+            for job_id in [k for k, v in self._entries.items() if v['jobstore'] == alias]:
+                del self._entries[job_id]
+
+    def rebuild(self, jobs_by_store, since=None):
+        """
+        用各任务存储的全部任务重建索引
+        Args:
+            since: 读取快照开始的时间（time.monotonic()），此后发生的增量变化比快照更新，予以保留
+        """
+        with self._lock:
+            previous = self._entries
+            removed = self._removed
+            self._entries = {}
+            self._heap = []
+            self._removed = {}
+            for alias, jobs in jobs_by_store.items():
+                for job in jobs:
+                    if since is not None and removed.get(job.id, 0) > since:
+                        continue
+                    info = self._describe(job, alias)
+                    self._entries[job.id] = info
+            if since is not None:
+                for job_id, info in previous.items():
+                    if info['_updated'] > since:
+                        self._entries[job_id] = info
+            for info in self._entries.values():
+                self._push(info)
+            self.rebuilt_at = time.time()
+
+    def count(self):
+        return len(self._entries)
+
+    def next_run(self):
+        """最早的下次执行时间，摊还 O(log n)"""
+        with self._lock:
+            while self._heap and not self._valid(self._heap[0]):
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return None
+            return self._entries[self._heap[0][2]]['next_run_time']
+
+    def upcoming(self, limit=10):
+        """即将执行的前 limit 个任务，O(k log k)（沿堆结构扩展候选节点，不遍历整个堆）"""
+        result = []
+        with self._lock:
+            heap = self._heap
+            candidates = [(heap[0], 0)] if heap else []
+            while candidates and len(result) < limit:
+                entry, index = heapq.heappop(candidates)
+                if self._valid(entry):
+                    result.append(self._public(self._entries[entry[2]]))
+                for child in (2 * index + 1, 2 * index + 2):
+                    if child < len(heap):
+                        heapq.heappush(candidates, (heap[child], child))
+        return result
+
+    def get(self, job_id):
+        with self._lock:
+            info = self._entries.get(job_id)
+            return self._public(info) if info else None
+
+    def all(self):
+        """全部任务，按下次执行时间排序，暂停的任务排在最后"""
+        with self._lock:
+            infos = [self._public(info) for info in self._entries.values()]
+        infos.sort(key=lambda info: (info['next_run_time'] is None,
+                                     info['next_run_time'].timestamp() if info['next_run_time'] else 0))
+        return infos
+
+    @staticmethod
+    def _public(info):
+        return {k: v for k, v in info.items() if not k.startswith('_') and k != 'jobstore'}
+
+
+class IndexedJobStoreMixin:
+    """任务存储写入成功后同步更新 NextFireIndex"""
+
+    def __init__(self, *args, index=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.index = index
+
+    def add_job(self, job):
+        super().add_job(job)
+        if self.index is not None:
+            self.index.set(job, self._alias)
+
+    def update_job(self, job):
+        super().update_job(job)
+        if self.index is not None:
+            self.index.set(job, self._alias)
+
+    def remove_job(self, job_id):
+        super().remove_job(job_id)
+        if self.index is not None:
+            self.index.remove(job_id)
+
+    def remove_all_jobs(self):
+        super().remove_all_jobs()
+        if self.index is not None:
+            self.index.remove_store(self._alias)
+
+
+class TaskJobStore(BaseJobStore):
+    """
+    以 tasks 表为数据源的任务存储：
+    触发器由 Task 的调度配置实时构建，只在 tasks.next_run_time 中保存下次执行时间（UTC 时间戳），
+    任务配置不再以 pickle 形式重复保存。next_run_time 为空表示任务已暂停或已移除，
+    暂停另记在 is_paused 中：启动时只为未暂停的启用任务补算下次执行时间。
+    一次性的重试任务等无法由任务表派生的任务需放在其他任务存储中
+    """
+
+    def __init__(self, engine, job_builder):
+        """
+        Args:
+            engine: tasks 表所在数据库的 SQLAlchemy engine
+            job_builder: 根据任务行构建 Job 的回调 (row, next_run_time) -> Job | None
+        """
+        super().__init__()
+        self.engine = engine
+        self.job_builder = job_builder
+        self.table = Task.__table__
+        self._columns = [self.table.c[name] for name in (
+            'id', 'name', 'schedule_type', 'schedule_config', 'cron_expression', 'timeout',
+            'execution_backend', 'is_async', 'spread_fire_time', 'next_run_time'
+        )]
+
+    def _select(self, *conditions):
+        return select(*self._columns).where(self.table.c.is_active.is_(True), *conditions)
+
+    def _build_jobs(self, rows):
+        jobs = []
+        for row in rows:
+            next_run_time = utc_timestamp_to_datetime(row.next_run_time)
+            try:
+                job = self.job_builder(row, next_run_time)
+            except Exception as e:
+                logger.error(f"Failed to build job for task {row.id}: {e}")
+                continue
+            if job is not None:
+                job._scheduler = self._scheduler
+                job._jobstore_alias = self._alias
+                jobs.append(job)
+        return jobs
+
+    def lookup_job(self, job_id):
+        match = TASK_JOB_ID.match(job_id)
+        if not match:
+            return None
+        with self.engine.connect() as conn:
+            rows = conn.execute(self._select(self.table.c.id == int(match.group(1)))).fetchall()
+        jobs = self._build_jobs(rows)
+        return jobs[0] if jobs else None
+
+    def get_due_jobs(self, now):
+        timestamp = datetime_to_utc_timestamp(now)
+        statement = self._select(self.table.c.next_run_time <= timestamp).order_by(self.table.c.next_run_time)
+        with self.engine.connect() as conn:
+            rows = conn.execute(statement).fetchall()
+        return self._build_jobs(rows)
+
+    def get_next_run_time(self):
+        statement = select(func.min(self.table.c.next_run_time)).where(
+            and_(self.table.c.is_active.is_(True), self.table.c.next_run_time.isnot(None)))
+        with self.engine.connect() as conn:
+            timestamp = conn.execute(statement).scalar()
+        return utc_timestamp_to_datetime(timestamp)
+
+    def get_all_jobs(self):
+        statement = self._select().order_by(self.table.c.next_run_time)
+        with self.engine.connect() as conn:
+            rows = conn.execute(statement).fetchall()
+        jobs = self._build_jobs(rows)
+        self._fix_paused_jobs_sorting(jobs)
+        return jobs
+
+    def _set_next_run_time(self, job_id, next_run_time, active_only=True, paused=None):
+        """
+        写入下次执行时间，任务不存在时抛出 JobLookupError
+        Args:
+            paused: 是否暂停，默认为 next_run_time 为空（APScheduler 暂停任务即更新为空的下次执行时间）
+        """
+        match = TASK_JOB_ID.match(job_id)
+        if not match:
+            raise JobLookupError(job_id)
+        conditions = [self.table.c.id == int(match.group(1))]
+        if active_only:
+            conditions.append(self.table.c.is_active.is_(True))
+        if paused is None:
+            paused = next_run_time is None
+        # 显式保留 updated_at，调度状态的变化不算作任务修改
+        statement = self.table.update().where(*conditions).values(
+            next_run_time=datetime_to_utc_timestamp(next_run_time), is_paused=paused,
+            updated_at=self.table.c.updated_at)
+        with self.engine.begin() as conn:
+            if conn.execute(statement).rowcount == 0:
+                raise JobLookupError(job_id)
+
+    def add_job(self, job):
+        # 任务配置已在 tasks 表中，添加即写入下次执行时间（重复添加等同于更新）
+        self._set_next_run_time(job.id, job.next_run_time)
+
+    def update_job(self, job):
+        self._set_next_run_time(job.id, job.next_run_time)
+
+    def remove_job(self, job_id):
+        # 停用和删除任务时也会调用，因此不限定活动任务；移除后重新添加的任务不再处于暂停状态
+        self._set_next_run_time(job_id, None, active_only=False, paused=False)
+
+    def remove_all_jobs(self):
+        with self.engine.begin() as conn:
+            conn.execute(self.table.update().values(next_run_time=None, is_paused=False))
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} (engine={self.engine.url!r})>'
+
+
+class IndexedTaskJobStore(IndexedJobStoreMixin, TaskJobStore):
+    """维护 NextFireIndex 的 TaskJobStore"""
+
+
+class IndexedSQLAlchemyJobStore(IndexedJobStoreMixin, SQLAlchemyJobStore):
+    """维护 NextFireIndex 的 SQLAlchemyJobStore，用于重试等一次性任务"""
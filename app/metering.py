@@ -0,0 +1,148 @@
+import logging
+import os
+import threading
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# 单次执行记录的资源指标
+USAGE_FIELDS = ('cpu_user_time', 'cpu_system_time', 'peak_memory', 'io_read_bytes', 'io_write_bytes')
+
+try:
+    _CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+except (AttributeError, ValueError, OSError):
+    _CLOCK_TICKS = 100
+
+
+def _read_proc_io(path):
+    """读取 /proc/.../io 中的读写字节数（包含网络、管道等所有 read/write 调用）"""
+    try:
+        with open(path) as f:
+            values = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(values['rchar']), int(values['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _read_vm_hwm():
+    """当前进程的峰值常驻内存（字节）"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        # Linux 下 ru_maxrss 单位为 KB
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return None
+
+
+def _reset_vm_hwm():
+    """重置进程峰值内存计数（Linux 4.0+），失败时峰值为进程生命周期内的最大值"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _thread_cpu(native_id=None):
+    """
+    线程 CPU 时间 (user, system)；native_id 为空表示当前线程。
+    两种方式的时钟来源和精度不同，同一次计量的起止必须使用同一种方式
+    """
+    if native_id is None:
+        if resource is not None and hasattr(resource, 'RUSAGE_THREAD'):
+            usage = resource.getrusage(resource.RUSAGE_THREAD)
+            return usage.ru_utime, usage.ru_stime
+        return None, None
+
+    # 读取任意线程的 CPU 时间（精度为一个时钟周期）
+    try:
+        with open(f'/proc/self/task/{native_id}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return int(fields[11]) / _CLOCK_TICKS, int(fields[12]) / _CLOCK_TICKS
+    except (OSError, IndexError, ValueError):
+        return None, None
+
+
+def _process_cpu():
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_utime, usage.ru_stime
+    times = os.times()
+    return times.user, times.system
+
+
+def _delta(end, start):
+    if end is None or start is None:
+        return None
+    return max(end - start, 0)
+
+
+class ResourceMeter:
+    """
+    单次执行的资源计量
+    - scope='thread'：统计脚本线程自身的 CPU 与 I/O；同一进程内的线程共享内存，不记录峰值内存
+    - scope='process'：统计整个工作进程，执行前重置峰值内存计数；重置失败时不记录峰值内存
+      （此时读到的是进程生命周期内的最大值，不能代表本次执行）
+    """
+
+    def __init__(self, scope='thread'):
+        self.scope = scope
+        self.native_id = None
+        self._start = None
+        self._start_proc_cpu = (None, None)  # 线程模式下按 /proc 读取的起始 CPU 时间，供其他线程结束计量
+        self._hwm_reset = False
+
+    def start(self):
+        if self.scope == 'thread':
+            self.native_id = threading.get_native_id()
+            cpu = _thread_cpu()
+            self._start_proc_cpu = _thread_cpu(self.native_id)
+            io = _read_proc_io(f'/proc/self/task/{self.native_id}/io')
+        else:
+            self._hwm_reset = _reset_vm_hwm()
+            cpu = _process_cpu()
+            io = _read_proc_io('/proc/self/io')
+        self._start = cpu + io
+        return self
+
+    def stop(self, from_other_thread=False):
+        """
+        结束计量并返回各项指标
+        Args:
+            from_other_thread: 线程模式下由其他线程读取（如超时后由看门狗读取）
+        """
+        if self._start is None:
+            return dict.fromkeys(USAGE_FIELDS)
+
+        start_user, start_system, start_read, start_write = self._start
+        if self.scope == 'thread':
+            if from_other_thread:
+                # 其他线程只能读取 /proc，起点也取同一来源
+                cpu = _thread_cpu(self.native_id)
+                start_user, start_system = self._start_proc_cpu
+            else:
+                cpu = _thread_cpu()
+            io = _read_proc_io(f'/proc/self/task/{self.native_id}/io')
+            peak_memory = None
+        else:
+            cpu = _process_cpu()
+            io = _read_proc_io('/proc/self/io')
+            peak_memory = _read_vm_hwm() if self._hwm_reset else None
+
+        return {
+            'cpu_user_time': _delta(cpu[0], start_user),
+            'cpu_system_time': _delta(cpu[1], start_system),
+            'peak_memory': peak_memory,
+            'io_read_bytes': _delta(io[0], start_read),
+            'io_write_bytes': _delta(io[1], start_write)
+        }
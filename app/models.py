@@ -4,6 +4,7 @@ from datetime import datetime
 import pytz
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from app.cron import validate_cron
 
 def get_beijing_time():
     """获取北京时间的辅助函数"""
@@ -37,6 +38,10 @@ class User(UserMixin, db.Model):
 
 class Task(db.Model):
     __tablename__ = 'tasks'
+    __table_args__ = (
+        # 任务列表：按用户过滤、按创建时间倒序
+        db.Index('ix_tasks_user_id_created_at', 'user_id', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -55,6 +60,16 @@ class Task(db.Model):
     timeout = db.Column(db.Integer, default=3600)
     max_retries = db.Column(db.Integer, default=0)
     retry_count = db.Column(db.Integer, default=0)
+    execution_backend = db.Column(db.String(20))  # 为空时使用全局配置 SCHEDULER_EXECUTION_BACKEND
+    is_async = db.Column(db.Boolean, default=False)  # 脚本以 async def main() 为入口，验证脚本时识别
+    spread_fire_time = db.Column(db.Boolean)  # 是否错开触发时间，为空时使用全局配置 SCHEDULER_SPREAD_FIRE_TIMES
+    priority = db.Column(db.Integer, default=0)  # 同一用户的任务排队时优先级高者先执行
+    overflow_policy = db.Column(db.String(20))  # 执行器饱和时的处理方式，为空时使用全局配置 SCHEDULER_OVERFLOW_POLICY
+    next_run_time = db.Column(db.Float, index=True)  # 下次执行时间（UTC 时间戳），由调度器维护，为空表示未调度
+    is_paused = db.Column(db.Boolean, default=False)  # 调度已暂停（next_run_time 为空），与用户启用/停用任务的 is_active 相互独立
+    # 执行日志保留天数和条数，为空时使用全局配置 LOG_RETENTION_DAYS / LOG_RETENTION_MAX_ROWS，0 表示不限制
+    log_retention_days = db.Column(db.Integer)
+    log_max_rows = db.Column(db.Integer)
 
     script_source = db.Column(db.String(20), default='editor')
     original_filename = db.Column(db.String(255))
@@ -64,12 +79,20 @@ class Task(db.Model):
     logs = db.relationship('TaskLog', backref='task', lazy='dynamic',
                           cascade='all, delete-orphan')
 
+    # 依赖的上游任务（schedule_type 为 dependent 时，全部上游成功后触发）
+    upstreams = db.relationship('Task', secondary='task_dependencies',
+                                primaryjoin='Task.id == TaskDependency.task_id',
+                                secondaryjoin='Task.id == TaskDependency.upstream_id',
+                                backref='downstreams')
+
     def __repr__(self):
         return f'<Task {self.name}>'
 
     @property
     def schedule_display(self):
         """返回人类可读的调度配置"""
+        if self.schedule_type == 'dependent':
+            return f"上游完成后: {', '.join(t.name for t in self.upstreams) or '-'}"
         if not self.schedule_config:
             return self.cron_expression
 
@@ -127,19 +150,148 @@ class Task(db.Model):
             hour, minute = config['time'].split(':')
             self.cron_expression = f"{minute} {hour} {config['day']} * *"
         elif schedule_type == 'custom':
+            valid, error = validate_cron(config['expression'])
+            if not valid:
+                raise ValueError(f'无效的Cron表达式: {error}')
             self.cron_expression = config['expression']
+        elif schedule_type == 'dependent':
+            # 由上游任务触发，没有周期调度
+            self.cron_expression = ''
 
 class TaskLog(db.Model):
     __tablename__ = 'task_logs'
+    __table_args__ = (
+        # 任务日志页：按任务过滤、按开始时间倒序
+        db.Index('ix_task_logs_task_id_start_time', 'task_id', 'start_time'),
+        # 监控页：按状态统计，最近执行记录按开始时间倒序
+        db.Index('ix_task_logs_status_start_time', 'status', 'start_time'),
+        db.Index('ix_task_logs_start_time', 'start_time'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     task_id = db.Column(db.Integer, db.ForeignKey('tasks.id'), nullable=False)
     start_time = db.Column(db.DateTime(timezone=True), nullable=False, default=get_beijing_time)
     end_time = db.Column(db.DateTime(timezone=True))
     status = db.Column(db.String(50))
-    log_output = db.Column(db.Text)
+    log_output = db.Column(db.Text)  # 输出较大时仅为预览，完整内容见 output_ref
     error_message = db.Column(db.Text)
+    output_ref = db.Column(db.String(64), index=True)  # BlobStore 中完整输出的引用
+    error_ref = db.Column(db.String(64), index=True)
     execution_time = db.Column(db.Float)
+    start_latency = db.Column(db.Float)  # 从提交到脚本开始执行的延迟（秒）
+    cold_start = db.Column(db.Boolean)  # 进程池模式下是否为工作进程的首次执行
+    attempt = db.Column(db.Integer, default=0)  # 重试序号，首次执行为 0
+    retry_of_id = db.Column(db.Integer, db.ForeignKey('task_logs.id'))  # 重试所对应的最初执行
+    dag_run_id = db.Column(db.Integer, db.ForeignKey('dag_runs.id'), index=True)  # 所属的 DAG 运行
+
+    # 资源消耗（线程模式下峰值内存无法按线程区分，不记录）
+    cpu_user_time = db.Column(db.Float)  # 用户态 CPU 时间（秒）
+    cpu_system_time = db.Column(db.Float)  # 内核态 CPU 时间（秒）
+    peak_memory = db.Column(db.BigInteger)  # 峰值常驻内存（字节）
+    io_read_bytes = db.Column(db.BigInteger)
+    io_write_bytes = db.Column(db.BigInteger)
+
+    def __repr__(self):
+        return f'<TaskLog {self.task_id} {self.status}>'
+
+class TaskLogDailyStat(db.Model):
+    """清理前汇总的执行日志：按任务和日期（北京时间）统计"""
+    __tablename__ = 'task_log_daily_stats'
+    __table_args__ = (db.UniqueConstraint('task_id', 'day'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, db.ForeignKey('tasks.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False, index=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    success_count = db.Column(db.Integer, nullable=False, default=0)
+    failure_count = db.Column(db.Integer, nullable=False, default=0)  # 含超时
+    timeout_count = db.Column(db.Integer, nullable=False, default=0)
+    # 执行耗时（秒）；同一天分多批汇总时分位数按条数加权合并，为近似值
+    duration_count = db.Column(db.Integer, nullable=False, default=0)  # 记录了耗时的执行次数
+    total_duration = db.Column(db.Float, nullable=False, default=0.0)
+    min_duration = db.Column(db.Float)
+    max_duration = db.Column(db.Float)
+    p50_duration = db.Column(db.Float)
+    p95_duration = db.Column(db.Float)
+    p99_duration = db.Column(db.Float)
+    updated_at = db.Column(db.DateTime(timezone=True), default=get_beijing_time, onupdate=get_beijing_time)
+
+    @property
+    def avg_duration(self):
+        return self.total_duration / self.duration_count if self.duration_count else None
+
+    def __repr__(self):
+        return f'<TaskLogDailyStat {self.task_id} {self.day}>'
+
+
+class StatCounter(db.Model):
+    """监控页的统计计数器，随任务增删改和执行增量维护，可通过 flask rebuild-stats 从原始数据重新计算"""
+    __tablename__ = 'stat_counters'
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<StatCounter {self.name}={self.value}>'
+
+
+class TaskDependency(db.Model):
+    """任务依赖：task_id 在 upstream_id 执行成功后触发"""
+    __tablename__ = 'task_dependencies'
+    __table_args__ = (db.UniqueConstraint('task_id', 'upstream_id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, db.ForeignKey('tasks.id'), nullable=False, index=True)
+    upstream_id = db.Column(db.Integer, db.ForeignKey('tasks.id'), nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<TaskDependency {self.upstream_id} -> {self.task_id}>'
+
+class DagRun(db.Model):
+    """一次 DAG 运行：从根任务开始执行到所有下游任务完成"""
+    __tablename__ = 'dag_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    root_task_id = db.Column(db.Integer, db.ForeignKey('tasks.id', ondelete='SET NULL'), index=True)
+    status = db.Column(db.String(50), default='RUNNING')  # RUNNING / SUCCESS / FAILED
+    start_time = db.Column(db.DateTime(timezone=True), nullable=False, default=get_beijing_time)
+    end_time = db.Column(db.DateTime(timezone=True))
+    duration = db.Column(db.Float)  # 端到端耗时（秒）
+
+    root_task = db.relationship('Task', foreign_keys=[root_task_id])
+    logs = db.relationship('TaskLog', backref='dag_run', lazy='dynamic')
+
+    def __repr__(self):
+        return f'<DagRun {self.id} {self.status}>'
+
+class SchedulerSettingChange(db.Model):
+    """调度器运行时设置的修改记录，启动时按每项设置的最新记录恢复"""
+    __tablename__ = 'scheduler_setting_changes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    setting = db.Column(db.String(50), nullable=False, index=True)
+    old_value = db.Column(db.JSON)
+    new_value = db.Column(db.JSON)
+    snapshot = db.Column(db.JSON)  # 修改时的执行器负载（执行中、排队、触发速率），用于对照吞吐量变化
+    instance = db.Column(db.String(200))  # 执行修改的调度器实例
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    changed_at = db.Column(db.DateTime(timezone=True), default=get_beijing_time)
+
+    user = db.relationship('User')
+
+    def __repr__(self):
+        return f'<SchedulerSettingChange {self.setting} {self.old_value} -> {self.new_value}>'
+
+class SchedulerLease(db.Model):
+    """调度租约：多进程/多节点部署时只有持有租约的实例触发任务"""
+    __tablename__ = 'scheduler_leases'
+
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(200))  # 持有者标识（主机名:进程号:随机串）
+    token = db.Column(db.Integer, default=0, nullable=False)  # 每次易主递增
+    expires_at = db.Column(db.Float, default=0, nullable=False)  # 到期时间（UNIX 时间戳）
+    acquired_at = db.Column(db.Float)
+    renewed_at = db.Column(db.Float)
 
     def __repr__(self):
-        return f'<TaskLog {self.task_id} {self.status}>'
\ No newline at end of file
+        return f'<SchedulerLease {self.name} {self.holder}>'
@@ -0,0 +1,224 @@
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytz
+
+from app.extensions import db
+from app.models import Task, TaskLog, TaskLogDailyStat
+from app.blobstore import release_blobs
+
+logger = logging.getLogger(__name__)
+
+BEIJING_TZ = pytz.timezone('Asia/Shanghai')
+
+FAILURE_STATUSES = ('FAILED', 'TIMEOUT')
+
+
+def _localize(value):
+    if value.tzinfo is None:
+        return BEIJING_TZ.localize(value)
+    return value.astimezone(BEIJING_TZ)
+
+
+def _percentile(values, q):
+    """已排序数据的分位数（最近秩法）"""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, math.ceil(q * len(values)) - 1))
+    return values[index]
+
+
+def _limit(task_value, global_value):
+    """任务未设置时使用全局配置，0 或空表示不限制"""
+    value = global_value if task_value is None else task_value
+    return value or None
+
+
+def retention_cutoff(task, config, now=None):
+    """
+    任务执行日志的清理界限：早于此时间的日志将被汇总并删除，不需要清理时返回 None
+    （保留天数和保留条数取更严格者）
+    """
+    now = now or datetime.now(BEIJING_TZ)
+    days = _limit(task.log_retention_days, config.get('LOG_RETENTION_DAYS'))
+    max_rows = _limit(task.log_max_rows, config.get('LOG_RETENTION_MAX_ROWS'))
+
+    cutoff = now - timedelta(days=days) if days else None
+    if max_rows:
+        # 第 max_rows + 1 条（按开始时间倒序）及更早的日志超出保留条数
+        oldest_kept = db.session.query(TaskLog.start_time).filter(TaskLog.task_id == task.id) \
+            .order_by(TaskLog.start_time.desc()).offset(max_rows).limit(1).scalar()
+        if oldest_kept is not None:
+            by_rows = _localize(oldest_kept) + timedelta(microseconds=1)
+            cutoff = max(cutoff, by_rows) if cutoff else by_rows
+    return cutoff
+
+
+def _rollup(task_id, rows):
+    """把一批即将删除的日志合并进每日统计（在调用方的事务中执行）"""
+    by_day = defaultdict(list)
+    for row in rows:
+        by_day[_localize(row.start_time).date()].append(row)
+
+    for day, day_rows in by_day.items():
+        stat = TaskLogDailyStat.query.filter_by(task_id=task_id, day=day).first()
+        if stat is None:
+            stat = TaskLogDailyStat(task_id=task_id, day=day, count=0, success_count=0, failure_count=0,
+                                    timeout_count=0, duration_count=0, total_duration=0.0)
+            db.session.add(stat)
+
+        durations = sorted(row.execution_time for row in day_rows if row.execution_time is not None)
+        previous = stat.duration_count
+        stat.count += len(day_rows)
+        stat.success_count += sum(1 for row in day_rows if row.status == 'SUCCESS')
+        stat.failure_count += sum(1 for row in day_rows if row.status in FAILURE_STATUSES)
+        stat.timeout_count += sum(1 for row in day_rows if row.status == 'TIMEOUT')
+        if not durations:
+            continue
+        stat.duration_count = previous + len(durations)
+        stat.total_duration += sum(durations)
+        stat.min_duration = min(durations[0], stat.min_duration if stat.min_duration is not None else durations[0])
+        stat.max_duration = max(durations[-1], stat.max_duration if stat.max_duration is not None else durations[-1])
+        for name, q in (('p50_duration', 0.5), ('p95_duration', 0.95), ('p99_duration', 0.99)):
+            value = _percentile(durations, q)
+            old = getattr(stat, name)
+            if previous and old is not None:
+                value = (old * previous + value * len(durations)) / stat.duration_count
+            setattr(stat, name, value)
+
+
+def purge_task_logs(task, cutoff, batch_size=500, pause=0.0, stop_event=None):
+    """
+    分批汇总并删除任务早于 cutoff 的执行日志，每批一个短事务（汇总与删除同时提交），
+    批次之间暂停 pause 秒，避免长时间占用数据库写锁。运行中的日志不会被删除
+    Returns:
+        int: 删除的日志条数
+    """
+    deleted = 0
+    while not (stop_event and stop_event.is_set()):
+        try:
+            rows = db.session.query(
+                TaskLog.id, TaskLog.start_time, TaskLog.status, TaskLog.execution_time,
+                TaskLog.output_ref, TaskLog.error_ref
+            ).filter(
+                TaskLog.task_id == task.id,
+                TaskLog.start_time < cutoff,
+                db.or_(TaskLog.status.is_(None), TaskLog.status != 'RUNNING')
+            ).order_by(TaskLog.start_time).limit(batch_size).all()
+            if not rows:
+                break
+
+            ids = [row.id for row in rows]
+            _rollup(task.id, rows)
+            # 保留的重试记录不再指向被删除的最初执行
+            TaskLog.query.filter(TaskLog.retry_of_id.in_(ids)).update(
+                {'retry_of_id': None}, synchronize_session=False)
+            TaskLog.query.filter(TaskLog.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Failed to purge logs of task {task.id}: {e}", exc_info=True)
+            db.session.rollback()
+            break
+
+        deleted += len(rows)
+        release_blobs([ref for row in rows for ref in (row.output_ref, row.error_ref)])
+        if len(rows) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+def purge_logs(config, stop_event=None):
+    """
+    按保留策略清理全部任务的执行日志
+    Returns:
+        dict: 处理的任务数、删除的日志条数和耗时
+    """
+    started = time.perf_counter()
+    batch_size = config.get('LOG_PURGE_BATCH_SIZE', 500)
+    pause = config.get('LOG_PURGE_BATCH_PAUSE', 0.1)
+    now = datetime.now(BEIJING_TZ)
+    purged_tasks, deleted = 0, 0
+
+    task_ids = [task_id for (task_id,) in db.session.query(TaskLog.task_id).distinct()]
+    for task_id in task_ids:
+        if stop_event and stop_event.is_set():
+            break
+        task = Task.query.get(task_id)
+        if task is None:
+            continue
+        cutoff = retention_cutoff(task, config, now)
+        if cutoff is None:
+            continue
+        count = purge_task_logs(task, cutoff, batch_size, pause, stop_event)
+        if count:
+            purged_tasks += 1
+            deleted += count
+            logger.info(f"Purged {count} logs of task {task_id} older than {cutoff:%Y-%m-%d %H:%M:%S}")
+
+    return {
+        'tasks': purged_tasks,
+        'deleted': deleted,
+        'duration': time.perf_counter() - started
+    }
+
+
+class RetentionWorker:
+    """后台定期清理执行日志；多实例部署时只在主节点上运行"""
+
+    def __init__(self, app, interval=3600, should_run=None):
+        """
+        Args:
+            should_run: 每轮清理前调用，返回 False 时跳过（例如非主节点）
+        """
+        self.app = app
+        self.interval = interval
+        self.should_run = should_run
+        self.last_run = None
+        self.last_result = None
+        self.total_deleted = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='log-retention', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(10)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self.should_run is None or self.should_run():
+                self.run_once()
+
+    def run_once(self):
+        try:
+            with self.app.app_context():
+                result = purge_logs(self.app.config, self._stop)
+                db.session.remove()
+        except Exception as e:
+            logger.error(f"Log retention run failed: {e}", exc_info=True)
+            return None
+        self.last_run = time.time()
+        self.last_result = result
+        self.total_deleted += result['deleted']
+        if result['deleted']:
+            logger.info(f"Log retention purged {result['deleted']} logs of {result['tasks']} tasks "
+                        f"in {result['duration']:.2f}s")
+        return result
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'last_run': self.last_run,
+            'last_result': self.last_result,
+            'total_deleted': self.total_deleted
+        }
@@ -1,15 +1,43 @@
+import asyncio
 import logging
+import random
+import math
+import re
+import threading
 import time
-from datetime import datetime
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import lru_cache
 import pytz
 from flask import current_app
 from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
-from apscheduler.executors.pool import ThreadPoolExecutor
-from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED
+from apscheduler.events import (
+    EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_SUBMITTED, EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES
+)
+from apscheduler.schedulers.base import STATE_PAUSED
+from apscheduler.job import Job
+from apscheduler.triggers.date import DateTrigger
+from apscheduler.util import datetime_to_utc_timestamp
+from sqlalchemy import bindparam, or_, select
 
 from app import db
-from app.models import Task, TaskLog
+from app.models import Task, TaskLog, User, SchedulerSettingChange
+from app.coordination import LeaseCoordinator
+from app.cron import compile_cron, fire_time_histogram, next_fire_times_batch, CompiledCronTrigger
+from app.dag import begin_dag_run, on_execution_finished
+from app.blobstore import store_output
+from app.retention import RetentionWorker
+from app.stats import bump, execution_started_deltas, execution_finished_deltas
+from app import writebehind
+from app.writebehind import WriteBehindQueue, get_write_behind
+from app.fairshare import FairShareExecutor
+from app.jobstore import IndexedTaskJobStore, IndexedSQLAlchemyJobStore, NextFireIndex, TASK_JOB_ID
+from app.metering import USAGE_FIELDS
+from app.executor import (
+    resolve_backend, run_in_thread, run_in_process_pool, shutdown_process_pool, script_cache,
+    get_namespace_template, TaskOutputStream, output_limits, watchdog, prewarm_process_pool,
+    process_pool_stats, run_async_script, EventLoopExecutor
+)
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -18,6 +46,103 @@ logger = logging.getLogger(__name__)
 # 在文件开头添加
 BEIJING_TZ = pytz.timezone('Asia/Shanghai')
 
+
+@lru_cache(maxsize=4096)
+def _create_trigger(trigger_type, trigger_args):
+    """按调度参数构建触发器并缓存（触发器不可变，可在多个 Job 对象间共享）；cron 触发器使用编译后的位图计算"""
+    if trigger_type == 'cron':
+        return CompiledCronTrigger(compile_cron(dict(trigger_args), BEIJING_TZ))
+    return DateTrigger(timezone=BEIJING_TZ, **dict(trigger_args))
+
+_INTERVAL_FIELD = re.compile(r'^\*(?:/(\d+))?$')
+
+
+def spread_cron_fields(task_id, fields):
+    """
+    为周期型 cron 调度加入由任务 ID 决定的固定偏移，避免大量任务在整分/整点同时触发：
+    - 分钟为 * 或 */N：错开秒，并在 N 与 60 的最大公约数内错开分钟（保持每小时触发次数不变，N 不整除 60 时只错开秒）
+    - 分钟为 0 且小时为 * 或 */N（每 N 小时）：在一小时内错开分钟和秒
+    其余（指定具体时刻的）调度保持不变。偏移只与任务 ID 有关，重启或多实例间结果一致
+    """
+    minute, hour = fields.get('minute', '*'), fields.get('hour', '*')
+    # 乘法散列，使相邻的任务 ID 也能均匀分布
+    mixed = (task_id * 2654435761) % 2 ** 32
+    second = mixed % 60
+    spread = dict(fields)
+
+    match = _INTERVAL_FIELD.match(minute)
+    if match:
+        step = int(match.group(1) or 1)
+        # 偏移小于 gcd(N, 60) 时，原有的每个触发分钟加上偏移后仍不超过 59
+        period = math.gcd(step, 60) if step < 60 else 1
+        if period > 1:
+            spread['minute'] = f'{(mixed // 60) % period}-59/{step}'
+        spread['second'] = str(second)
+    elif minute == '0' and _INTERVAL_FIELD.match(hour):
+        spread['minute'] = str((mixed // 60) % 60)
+        spread['second'] = str(second)
+    return spread
+
+
+class FireRateMonitor:
+    """按秒统计最近一段时间内实际提交执行的任务数，用于观察触发峰值"""
+
+    def __init__(self, window=3600):
+        self.window = window
+        self._counts = OrderedDict()  # 秒级时间戳 -> 提交数
+        self._lock = threading.Lock()
+
+    def record(self, count=1):
+        second = int(time.time())
+        with self._lock:
+            self._counts[second] = self._counts.get(second, 0) + count
+            while self._counts and next(iter(self._counts)) < second - self.window:
+                self._counts.popitem(last=False)
+
+    def stats(self):
+        now = int(time.time())
+        with self._lock:
+            recent = [(second, count) for second, count in self._counts.items() if second >= now - self.window]
+        last_minute = [count for second, count in recent if second >= now - 60]
+        busiest = max(recent, key=lambda item: item[1], default=(None, 0))
+        return {
+            'window': self.window,
+            'fires': sum(count for _, count in recent),
+            'peak_per_second': busiest[1],
+            'peak_at': busiest[0],
+            'last_minute_peak': max(last_minute, default=0)
+        }
+
+
+# 可在运行时修改的调度器设置：名称 -> (类型, 最小值, 最大值)
+RUNTIME_SETTINGS = {
+    'max_workers': (int, 1, 1000),
+    'coalesce': (bool, None, None),
+    'max_instances': (int, 1, 1000),
+    'misfire_grace_time': (int, 1, 7 * 24 * 3600)
+}
+
+
+def coerce_setting(name, value):
+    """校验并转换运行时设置的值，无效时抛出 ValueError"""
+    if name not in RUNTIME_SETTINGS:
+        raise ValueError(f"Unknown setting: {name}")
+    kind, minimum, maximum = RUNTIME_SETTINGS[name]
+    if kind is bool:
+        if isinstance(value, str):
+            if value.lower() not in ('1', '0', 'true', 'false', 'on', 'off'):
+                raise ValueError(f"Invalid value for {name}: {value}")
+            return value.lower() in ('1', 'true', 'on')
+        return bool(value)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid value for {name}: {value}")
+    if not minimum <= value <= maximum:
+        raise ValueError(f"{name} must be between {minimum} and {maximum}")
+    return value
+
+
 class SchedulerError(Exception):
     """调度器异常"""
     pass
@@ -109,108 +234,331 @@ def get_scheduler():
         current_app.logger.error(f"Error reinitializing scheduler: {e}", exc_info=True)
         return None
 
-def execute_task_wrapper(task_id):
+def execute_task_wrapper(task_id, retry_of=None, attempt=0, dag_run_id=None):
     """
     包装任务执行函数，确保在 Flask 应用上下文中运行
     """
     from app import flask_app  # 延迟导入
     with flask_app.app_context():  # 添加括号，正确使用上下文
         logger.info(f"Executing task {task_id} within Flask application context")
-        return execute_task(task_id)
+        return execute_task(task_id, retry_of=retry_of, attempt=attempt, dag_run_id=dag_run_id)
+
+
+def compute_retry_delay(attempt, base_delay, max_delay, jitter):
+    """
+    计算第 attempt 次重试的等待时间：指数退避并叠加随机抖动
+    delay = min(max_delay, base_delay * 2^(attempt-1)) * (1 ± jitter)
+    """
+    delay = min(max_delay, base_delay * (2 ** (attempt - 1)))
+    return max(0.0, delay * (1 + random.uniform(-jitter, jitter)))
+
+
+def _schedule_retry(task, task_log, attempt):
+    """执行失败后，通过调度器安排一次延迟重试（不占用工作线程等待）"""
+    next_attempt = attempt + 1
+    if not task.is_active or next_attempt > (task.max_retries or 0):
+        return False
+
+    scheduler = getattr(current_app, 'scheduler', None)
+    if scheduler is None:
+        logger.warning(f"Scheduler unavailable, cannot retry task {task.id}")
+        return False
+
+    config = current_app.config
+    delay = compute_retry_delay(
+        next_attempt,
+        config.get('RETRY_DELAY', 300),
+        config.get('RETRY_BACKOFF_MAX', 3600),
+        config.get('RETRY_JITTER', 0.2)
+    )
+    # 所有重试都关联到最初那次执行
+    retry_of = task_log.retry_of_id or task_log.id
+    if not scheduler.schedule_retry(task, retry_of, next_attempt, delay, dag_run_id=task_log.dag_run_id):
+        return False
+
+    try:
+        task.retry_count = next_attempt
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Failed to update retry count for task {task.id}: {e}")
+        db.session.rollback()
+    logger.info(f"Retry {next_attempt}/{task.max_retries} of task {task.id} scheduled in {delay:.1f}s")
+    return True
+
+
+def _partial_output_writer(engine, log_id):
+    """生成增量持久化运行中输出的回调（独立连接，不影响当前会话）"""
+    table = TaskLog.__table__
+
+    def write(text):
+        with engine.begin() as conn:
+            # 仅更新运行中的记录，避免迟到的增量写入覆盖最终输出
+            conn.execute(table.update().where(table.c.id == log_id, table.c.status == 'RUNNING')
+                         .values(log_output=text))
+
+    return write
+
+
+# 执行结束时写入 TaskLog 的字段
+FINISH_FIELDS = ('end_time', 'status', 'log_output', 'output_ref', 'error_message', 'error_ref',
+                 'execution_time', 'start_latency', 'cold_start') + USAGE_FIELDS
+
+
+def _lease_expired(task_id):
+    """执行前确认本实例仍持有调度租约，租约已过期时放弃执行，避免与新的主节点重复执行"""
+    scheduler = getattr(current_app, 'scheduler', None)
+    if scheduler is None or scheduler.holds_lease():
+        return False
+    logger.warning(f"Task {task_id} not executed: scheduler lease expired on this instance")
+    return True
+
+
+def _skip_expired_lease_run(task_id, retry_of, attempt, dag_run_id):
+    """
+    租约过期时放弃本次执行：让出租约使本实例停止触发，写入 SKIPPED 日志并计入错过的运行，
+    再把这次运行交还给任务存储，由新的主节点按错过宽限时间补执行或计为错过
+    """
+    scheduler = current_app.scheduler
+    scheduler.coordinator.release()
+    scheduler.missed_runs['lease_expired'] += 1
+
+    task = Task.query.get(task_id)
+    if not task:
+        return
+    now = datetime.now(BEIJING_TZ)
+    try:
+        db.session.add(TaskLog(
+            task_id=task_id,
+            start_time=now,
+            end_time=now,
+            status='SKIPPED',
+            error_message="Scheduler lease expired on this instance; the run was handed back to the lease holder",
+            attempt=attempt,
+            retry_of_id=retry_of,
+            dag_run_id=dag_run_id
+        ))
+        bump(executions_total=1)
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Failed to record skipped run of task {task_id}: {e}")
+        db.session.rollback()
+
+    if retry_of is not None:
+        scheduler.schedule_retry(task, retry_of, attempt, 0, dag_run_id=dag_run_id)
+    elif dag_run_id is not None or task.schedule_type == 'dependent':
+        scheduler.trigger_task(task, dag_run_id=dag_run_id)
+    else:
+        scheduler.hand_back_run(task.id, now)
+
+
+def _begin_execution(task_id, retry_of, attempt, dag_run_id=None):
+    """加载任务并写入 RUNNING 状态的执行日志"""
+    task = Task.query.get(task_id)
+    if not task:
+        logger.error(f"Task {task_id} not found.")
+        return None, None
+
+    task_log = TaskLog(
+        task_id=task_id,
+        start_time=datetime.now(BEIJING_TZ),
+        status='RUNNING',
+        attempt=attempt,
+        retry_of_id=retry_of,
+        dag_run_id=begin_dag_run(task, dag_run_id)
+    )
+    writer = get_write_behind()
+    if writer is None:
+        db.session.add(task_log)
+        bump(**execution_started_deltas())
+        db.session.commit()
+        return task, task_log
+
+    # 后写模式：与其他执行的记账成组提交，等待提交完成以取得日志 id
+    if task_log.dag_run_id != dag_run_id:
+        db.session.commit()  # 本次执行新建了 DAG 运行
+    values = {column.name: getattr(task_log, column.name) for column in TaskLog.__table__.columns
+              if getattr(task_log, column.name) is not None}
+    task_log.id = writer.submit(
+        writebehind.insert(TaskLog.__table__, values),
+        writebehind.bump(execution_started_deltas())
+    ).result()
+    return task, task_log
+
+
+def _finish_execution(task, task_log, result, execution_time, attempt):
+    """写入执行结果，失败时安排重试，并推进所属的 DAG 运行"""
+    status = result['status']
+    try:
+        task_log.end_time = datetime.now(BEIJING_TZ)
+        task_log.status = status
+        store_output(task_log, result['output'], result['error'])
+        task_log.execution_time = execution_time
+        task_log.start_latency = result.get('start_latency')
+        task_log.cold_start = result.get('cold_start')
+        usage = result.get('usage') or {}
+        for field in USAGE_FIELDS:
+            setattr(task_log, field, usage.get(field))
+
+        task_changes = {'last_run': datetime.now(BEIJING_TZ), 'last_status': status}
+        if status == 'SUCCESS':
+            task_changes['retry_count'] = 0
+
+        writer = get_write_behind()
+        if writer is None:
+            for field, value in task_changes.items():
+                setattr(task, field, value)
+            bump(**execution_finished_deltas(status))
+            db.session.commit()
+        else:
+            flushed = writer.submit(
+                writebehind.update(TaskLog.__table__, task_log.id,
+                                   {field: getattr(task_log, field) for field in FINISH_FIELDS}),
+                writebehind.update(Task.__table__, task.id, task_changes),
+                # 执行期间任务被删除时，删除时已扣除这次执行，不再重复扣除
+                writebehind.bump(execution_finished_deltas(status), requires=(TaskLog.__table__, task_log.id))
+            )
+            if task_log.dag_run_id:
+                # 推进 DAG 运行需读取已提交的执行结果
+                flushed.result()
+        logger.info(f"Task {task.id} completed with status {status}")
+    except Exception as log_update_error:
+        logger.error(f"Failed to update task log: {log_update_error}")
+        db.session.rollback()
 
+    # 失败（含超时）后按退避策略安排重试
+    retrying = status != 'SUCCESS' and _schedule_retry(task, task_log, attempt)
+    on_execution_finished(task, task_log, status, retrying)
 
-def execute_task(task_id):
+
+def _log_result(task_id, result, timeout):
+    if result['status'] == 'TIMEOUT':
+        logger.warning(f"Task {task_id} timed out after {timeout}s, worker slot released")
+    elif result['error']:
+        logger.error(f"Failed to execute task {task_id}: {result['error']}")
+
+
+def execute_task(task_id, retry_of=None, attempt=0, dag_run_id=None):
     """
-    全局任务执行函数 - 动态共享所有依赖，执行任务脚本。
+    全局任务执行函数 - 在预构建的受控作用域中执行任务脚本。
+    Args:
+        retry_of: 重试时为最初那次执行的 TaskLog id
+        attempt: 重试序号，首次执行为 0
+        dag_run_id: 由上游任务触发时所属的 DAG 运行
     """
     try:
         with current_app.app_context():
             logger.info(f"Starting execution of task {task_id}")
+            if _lease_expired(task_id):
+                _skip_expired_lease_run(task_id, retry_of, attempt, dag_run_id)
+                return "Scheduler lease expired", 'SKIPPED'
 
-            task = Task.query.get(task_id)
+            task, task_log = _begin_execution(task_id, retry_of, attempt, dag_run_id)
             if not task:
-                logger.error(f"Task {task_id} not found.")
                 return "Task not found", 'FAILED'
-
-            task_log = TaskLog(
-                task_id=task_id,
-                start_time=datetime.now(BEIJING_TZ),
-                status='RUNNING'
-            )
-            db.session.add(task_log)
-            db.session.commit()
             start_time = time.time()
 
-            log_output = ""
-            error_message = None
-            status = 'FAILED'
+            result = {'status': 'FAILED', 'output': '', 'error': None}
             try:
                 if not task.script_content:
                     raise ValueError("Script content is empty")
 
-                # 捕获脚本标准输出
-                import io
-                import sys
-
-                output_buffer = io.StringIO()
-                original_stdout = sys.stdout
-                sys.stdout = output_buffer  # 重定向标准输出
-
-                # 构建动态执行环境（统一作用域）
-                exec_scope = globals().copy()
-                exec_scope.update(sys.modules)
-                exec_scope['__builtins__'] = __builtins__
-
-                try:
-                    logger.info(f"Executing script for task {task_id}")
-                    exec(task.script_content, exec_scope, exec_scope)  # 使用统一作用域
-                    status = 'SUCCESS'
-                    log_output = output_buffer.getvalue()
-                except Exception as script_exec_error:
-                    status = 'FAILED'
-                    log_output = output_buffer.getvalue()
-                    error_message = str(script_exec_error)
-                    logger.error(f"Failed to execute task {task_id}: {script_exec_error}")
-                finally:
-                    sys.stdout = original_stdout
+                backend = resolve_backend(task, current_app.config)
+                timeout = task.timeout or current_app.config.get('TASK_TIMEOUT')
+                logger.info(f"Executing script for task {task_id} on {backend} backend (timeout {timeout}s)")
+                if backend == 'process':
+                    result = run_in_process_pool(task.script_content, current_app.config, timeout)
+                elif watchdog.orphaned(task_id):
+                    # 上次超时的脚本线程阻塞在无法中断的调用中仍未退出，不再启动第二份
+                    result = {
+                        'status': 'FAILED',
+                        'output': '',
+                        'error': "A previous run of this task timed out and is still running in its thread; "
+                                 "skipped to avoid running two copies. Use the process backend for hard timeouts."
+                    }
+                else:
+                    # 输出按块写入 TaskLog，运行中即可在日志页查看
+                    output = TaskOutputStream(
+                        on_flush=_partial_output_writer(db.engine, task_log.id),
+                        **output_limits(current_app.config)
+                    )
+                    result = run_in_thread(task.script_content, current_app.config.get('SCRIPT_NAMESPACE_MODULES'),
+                                           output, timeout, key=task_id)
+                _log_result(task_id, result, timeout)
 
             except Exception as general_error:
-                error_message = str(general_error)
-                log_output = f"Execution error: {error_message}"
+                result = {
+                    'status': 'FAILED',
+                    'output': f"Execution error: {general_error}",
+                    'error': str(general_error)
+                }
                 logger.error(f"Task execution failed: {general_error}")
-                if task.max_retries > task.retry_count:
-                    task.retry_count += 1
-                    db.session.commit()
-                    logger.info(f"Retrying task {task_id}, attempt {task.retry_count}/{task.max_retries}")
 
             finally:
-                end_time = time.time()
-                execution_time = end_time - start_time
+                _finish_execution(task, task_log, result, time.time() - start_time, attempt)
 
-                try:
-                    task_log.end_time = datetime.now(BEIJING_TZ)
-                    task_log.status = status
-                    task_log.log_output = log_output
-                    task_log.error_message = error_message
-                    task_log.execution_time = execution_time
-
-                    task.last_run = datetime.now(BEIJING_TZ)
-                    task.last_status = status
-
-                    db.session.commit()
-                    logger.info(f"Task {task_id} completed with status {status}")
-                except Exception as log_update_error:
-                    logger.error(f"Failed to update task log: {log_update_error}")
-                    db.session.rollback()
-
-            return log_output, status
+            return result['output'], result['status']
     except Exception as system_error:
         logger.error(f"System error during task execution: {system_error}")
         return f"System error: {str(system_error)}", 'FAILED'
 
 
+async def execute_task_async(task_id, retry_of=None, attempt=0, dag_run_id=None):
+    """
+    异步脚本执行入口，运行在共享事件循环上：
+    脚本的 async def main() 与其他协程并发执行，数据库记账放到线程中完成，不阻塞事件循环
+    """
+    from app import flask_app  # 延迟导入
+    try:
+        with flask_app.app_context():
+            logger.info(f"Starting async execution of task {task_id}")
+            if _lease_expired(task_id):
+                await asyncio.to_thread(_skip_expired_lease_run, task_id, retry_of, attempt, dag_run_id)
+                return "Scheduler lease expired", 'SKIPPED'
+
+            def begin():
+                task, task_log = _begin_execution(task_id, retry_of, attempt, dag_run_id)
+                if not task:
+                    return None
+                snapshot = (task, task_log, task.script_content, task.timeout, task_log.id)
+                # 结束只读事务归还连接，脚本等待期间不占用连接池
+                db.session.commit()
+                return snapshot
+
+            begun = await asyncio.to_thread(begin)
+            if not begun:
+                return "Task not found", 'FAILED'
+            task, task_log, script_content, task_timeout, log_id = begun
+            start_time = time.time()
+
+            config = flask_app.config
+            timeout = task_timeout or config.get('TASK_TIMEOUT')
+            loop = asyncio.get_running_loop()
+            write_partial = _partial_output_writer(db.engine, log_id)
+            output = TaskOutputStream(
+                on_flush=lambda text: loop.run_in_executor(None, write_partial, text),
+                **output_limits(config)
+            )
 
+            result = {'status': 'FAILED', 'output': '', 'error': None}
+            try:
+                result = await run_async_script(script_content, config.get('SCRIPT_NAMESPACE_MODULES'),
+                                                output, timeout)
+                _log_result(task_id, result, timeout)
+            except Exception as general_error:
+                result = {
+                    'status': 'FAILED',
+                    'output': f"Execution error: {general_error}",
+                    'error': str(general_error)
+                }
+                logger.error(f"Task execution failed: {general_error}")
+            finally:
+                await asyncio.to_thread(_finish_execution, task, task_log, result, time.time() - start_time,
+                                        attempt)
 
+            return result['output'], result['status']
+    except Exception as system_error:
+        logger.error(f"System error during task execution: {system_error}")
+        return f"System error: {str(system_error)}", 'FAILED'
 
 
 class TaskScheduler:
@@ -219,6 +567,15 @@ class TaskScheduler:
         self.app = app
         self.scheduler = None
         self.logger = logger
+        self.fire_index = NextFireIndex()  # 内存中的下次执行时间索引，由任务存储维护
+        self.coordinator = None
+        self.retention = None
+        self.write_behind = None
+        self.fire_rate = FireRateMonitor()  # 实际触发速率（每秒提交数）
+        self._owner_cache = {}  # task_id -> (过期时间, (user_id, is_admin, priority, overflow_policy))
+        # 因错过宽限时间、达到并发上限或租约过期而未执行的次数
+        self.missed_runs = {'misfired': 0, 'max_instances': 0, 'lease_expired': 0}
+        self._settings_version = 0  # 已应用的最新设置修改记录 id
         if app is not None:
             self.init_app(app)
 
@@ -226,20 +583,49 @@ class TaskScheduler:
         """初始化调度器并与Flask应用绑定"""
         self.app = app
         self.logger = app.logger
+        script_cache.resize(app.config.get('SCRIPT_CACHE_SIZE', 256))
 
         try:
             # 配置任务存储
+            # 周期任务由 tasks 表派生；重试等一次性任务仍序列化保存在 apscheduler_jobs 表中
+            with app.app_context():
+                engine = db.engine
+
+            # 可选的执行记账后写队列，多次执行的日志和任务状态写入成组提交
+            if app.config.get('TASK_LOG_WRITE_BEHIND', False):
+                self.write_behind = WriteBehindQueue(
+                    engine,
+                    max_batch=app.config.get('TASK_LOG_WRITE_BEHIND_BATCH', 200),
+                    linger=app.config.get('TASK_LOG_WRITE_BEHIND_LINGER', 0.01),
+                    max_pending=app.config.get('TASK_LOG_WRITE_BEHIND_MAX_PENDING', 10000)
+                )
+                self.write_behind.start()
+                app.write_behind = self.write_behind
             jobstores = {
-                'default': SQLAlchemyJobStore(
+                'default': IndexedTaskJobStore(engine, self._build_store_job, index=self.fire_index),
+                'adhoc': IndexedSQLAlchemyJobStore(
                     url=app.config['SQLALCHEMY_DATABASE_URI'],
-                    engine_options={'pool_recycle': 3600}
+                    engine_options={'pool_recycle': 3600},
+                    index=self.fire_index
                 )
             }
 
             # 配置执行器
             executors = {
-                'default': ThreadPoolExecutor(
-                    max_workers=app.config.get('SCHEDULER_MAX_WORKERS', 20)
+                # 按用户配额和加权公平队列分配线程池
+                'default': FairShareExecutor(
+                    max_workers=app.config.get('SCHEDULER_MAX_WORKERS', 20),
+                    owner_resolver=self._job_owner,
+                    user_quota=app.config.get('SCHEDULER_USER_MAX_CONCURRENCY', 5),
+                    admin_quota=app.config.get('SCHEDULER_ADMIN_MAX_CONCURRENCY', 10),
+                    admin_weight=app.config.get('SCHEDULER_ADMIN_WEIGHT', 2),
+                    max_queue_depth=app.config.get('SCHEDULER_QUEUE_MAX_DEPTH', 200),
+                    # 线程池按运行时设置允许的上限创建，调整 max_workers 只改变出队时的并发检查
+                    pool_limit=RUNTIME_SETTINGS['max_workers'][2]
+                ),
+                # 异步脚本共享的事件循环
+                'asyncio': EventLoopExecutor(
+                    loops=app.config.get('SCHEDULER_ASYNC_LOOPS', 2)
                 )
             }
 
@@ -263,10 +649,19 @@ class TaskScheduler:
                 self._job_event_listener,
                 EVENT_JOB_EXECUTED | EVENT_JOB_ERROR
             )
+            self.scheduler.add_listener(
+                lambda event: self.fire_rate.record(len(event.scheduled_run_times)),
+                EVENT_JOB_SUBMITTED
+            )
+            self.scheduler.add_listener(
+                self._missed_run_listener,
+                EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES
+            )
 
             # 启动调度器
             if not self.scheduler.running:
-                self.scheduler.start()
+                # 以暂停状态启动，加载任务和构建索引期间不触发任务，避免与索引重建并发
+                self.scheduler.start(paused=True)
                 time.sleep(1)  # 等待调度器完全启动
 
                 if not self.scheduler.running:
@@ -274,8 +669,26 @@ class TaskScheduler:
 
                 self.logger.info("Scheduler started successfully")
 
+                # 恢复运行时修改过的设置，需在构建任务前完成
+                self._apply_persisted_settings()
+
                 # 加载所有活动任务
                 self._load_all_tasks()
+                self._rebuild_fire_index()
+
+                # 启用租约时只有主节点恢复运行并触发任务，其余实例保持暂停
+                if app.config.get('SCHEDULER_LEASE_ENABLED', True):
+                    self._start_coordinator(engine)
+                else:
+                    self.scheduler.resume()
+
+                # 预热进程池，避免首批执行承担进程启动和模块导入开销
+                self._prewarm_process_pool()
+
+                # 后台按保留策略汇总并清理执行日志（仅主节点）
+                self.retention = RetentionWorker(app, app.config.get('LOG_PURGE_INTERVAL', 3600),
+                                                 should_run=self.is_leader)
+                self.retention.start()
 
         except Exception as e:
             self.logger.error(f"Failed to initialize scheduler: {e}", exc_info=True)
@@ -292,11 +705,23 @@ class TaskScheduler:
                 }
 
             return {
-                'state': 'running' if self.scheduler.running else 'stopped',
+                'state': self._state_name(),
                 'running': self.scheduler.running,
-                'job_count': len(self.scheduler.get_jobs()),
-                'next_run': min([job.next_run_time for job in self.scheduler.get_jobs() if job.next_run_time],
-                                default=None)
+                'role': 'leader' if self.is_leader() else 'standby',
+                'lease': self.coordinator.stats() if self.coordinator else None,
+                'job_count': self.fire_index.count(),
+                'next_run': self.fire_index.next_run(),
+                'upcoming': self.fire_index.upcoming(self.app.config.get('SCHEDULER_STATUS_UPCOMING', 5)),
+                'script_cache': script_cache.stats(),
+                'namespace': get_namespace_template(self.app.config.get('SCRIPT_NAMESPACE_MODULES')).stats(),
+                'watchdog': watchdog.stats(),
+                'process_pool': process_pool_stats(),
+                'asyncio': self.scheduler._lookup_executor('asyncio').stats(),
+                'fair_share': self.scheduler._lookup_executor('default').stats(),
+                'missed_runs': dict(self.missed_runs),
+                'fire_rate': self.fire_rate.stats(),
+                'retention': self.retention.stats() if self.retention else None,
+                'write_behind': self.write_behind.stats() if self.write_behind else None
             }
         except Exception as e:
             self.logger.error(f"Error getting scheduler status: {e}")
@@ -307,16 +732,215 @@ class TaskScheduler:
             }
 
     def _load_all_tasks(self):
-        """加载所有活动的任务"""
+        """
+        启动时补齐任务表中的调度状态：任务存储直接由 tasks 表派生，
+        只需为缺少下次执行时间且未暂停的活动任务批量写入 next_run_time，并清理旧版本遗留的周期任务
+        """
         try:
+            start = time.perf_counter()
+            table = Task.__table__
+            now = datetime.now(BEIJING_TZ)
+            batch_size = self.app.config.get('SCHEDULER_SYNC_BATCH_SIZE', 500)
+
             with self.app.app_context():
+                engine = db.engine
                 active_tasks = Task.query.filter_by(is_active=True).all()
+                pending = []
                 for task in active_tasks:
-                    self.add_job(task)
-                self.logger.info(f"Loaded {len(active_tasks)} active tasks")
+                    if task.next_run_time is not None or task.is_paused:
+                        continue
+                    # 单个任务的配置错误只跳过该任务，不影响其他任务的调度
+                    try:
+                        job = self._build_job(task)
+                        if job is None:
+                            continue
+                        next_run_time = job.trigger.get_next_fire_time(None, now)
+                    except Exception as e:
+                        self.logger.error(f"Failed to schedule task {task.id}: {e}")
+                        continue
+                    if next_run_time is None:
+                        continue
+                    pending.append({'_id': task.id, 'next_run_time': datetime_to_utc_timestamp(next_run_time)})
+
+            update_stmt = table.update().where(table.c.id == bindparam('_id')).values(
+                next_run_time=bindparam('next_run_time'))
+            for offset in range(0, len(pending), batch_size):
+                with engine.begin() as conn:
+                    conn.execute(update_stmt, pending[offset:offset + batch_size])
+
+            # 旧版本把周期任务序列化保存在 apscheduler_jobs 表中，现由 tasks 表派生
+            adhoc = self.scheduler._lookup_jobstore('adhoc')
+            legacy = self._legacy_job_ids(adhoc)
+            if legacy:
+                with adhoc.engine.begin() as conn:
+                    conn.execute(adhoc.jobs_t.delete().where(adhoc.jobs_t.c.id.in_(legacy)))
+
+            if pending:
+                self.scheduler.wakeup()
+            self.logger.info(
+                f"Loaded {len(active_tasks)} active tasks in {time.perf_counter() - start:.3f}s "
+                f"(scheduled {len(pending)}, removed {len(legacy)} legacy jobs)"
+            )
         except Exception as e:
             self.logger.error(f"Failed to load tasks: {e}", exc_info=True)
 
+    @staticmethod
+    def _legacy_job_ids(store):
+        with store.engine.connect() as conn:
+            return [job_id for (job_id,) in conn.execute(select(store.jobs_t.c.id)) if TASK_JOB_ID.match(job_id)]
+
+    def _build_job(self, task, next_run_time=None, allow_past=False):
+        """
+        按任务配置构建 Job 对象（不写入任务存储），配置无效时返回 None
+        Args:
+            task: Task 实例或包含相同字段的查询结果行
+            allow_past: 允许执行时间已过的一次性任务（由任务存储加载到期任务时使用）
+        """
+        if task.schedule_type == 'dependent':
+            # 依赖任务没有周期调度，由上游任务完成后触发
+            return None
+        try:
+            schedule_kwargs = self._parse_schedule(task, allow_past=allow_past)
+        except ValueError as e:
+            if not allow_past:
+                self.logger.error(f"Schedule parsing failed for task {task.id}: {e}. Config: {task.schedule_config}")
+            return None
+
+        trigger_type = schedule_kwargs.pop('trigger')
+        try:
+            trigger = _create_trigger(trigger_type, tuple(sorted(schedule_kwargs.items())))
+        except ValueError as e:
+            self.logger.error(f"Invalid trigger for task {task.id}: {e}. Config: {schedule_kwargs}")
+            return None
+
+        defaults = self.scheduler._job_defaults
+        return Job(
+            self.scheduler,
+            id=f'task_{task.id}',
+            args=(task.id,),
+            kwargs={},
+            name=task.name,
+            trigger=trigger,
+            misfire_grace_time=task.timeout,
+            coalesce=defaults['coalesce'],
+            max_instances=defaults['max_instances'],
+            next_run_time=next_run_time,
+            **self._job_target(task)
+        )
+
+    def _build_store_job(self, row, next_run_time):
+        """供 TaskJobStore 使用的 Job 构建回调"""
+        return self._build_job(row, next_run_time=next_run_time, allow_past=True)
+
+    def _rebuild_fire_index(self):
+        """
+        从各任务存储加载全部任务重建索引：启动时执行一次，之后由任务存储增量维护；
+        多实例部署时其他实例的修改不经过本实例，由租约线程定期重建
+        """
+        try:
+            start = time.perf_counter()
+            since = time.monotonic()
+            self.fire_index.rebuild({
+                alias: store.get_all_jobs() for alias, store in self.scheduler._jobstores.items()
+            }, since=since)
+            self.logger.info(f"Fire index built with {self.fire_index.count()} jobs "
+                             f"in {time.perf_counter() - start:.3f}s")
+        except Exception as e:
+            self.logger.error(f"Failed to build fire index: {e}", exc_info=True)
+
+    def _start_coordinator(self, engine):
+        """启动调度租约竞选"""
+        config = self.app.config
+        self.coordinator = LeaseCoordinator(
+            engine,
+            ttl=config.get('SCHEDULER_LEASE_TTL', 30),
+            renew_interval=config.get('SCHEDULER_LEASE_RENEW_INTERVAL', 10),
+            on_acquire=self._on_lease_acquired,
+            on_release=self._on_lease_released,
+            on_tick=self._on_lease_tick
+        )
+        self.coordinator.start()
+        self.logger.info(f"Scheduler lease coordinator started as {self.coordinator.holder_id} "
+                         f"({'leader' if self.coordinator.is_leader else 'standby'})")
+
+    def _on_lease_acquired(self):
+        # 接管前重新加载索引，其他实例期间的修改只存在于数据库中
+        self._rebuild_fire_index()
+        self.scheduler.resume()
+        self.logger.info("Scheduler resumed as lease holder")
+
+    def _on_lease_released(self):
+        self.scheduler.pause()
+        self.logger.warning("Scheduler paused after losing the lease")
+
+    def _on_lease_tick(self, is_leader):
+        # 同步其他实例修改的运行时设置
+        self._apply_persisted_settings()
+        if is_leader:
+            # 其他实例新增或立即执行的任务只写入数据库，唤醒调度线程重新计算等待时间
+            self.scheduler.wakeup()
+        interval = self.app.config.get('SCHEDULER_INDEX_REFRESH_INTERVAL', 30)
+        rebuilt_at = self.fire_index.rebuilt_at
+        if rebuilt_at is None or time.time() - rebuilt_at >= interval:
+            self._rebuild_fire_index()
+
+    def is_leader(self):
+        """本实例是否负责触发任务（未启用租约时始终为 True）"""
+        if self.coordinator is None:
+            return bool(self.scheduler and self.scheduler.running)
+        return self.coordinator.is_leader
+
+    def holds_lease(self):
+        """执行任务前的租约检查：未启用租约时始终为 True，否则要求租约在本地记录的到期时间之前"""
+        if self.coordinator is None:
+            return True
+        return self.coordinator.holds_lease()
+
+    def hand_back_run(self, task_id, run_time):
+        """
+        把未执行的周期运行交还给任务存储：下次执行时间改回 run_time（已暂停、已停用或已有更早的执行时间时不变），
+        持有租约的实例随后按错过宽限时间补执行或计为错过
+        """
+        try:
+            table = Task.__table__
+            timestamp = datetime_to_utc_timestamp(run_time)
+            statement = table.update().where(
+                table.c.id == task_id,
+                table.c.is_active.is_(True),
+                or_(table.c.is_paused.is_(None), table.c.is_paused.is_(False)),
+                or_(table.c.next_run_time.is_(None), table.c.next_run_time > timestamp)
+            ).values(next_run_time=timestamp, updated_at=table.c.updated_at)
+            with self.app.app_context():
+                with db.engine.begin() as conn:
+                    conn.execute(statement)
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to hand back run of task {task_id}: {e}", exc_info=True)
+            return False
+
+    def _state_name(self):
+        if not self.scheduler.running:
+            return 'stopped'
+        return 'paused' if self.scheduler.state == STATE_PAUSED else 'running'
+
+    def get_upcoming_jobs(self, limit=10):
+        """即将执行的前 limit 个任务"""
+        return self.fire_index.upcoming(limit)
+
+    def _prewarm_process_pool(self):
+        """有任务使用进程池时提前启动工作进程"""
+        if not self.app.config.get('SCHEDULER_PROCESS_PREWARM', True):
+            return
+        try:
+            with self.app.app_context():
+                needed = (self.app.config.get('SCHEDULER_EXECUTION_BACKEND') == 'process' or
+                          Task.query.filter_by(is_active=True, execution_backend='process').first() is not None)
+            if needed:
+                prewarm_process_pool(self.app.config)
+                self.logger.info("Process pool prewarm started")
+        except Exception as e:
+            self.logger.error(f"Failed to prewarm process pool: {e}", exc_info=True)
+
     def _job_event_listener(self, event):
         """任务执行事件监听器"""
         if event.exception:
@@ -324,7 +948,152 @@ class TaskScheduler:
         else:
             self.logger.info(f"Job {event.job_id} executed successfully")
 
-    def _parse_schedule(self, task):
+    def get_settings(self):
+        """当前生效的运行时设置"""
+        settings = {name: self.scheduler._job_defaults.get(name) for name in RUNTIME_SETTINGS if name != 'max_workers'}
+        settings['max_workers'] = self.scheduler._lookup_executor('default').max_workers
+        return settings
+
+    def _apply_setting(self, name, value):
+        if name == 'max_workers':
+            self.scheduler._lookup_executor('default').resize(value)
+        else:
+            # 任务存储每次加载都会用最新的默认值构建周期任务；已保存的重试等一次性任务保持原设置
+            self.scheduler._job_defaults[name] = value
+
+    def update_settings(self, changes, user_id=None):
+        """
+        运行时修改线程池大小和任务默认值，正在执行的任务不受影响，修改记录写入 scheduler_setting_changes
+        Args:
+            changes: {设置名: 新值}
+        Returns:
+            dict: 实际发生变化的设置 {设置名: (旧值, 新值)}
+        Raises:
+            ValueError: 设置名或取值无效
+        """
+        self._check_scheduler()
+        values = {name: coerce_setting(name, value) for name, value in changes.items()}
+        current = self.get_settings()
+        changed = {name: (current[name], value) for name, value in values.items() if current[name] != value}
+        if not changed:
+            return {}
+
+        fair_share = self.scheduler._lookup_executor('default').stats()
+        snapshot = {
+            'running': fair_share['running'],
+            'queued': fair_share['queued'],
+            'avg_wait': fair_share['avg_wait'],
+            'fires_per_hour': self.fire_rate.stats()['fires']
+        }
+        with self.app.app_context():
+            records = [SchedulerSettingChange(
+                setting=name, old_value=old, new_value=new, snapshot=snapshot, user_id=user_id,
+                instance=self.coordinator.holder_id if self.coordinator else None
+            ) for name, (old, new) in changed.items()]
+            db.session.add_all(records)
+            db.session.commit()
+            latest = max(record.id for record in records)
+
+        for name, (old, new) in changed.items():
+            self._apply_setting(name, new)
+            self.logger.info(f"Scheduler setting {name} changed from {old} to {new}")
+        self._settings_version = max(self._settings_version, latest)
+        return changed
+
+    def _apply_persisted_settings(self):
+        """应用数据库中比当前版本更新的设置修改（启动时及其他实例修改后）"""
+        try:
+            with self.app.app_context():
+                rows = SchedulerSettingChange.query.filter(
+                    SchedulerSettingChange.id > self._settings_version
+                ).order_by(SchedulerSettingChange.id).all()
+                latest = {row.setting: row.new_value for row in rows}
+                version = rows[-1].id if rows else self._settings_version
+            current = self.get_settings()
+            for name, value in latest.items():
+                try:
+                    value = coerce_setting(name, value)
+                except ValueError as e:
+                    self.logger.error(f"Ignoring persisted setting {name}: {e}")
+                    continue
+                if current[name] != value:
+                    self._apply_setting(name, value)
+                    self.logger.info(f"Applied persisted scheduler setting {name}={value}")
+            self._settings_version = version
+        except Exception as e:
+            self.logger.error(f"Failed to apply persisted scheduler settings: {e}", exc_info=True)
+
+    def _missed_run_listener(self, event):
+        """统计未执行的计划运行：等待超过宽限时间或上一次执行尚未结束"""
+        key = 'misfired' if event.code == EVENT_JOB_MISSED else 'max_instances'
+        self.missed_runs[key] += 1
+        self.logger.warning(f"Job {event.job_id} run at {event.scheduled_run_time} {key.replace('_', ' ')}")
+
+    def _spread_enabled(self, task):
+        """任务是否错开触发时间：任务自身设置优先，否则使用全局配置"""
+        spread = getattr(task, 'spread_fire_time', None)
+        if spread is None:
+            return bool(self.app.config.get('SCHEDULER_SPREAD_FIRE_TIMES', False))
+        return bool(spread)
+
+    def fire_load_profile(self, window=600, top=5):
+        """
+        预测未来 window 秒内每秒触发的任务数，对比不错开与错开触发时间两种情况
+        Returns:
+            dict: {'window', 'current', 'without_spread', 'with_spread'}，各情况包含 peak_per_second 等统计
+        """
+        now = datetime.now(BEIJING_TZ)
+        end = now + timedelta(seconds=window)
+        variants = {'without_spread': [], 'with_spread': [], 'current': []}
+
+        with self.app.app_context():
+            tasks = Task.query.filter_by(is_active=True).all()
+            for task in tasks:
+                parts = (task.cron_expression or '').strip().split()
+                if task.schedule_type in ('once', 'dependent') or len(parts) not in (5, 6):
+                    continue
+                plain = dict(zip(['minute', 'hour', 'day', 'month', 'day_of_week', 'year'], parts))
+                spread = spread_cron_fields(task.id, plain)
+                variants['without_spread'].append(plain)
+                variants['with_spread'].append(spread)
+                variants['current'].append(spread if self._spread_enabled(task) else plain)
+
+        # 相同的表达式只计算一次
+        profiles = {name: fire_time_histogram(fields, now, end) for name, fields in variants.items()}
+
+        def summarize(counts):
+            busiest = sorted(counts.items(), key=lambda item: -item[1])[:top]
+            return {
+                'fires': sum(counts.values()),
+                'busy_seconds': len(counts),
+                'peak_per_second': busiest[0][1] if busiest else 0,
+                'busiest': [{'time': datetime.fromtimestamp(second, BEIJING_TZ).strftime('%H:%M:%S'), 'fires': count}
+                            for second, count in busiest]
+            }
+
+        result = {name: summarize(counts) for name, counts in profiles.items()}
+        result['window'] = window
+        return result
+
+    def preview_next_runs(self, tasks, count=5):
+        """
+        批量计算周期任务接下来的执行时间（包含错开触发时间的偏移），相同的调度只计算一次
+        Returns:
+            list: 与 tasks 一一对应，无法计算时为 None
+        """
+        fields = []
+        for task in tasks:
+            try:
+                schedule_kwargs = self._parse_schedule(task)
+            except ValueError:
+                schedule_kwargs = {}
+            trigger_type = schedule_kwargs.pop('trigger', None)
+            fields.append(schedule_kwargs if trigger_type == 'cron' else None)
+        runs = next_fire_times_batch([f for f in fields if f is not None], count=count)
+        runs = iter(runs)
+        return [next(runs) if f is not None else None for f in fields]
+
+    def _parse_schedule(self, task, allow_past=False):
         try:
             if task.schedule_type == 'once':
                 if not task.schedule_config or 'datetime' not in task.schedule_config:
@@ -338,7 +1107,7 @@ class TaskScheduler:
                     dt = dt.astimezone(BEIJING_TZ)
 
                     # 与当前北京时间比较
-                if dt < datetime.now(BEIJING_TZ):
+                if not allow_past and dt < datetime.now(BEIJING_TZ):
                     raise ValueError("Scheduled time is in the past")
                 return {'trigger': 'date', 'run_date': dt}
 
@@ -354,11 +1123,44 @@ class TaskScheduler:
                 if len(cron_parts) == 6:
                     cron_kwargs['year'] = cron_parts[5]
 
+                if self._spread_enabled(task):
+                    cron_kwargs = spread_cron_fields(task.id, cron_kwargs)
+
                 return {'trigger': 'cron', **cron_kwargs}
 
         except Exception as e:
             raise ValueError(f"Schedule parsing failed: {str(e)}")
 
+    def _job_owner(self, job):
+        """
+        公平调度使用的任务归属信息 (user_id, is_admin, priority, overflow_policy)，
+        短暂缓存以免每次触发都查询数据库
+        """
+        default_policy = self.app.config.get('SCHEDULER_OVERFLOW_POLICY', 'queue')
+        if not job.args:
+            return None, False, 0, default_policy
+        task_id = job.args[0]
+        now = time.monotonic()
+        cached = self._owner_cache.get(task_id)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        tasks, users = Task.__table__, User.__table__
+        statement = select(tasks.c.user_id, users.c.is_admin, tasks.c.priority, tasks.c.overflow_policy).select_from(
+            tasks.join(users, tasks.c.user_id == users.c.id)).where(tasks.c.id == task_id)
+        with self.scheduler._lookup_jobstore('default').engine.connect() as conn:
+            row = conn.execute(statement).first()
+        owner = ((row.user_id, bool(row.is_admin), row.priority or 0, row.overflow_policy or default_policy)
+                 if row else (None, False, 0, default_policy))
+        self._owner_cache[task_id] = (now + self.app.config.get('SCHEDULER_OWNER_CACHE_TTL', 60), owner)
+        return owner
+
+    def _job_target(self, task):
+        """任务的执行入口：异步脚本交给事件循环执行器，其余使用线程池"""
+        if resolve_backend(task, self.app.config) == 'asyncio':
+            return {'func': execute_task_async, 'executor': 'asyncio'}
+        return {'func': execute_task_wrapper, 'executor': 'default'}
+
     def add_job(self, task):
         """添加新任务到调度器"""
         try:
@@ -366,6 +1168,11 @@ class TaskScheduler:
 
             job_id = f'task_{task.id}'
             self.logger.info(f"Adding job {job_id} ({task.name})")
+            self._owner_cache.pop(task.id, None)
+
+            if task.schedule_type == 'dependent':
+                # 由上游任务触发，移除之前可能存在的周期调度
+                return self.remove_job(task.id)
 
             # 解析调度配置
             try:
@@ -374,28 +1181,20 @@ class TaskScheduler:
                 self.logger.error(f"Schedule parsing failed for task {task.id}: {e}. Config: {task.schedule_config}")
                 return False
 
-            # 移除现有任务（如果存在）
-            if self.scheduler.get_job(job_id):
-                self.logger.info(f"Removing existing job {job_id}")
-                try:
-                    self.scheduler.remove_job(job_id)
-                except Exception as e:
-                    self.logger.error(f"Failed to remove existing job {job_id}: {e}", exc_info=True)
-
-            # 添加新任务
+            # 添加新任务（任务存储中重复添加即覆盖下次执行时间，无需先移除）
             try:
-                from flask import current_app
+                trigger_type = schedule_kwargs.pop('trigger')
                 job = self.scheduler.add_job(
-                    func=execute_task_wrapper,
+                    trigger=_create_trigger(trigger_type, tuple(sorted(schedule_kwargs.items()))),
                     args=[task.id],
                     id=job_id,
                     name=task.name,
                     replace_existing=True,
                     misfire_grace_time=task.timeout,
-                    **schedule_kwargs
+                    **self._job_target(task)
                 )
 
-                if job and (job.next_run_time or schedule_kwargs['trigger'] == 'date'):
+                if job and (job.next_run_time or trigger_type == 'date'):
                     self.logger.info(f"Job {job_id} added successfully. Next run at: {job.next_run_time}")
                     return True
                 else:
@@ -467,20 +1266,67 @@ class TaskScheduler:
         try:
             job_id = f'task_{task.id}'
             self.scheduler.add_job(
-                func=execute_task,
                 args=[task.id],
                 trigger=old_state['trigger'],
                 next_run_time=old_state['next_run_time'],
                 id=job_id,
                 name=task.name,
-                replace_existing=True
+                replace_existing=True,
+                **self._job_target(task)
             )
             self.logger.info(f"Successfully restored job {job_id} to previous state")
         except Exception as e:
             self.logger.error(f"Failed to restore job {job_id}: {e}")
 
+    def schedule_retry(self, task, retry_of, attempt, delay, dag_run_id=None):
+        """添加一次性的重试任务，delay 秒后执行"""
+        try:
+            self._check_scheduler()
+            job_id = f'task_{task.id}_retry'
+            self.scheduler.add_job(
+                trigger='date',
+                run_date=datetime.now(BEIJING_TZ) + timedelta(seconds=delay),
+                args=[task.id],
+                kwargs={'retry_of': retry_of, 'attempt': attempt, 'dag_run_id': dag_run_id},
+                id=job_id,
+                name=f'{task.name} (retry {attempt})',
+                jobstore='adhoc',
+                replace_existing=True,
+                misfire_grace_time=task.timeout,
+                **self._job_target(task)
+            )
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Failed to schedule retry for task {task.id}: {e}", exc_info=True)
+            return False
+
+    def trigger_task(self, task, dag_run_id=None):
+        """添加立即执行一次的任务，不影响周期调度；由上游触发时各下游分支分别提交，并行执行"""
+        try:
+            self._check_scheduler()
+            suffix = f'dag_{dag_run_id}' if dag_run_id else 'manual'
+            self.scheduler.add_job(
+                trigger='date',
+                run_date=datetime.now(BEIJING_TZ),
+                args=[task.id],
+                kwargs={'dag_run_id': dag_run_id},
+                id=f'task_{task.id}_{suffix}',
+                name=task.name,
+                jobstore='adhoc',
+                replace_existing=True,
+                misfire_grace_time=task.timeout,
+                **self._job_target(task)
+            )
+            self.logger.info(f"Task {task.id} triggered" + (f" by DAG run {dag_run_id}" if dag_run_id else ""))
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Failed to trigger task {task.id}: {e}", exc_info=True)
+            return False
+
     def pause_job(self, task_id):
-        """暂停任务"""
+        """暂停任务（暂停状态保存在任务存储中，重启后依然有效）"""
         try:
             self._check_scheduler()
             job_id = f'task_{task_id}'
@@ -519,17 +1365,7 @@ class TaskScheduler:
             self._check_scheduler()
             job_id = f'task_{task_id}'
 
-            job = self.scheduler.get_job(job_id)
-            if not job:
-                return None
-
-            return {
-                'id': job.id,
-                'name': job.name,
-                'next_run_time': job.next_run_time,
-                'trigger': str(job.trigger),
-                'pending': job.pending
-            }
+            return self.fire_index.get(job_id)
 
         except Exception as e:
             self.logger.error(f"Failed to get job info: {e}", exc_info=True)
@@ -539,16 +1375,7 @@ class TaskScheduler:
         """获取所有任务的运行状态"""
         try:
             self._check_scheduler()
-            jobs = []
-            for job in self.scheduler.get_jobs():
-                jobs.append({
-                    'id': job.id,
-                    'name': job.name,
-                    'next_run_time': job.next_run_time,
-                    'trigger': str(job.trigger),
-                    'pending': job.pending
-                })
-            return jobs
+            return self.fire_index.all()
 
         except Exception as e:
             self.logger.error(f"Failed to get all jobs: {e}", exc_info=True)
@@ -563,12 +1390,21 @@ class TaskScheduler:
 
     def shutdown(self):
         """关闭调度器"""
+        if self.retention:
+            self.retention.stop()
+        if self.coordinator:
+            # 主动释放租约，其他实例无需等待租约到期即可接管
+            self.coordinator.stop()
         if self.scheduler and self.scheduler.running:
             try:
                 self.scheduler.shutdown(wait=True)
                 self.logger.info("Scheduler shutdown complete")
             except Exception as e:
                 self.logger.error(f"Scheduler shutdown error: {e}", exc_info=True)
+        if self.write_behind:
+            # 执行器已停止，写完剩余的执行记账
+            self.write_behind.shutdown()
+        shutdown_process_pool(wait=False)
 
     def run_job_now(self, task_id):
         try:
@@ -581,6 +1417,11 @@ class TaskScheduler:
                 self.scheduler.modify_job(job_id, next_run_time=datetime.now(BEIJING_TZ))
                 self.logger.info(f"Job {job_id} scheduled for immediate execution")
                 return True
+
+            # 依赖任务没有周期调度，单独提交一次执行
+            task = Task.query.get(task_id)
+            if task and task.is_active and task.schedule_type == 'dependent':
+                return self.trigger_task(task)
             return False
 
         except Exception as e:
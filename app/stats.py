@@ -0,0 +1,139 @@
+import logging
+
+from app.extensions import db
+from app.models import Task, TaskLog, TaskLogDailyStat, StatCounter
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = (
+    'tasks_total', 'tasks_active',
+    'executions_total', 'executions_running', 'executions_success', 'executions_failed', 'executions_timeout'
+)
+
+# 执行状态对应的计数器，其他状态只计入 executions_total
+STATUS_COUNTERS = {
+    'RUNNING': 'executions_running',
+    'SUCCESS': 'executions_success',
+    'FAILED': 'executions_failed',
+    'TIMEOUT': 'executions_timeout'
+}
+
+
+def counter_update(name, delta):
+    """增减计数器的 UPDATE value = value + delta 语句，多实例并发更新也不会丢失"""
+    table = StatCounter.__table__
+    return table.update().where(table.c.name == name).values(value=table.c.value + delta)
+
+
+def bump(**deltas):
+    """在当前事务中增减计数器，随调用方提交生效"""
+    for name, delta in deltas.items():
+        if delta:
+            db.session.execute(counter_update(name, delta))
+
+
+def execution_started_deltas():
+    return {'executions_total': 1, 'executions_running': 1}
+
+
+def execution_finished_deltas(status):
+    deltas = {'executions_running': -1}
+    name = STATUS_COUNTERS.get(status)
+    if name:
+        deltas[name] = deltas.get(name, 0) + 1
+    return deltas
+
+
+def record_task_created(task):
+    bump(tasks_total=1, tasks_active=1 if task.is_active is not False else 0)
+
+
+def record_task_toggled(task):
+    bump(tasks_active=1 if task.is_active else -1)
+
+
+def _execution_counts(task_id=None):
+    """执行次数：现存日志按状态统计，加上已清理日志的每日汇总"""
+    counts = dict.fromkeys(COUNTERS[2:], 0)
+    query = db.session.query(TaskLog.status, db.func.count()).group_by(TaskLog.status)
+    if task_id is not None:
+        query = query.filter(TaskLog.task_id == task_id)
+    for status, count in query:
+        counts['executions_total'] += count
+        if status in STATUS_COUNTERS:
+            counts[STATUS_COUNTERS[status]] += count
+
+    query = db.session.query(
+        db.func.coalesce(db.func.sum(TaskLogDailyStat.count), 0),
+        db.func.coalesce(db.func.sum(TaskLogDailyStat.success_count), 0),
+        db.func.coalesce(db.func.sum(TaskLogDailyStat.failure_count), 0),
+        db.func.coalesce(db.func.sum(TaskLogDailyStat.timeout_count), 0)
+    )
+    if task_id is not None:
+        query = query.filter(TaskLogDailyStat.task_id == task_id)
+    total, success, failure, timeout = query.one()
+    counts['executions_total'] += total
+    counts['executions_success'] += success
+    counts['executions_failed'] += failure - timeout
+    counts['executions_timeout'] += timeout
+    return counts
+
+
+def record_task_deleted(task):
+    """删除任务前调用：扣除任务本身及其全部执行记录"""
+    deltas = {name: -count for name, count in _execution_counts(task.id).items()}
+    deltas['tasks_total'] = -1
+    deltas['tasks_active'] = -1 if task.is_active else 0
+    bump(**deltas)
+
+
+def compute_counters():
+    """从原始数据计算全部计数器（需扫描 tasks 和 task_logs）"""
+    counters = {
+        'tasks_total': Task.query.count(),
+        'tasks_active': Task.query.filter_by(is_active=True).count()
+    }
+    counters.update(_execution_counts())
+    return counters
+
+
+def read_counters():
+    """读取全部计数器，O(1)"""
+    counters = dict.fromkeys(COUNTERS, 0)
+    counters.update(db.session.query(StatCounter.name, StatCounter.value).all())
+    return counters
+
+
+def rebuild_counters():
+    """
+    重新计算并覆盖计数器，计数出现偏差时使用（重算期间发生的增量更新可能被覆盖，宜在空闲时执行）
+    Returns:
+        dict: {计数器: (原值, 新值)}
+    """
+    try:
+        previous = read_counters()
+        counters = compute_counters()
+        StatCounter.query.delete()
+        db.session.add_all(StatCounter(name=name, value=value) for name, value in counters.items())
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Failed to rebuild stat counters: {e}", exc_info=True)
+        db.session.rollback()
+        return None
+    drift = {name: (previous[name], counters[name]) for name in COUNTERS if previous[name] != counters[name]}
+    if drift:
+        logger.info(f"Stat counters rebuilt, corrected: {drift}")
+    return {name: (previous[name], counters[name]) for name in COUNTERS}
+
+
+def ensure_counters():
+    """启动时检查计数器，缺失时（新建或升级的数据库）从原始数据初始化"""
+    try:
+        if StatCounter.query.count() == len(COUNTERS):
+            return
+    except Exception as e:
+        logger.error(f"Failed to check stat counters: {e}")
+        db.session.rollback()
+        return
+    logger.info("Initializing stat counters from raw data")
+    rebuild_counters()
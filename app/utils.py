@@ -1,8 +1,8 @@
-import re
-import ast
 from functools import wraps
 from flask import abort
 from flask_login import current_user
+from app.executor import script_cache, is_async_script
+from app.cron import validate_cron
 
 
 def admin_required(f):
@@ -18,36 +18,22 @@ def admin_required(f):
 
 
 def validate_cron_expression(expression):
-    """验证cron表达式"""
+    """验证cron表达式（分 时 日 月 周，可附加年），支持 APScheduler 接受的范围、列表、步长和名称"""
     if not expression:
         return False
-
-    parts = expression.split()
-    if len(parts) != 5:
-        return False
-
-    patterns = [
-        r'^(\*|[0-9]|[1-5][0-9])(\/[0-9]+)?$',  # 分钟
-        r'^(\*|[0-9]|1[0-9]|2[0-3])(\/[0-9]+)?$',  # 小时
-        r'^(\*|[1-9]|[12][0-9]|3[01])(\/[0-9]+)?$',  # 日期
-        r'^(\*|[1-9]|1[0-2])(\/[0-9]+)?$',  # 月份
-        r'^(\*|[0-6])(\/[0-9]+)?$',  # 星期
-    ]
-
-    try:
-        for part, pattern in zip(parts, patterns):
-            if not re.match(pattern, part):
-                return False
-        return True
-    except:
-        return False
+    return validate_cron(expression)[0]
 
 
 def validate_script(script_content):
-    """验证Python脚本的基本语法"""
+    """
+    验证Python脚本的基本语法，编译结果同时写入字节码缓存供执行器复用；
+    以 async def main() 为入口的脚本会被识别为异步脚本（见 is_async_script）
+    """
     try:
         # 仅做基本的语法检查
-        ast.parse(script_content)
+        script_cache.get(script_content)
+        if is_async_script(script_content):
+            return True, "脚本验证通过（异步脚本）"
         return True, "脚本验证通过"
     except SyntaxError as e:
         # 只返回语法错误
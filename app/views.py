@@ -1,15 +1,58 @@
 import pytz
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
 from flask_login import login_required, current_user
 from app.extensions import db
-from app.models import Task, TaskLog
-from app.utils import admin_required, validate_cron_expression, validate_script
+from app.models import Task, TaskLog, TaskLogDailyStat, User, DagRun, SchedulerSettingChange
+from app.utils import admin_required, validate_cron_expression, validate_script, is_async_script
+from app.dag import set_upstreams, invalidate_dependency_graph
+from app.blobstore import load_output, release_blobs
+from app.stats import read_counters, record_task_created, record_task_deleted, record_task_toggled
+from app.cron import compile_cron, next_fire_times_batch
 from app.scheduler import TaskScheduler, get_scheduler
+from app.executor import EXECUTION_BACKENDS
+from app.fairshare import OVERFLOW_POLICIES
 from datetime import datetime
 
 bp = Blueprint('tasks', __name__)
 
 
+def _parse_optional_bool(value):
+    """表单中的三态选项：空值表示使用全局配置"""
+    if not value:
+        return None
+    return value == '1'
+
+
+def _parse_optional_int(value):
+    """表单中的可选非负整数：空值表示使用全局配置"""
+    if value is None or value.strip() == '':
+        return None
+    value = int(value)
+    if value < 0:
+        raise ValueError('保留天数和条数不能为负数')
+    return value
+
+
+def _upstream_candidates(exclude_id=None):
+    """可作为上游的任务：管理员可选全部任务，普通用户只能选自己的任务"""
+    query = Task.query if current_user.is_admin else Task.query.filter_by(user_id=current_user.id)
+    if exclude_id is not None:
+        query = query.filter(Task.id != exclude_id)
+    return query.order_by(Task.name).all()
+
+
+def _apply_upstreams(task):
+    """依赖任务保存所选的上游任务，其他调度类型清除依赖"""
+    if task.schedule_type != 'dependent':
+        task.upstreams = []
+        return
+    upstream_ids = request.form.getlist('upstream_ids', type=int)
+    allowed = {candidate.id for candidate in _upstream_candidates(task.id)}
+    if not set(upstream_ids) <= allowed:
+        raise ValueError('无效的上游任务')
+    set_upstreams(task, upstream_ids)
+
+
 @bp.route('/')
 @bp.route('/tasks')
 @login_required
@@ -40,6 +83,18 @@ def create_task():
             description = request.form['description']
             timeout = int(request.form.get('timeout', 3600))
             max_retries = int(request.form.get('max_retries', 0))
+            priority = int(request.form.get('priority', 0))
+            spread_fire_time = _parse_optional_bool(request.form.get('spread_fire_time'))
+            log_retention_days = _parse_optional_int(request.form.get('log_retention_days'))
+            log_max_rows = _parse_optional_int(request.form.get('log_max_rows'))
+            execution_backend = request.form.get('execution_backend') or None
+            if execution_backend and execution_backend not in EXECUTION_BACKENDS:
+                flash('无效的执行方式', 'danger')
+                return redirect(url_for('tasks.create_task'))
+            overflow_policy = request.form.get('overflow_policy') or None
+            if overflow_policy and overflow_policy not in OVERFLOW_POLICIES:
+                flash('无效的溢出策略', 'danger')
+                return redirect(url_for('tasks.create_task'))
 
             # 处理脚本内容
             script_content = None
@@ -62,7 +117,7 @@ def create_task():
                 flash('请提供Python脚本', 'danger')
                 return redirect(url_for('tasks.create_task'))
 
-            # 验证脚本安全性
+            # 验证脚本安全性（编译结果进入字节码缓存，执行时直接复用）
             is_safe, message = validate_script(script_content)
             if not is_safe:
                 flash(f'脚本验证失败: {message}', 'danger')
@@ -117,6 +172,10 @@ def create_task():
                         raise ValueError('请提供Cron表达式')
                     schedule_config = {'expression': cron_expression}
 
+                elif schedule_type == 'dependent':
+                    if not request.form.getlist('upstream_ids'):
+                        raise ValueError('请选择至少一个上游任务')
+
                 else:
                     raise ValueError('无效的调度类型')
 
@@ -133,6 +192,13 @@ def create_task():
                 original_filename=original_filename,
                 timeout=timeout,
                 max_retries=max_retries,
+                priority=priority,
+                spread_fire_time=spread_fire_time,
+                execution_backend=execution_backend,
+                overflow_policy=overflow_policy,
+                log_retention_days=log_retention_days,
+                log_max_rows=log_max_rows,
+                is_async=is_async_script(script_content),
                 user_id=current_user.id,
                 schedule_type=schedule_type,
                 schedule_config=schedule_config
@@ -141,6 +207,7 @@ def create_task():
             # 根据调度配置生成cron表达式
             try:
                 task.update_schedule(schedule_type, schedule_config)
+                _apply_upstreams(task)
             except Exception as e:
                 flash(f'调度配置错误: {str(e)}', 'danger')
                 return redirect(url_for('tasks.create_task'))
@@ -148,7 +215,9 @@ def create_task():
             # 保存到数据库
             try:
                 db.session.add(task)
+                record_task_created(task)
                 db.session.commit()
+                invalidate_dependency_graph()
 
                 # 添加调试日志
                 current_app.logger.info("Getting scheduler instance...")
@@ -177,7 +246,7 @@ def create_task():
             return redirect(url_for('tasks.create_task'))
 
     # GET 请求返回创建页面
-    return render_template('tasks/create.html')
+    return render_template('tasks/create.html', upstream_candidates=_upstream_candidates())
 
 
 @bp.route('/tasks/<int:task_id>/edit', methods=['GET', 'POST'])
@@ -198,6 +267,20 @@ def edit_task(task_id):
             task.description = request.form['description']
             task.timeout = int(request.form.get('timeout', 3600))
             task.max_retries = int(request.form.get('max_retries', 0))
+            task.priority = int(request.form.get('priority', 0))
+            task.spread_fire_time = _parse_optional_bool(request.form.get('spread_fire_time'))
+            task.log_retention_days = _parse_optional_int(request.form.get('log_retention_days'))
+            task.log_max_rows = _parse_optional_int(request.form.get('log_max_rows'))
+            execution_backend = request.form.get('execution_backend') or None
+            if execution_backend and execution_backend not in EXECUTION_BACKENDS:
+                flash('无效的执行方式', 'danger')
+                return redirect(url_for('tasks.edit_task', task_id=task_id))
+            task.execution_backend = execution_backend
+            overflow_policy = request.form.get('overflow_policy') or None
+            if overflow_policy and overflow_policy not in OVERFLOW_POLICIES:
+                flash('无效的溢出策略', 'danger')
+                return redirect(url_for('tasks.edit_task', task_id=task_id))
+            task.overflow_policy = overflow_policy
 
             # 处理脚本内容
             if 'script_file' in request.files and request.files['script_file'].filename:
@@ -217,11 +300,12 @@ def edit_task(task_id):
                         task.script_source = 'editor'
                         task.original_filename = None
 
-            # 验证脚本语法
+            # 验证脚本语法（编译结果进入字节码缓存，执行时直接复用）
             is_safe, message = validate_script(task.script_content)
             if not is_safe:
                 flash(f'脚本验证失败: {message}', 'danger')
                 return redirect(url_for('tasks.edit_task', task_id=task_id))
+            task.is_async = is_async_script(task.script_content)
 
             # 处理调度设置
             schedule_type = request.form.get('schedule_type', 'custom')
@@ -272,11 +356,16 @@ def edit_task(task_id):
                         raise ValueError('请提供Cron表达式')
                     schedule_config = {'expression': cron_expression}
 
+                elif schedule_type == 'dependent':
+                    if not request.form.getlist('upstream_ids'):
+                        raise ValueError('请选择至少一个上游任务')
+
                 else:
                     raise ValueError('无效的调度类型')
 
                 # 更新调度配置
                 task.update_schedule(schedule_type, schedule_config)
+                _apply_upstreams(task)
 
             except ValueError as e:
                 flash(str(e), 'danger')
@@ -285,6 +374,7 @@ def edit_task(task_id):
             # 更新任务
             task.updated_at = datetime.utcnow().replace(tzinfo=pytz.UTC).astimezone(pytz.timezone('Asia/Shanghai'))
             db.session.commit()
+            invalidate_dependency_graph()
 
             scheduler = get_scheduler()
             current_app.logger.info(f"Scheduler instance: {scheduler}")
@@ -303,7 +393,7 @@ def edit_task(task_id):
             db.session.rollback()
             flash(f'更新任务失败: {str(e)}', 'danger')
 
-    return render_template('tasks/edit.html', task=task)
+    return render_template('tasks/edit.html', task=task, upstream_candidates=_upstream_candidates(task.id))
 
 
 @bp.route('/tasks/<int:task_id>/toggle', methods=['POST'])
@@ -320,7 +410,9 @@ def toggle_task(task_id):
     current_app.logger.info(f"Scheduler instance: {scheduler}")
     try:
         task.is_active = not task.is_active
+        record_task_toggled(task)
         db.session.commit()
+        invalidate_dependency_graph()
 
         if task.is_active:
             if scheduler.add_job(task):
@@ -356,12 +448,22 @@ def delete_task(task_id):
         # 从调度器中移除
         scheduler.remove_job(task.id)
 
+        # 统计计数器扣除任务及其执行记录（需在删除日志前统计）
+        record_task_deleted(task)
+
         # 删除相关日志
+        refs = [ref for row in db.session.query(TaskLog.output_ref, TaskLog.error_ref).filter(
+            TaskLog.task_id == task.id, db.or_(TaskLog.output_ref.isnot(None), TaskLog.error_ref.isnot(None)))
+            for ref in row]
         TaskLog.query.filter_by(task_id=task.id).delete()
+        TaskLogDailyStat.query.filter_by(task_id=task.id).delete()
+        DagRun.query.filter_by(root_task_id=task.id).update({'root_task_id': None})
 
         # 删除任务
         db.session.delete(task)
         db.session.commit()
+        invalidate_dependency_graph()
+        release_blobs(refs)
 
         flash('任务删除成功', 'success')
     except Exception as e:
@@ -385,8 +487,30 @@ def task_logs(task_id):
     logs = TaskLog.query.filter_by(task_id=task_id) \
         .order_by(TaskLog.start_time.desc()) \
         .paginate(page=page, per_page=20, error_out=False)
+    # 已清理日志的每日汇总
+    daily_stats = TaskLogDailyStat.query.filter_by(task_id=task_id) \
+        .order_by(TaskLogDailyStat.day.desc()).limit(30).all()
 
-    return render_template('tasks/logs.html', task=task, logs=logs)
+    return render_template('tasks/logs.html', task=task, logs=logs, daily_stats=daily_stats)
+
+
+@bp.route('/tasks/<int:task_id>/logs/<int:log_id>/output')
+@login_required
+def task_log_output(task_id, log_id):
+    """单条执行日志的完整输出（转存的内容在此时读取），运行中的任务返回已持久化的部分输出"""
+    task = Task.query.get_or_404(task_id)
+
+    if not current_user.is_admin and task.user_id != current_user.id:
+        return jsonify({'error': '没有权限查看此任务的日志'}), 403
+
+    log = TaskLog.query.filter_by(id=log_id, task_id=task_id).first_or_404()
+    output, error = load_output(log)
+    return jsonify({
+        'status': log.status,
+        'running': log.end_time is None,
+        'log_output': output or '',
+        'error_message': error
+    })
 
 
 @bp.route('/monitor')
@@ -396,22 +520,168 @@ def monitor():
     # 获取最近的任务执行情况
     recent_logs = TaskLog.query.order_by(TaskLog.start_time.desc()).limit(10).all()
 
-    # 统计信息
+    # 统计信息：读取增量维护的计数器（含已清理日志），不再扫描任务和日志表
+    counters = read_counters()
     stats = {
-        'total_tasks': Task.query.count(),
-        'active_tasks': Task.query.filter_by(is_active=True).count(),
-        'total_executions': TaskLog.query.count(),
-        'failed_executions': TaskLog.query.filter_by(status='FAILED').count()
+        'total_tasks': counters['tasks_total'],
+        'active_tasks': counters['tasks_active'],
+        'total_executions': counters['executions_total'],
+        'running_executions': counters['executions_running'],
+        'success_executions': counters['executions_success'],
+        'failed_executions': counters['executions_failed'] + counters['executions_timeout'],
+        'timeout_executions': counters['executions_timeout']
     }
 
-    if stats['total_executions'] > 0:
-        stats['success_rate'] = (
-                (stats['total_executions'] - stats['failed_executions'])
-                / stats['total_executions'] * 100
-        )
-    else:
-        stats['success_rate'] = 0
+    # 资源消耗汇总（按任务聚合，CPU 时间降序）
+    cpu_time = db.func.coalesce(TaskLog.cpu_user_time, 0) + db.func.coalesce(TaskLog.cpu_system_time, 0)
+    resource_usage = db.session.query(
+        Task.id,
+        Task.name,
+        db.func.count(TaskLog.id).label('runs'),
+        db.func.sum(cpu_time).label('cpu_time'),
+        db.func.avg(cpu_time).label('avg_cpu_time'),
+        db.func.max(TaskLog.peak_memory).label('peak_memory'),
+        db.func.sum(TaskLog.io_read_bytes).label('io_read_bytes'),
+        db.func.sum(TaskLog.io_write_bytes).label('io_write_bytes')
+    ).join(TaskLog, TaskLog.task_id == Task.id) \
+        .group_by(Task.id, Task.name) \
+        .order_by(db.desc('cpu_time')) \
+        .limit(10).all()
+
+    # 成功率按已结束的执行计算
+    finished = stats['success_executions'] + stats['failed_executions']
+    stats['success_rate'] = stats['success_executions'] / finished * 100 if finished else 0
+
+    # 公平调度队列：各用户的排队数、并发数和等待时间
+    queue_stats = []
+    queue_summary = None
+    scheduler = getattr(current_app, 'scheduler', None)
+    if scheduler and scheduler.scheduler:
+        fair_share = scheduler.scheduler._lookup_executor('default').stats()
+        queue_summary = {k: v for k, v in fair_share.items() if k != 'users'}
+        queue_summary['missed_runs'] = dict(scheduler.missed_runs)
+        usernames = dict(db.session.query(User.id, User.username).all())
+        for row in fair_share['users']:
+            row['username'] = usernames.get(row['user_id'], '-')
+            queue_stats.append(row)
+
+    # 最近的 DAG 运行及端到端耗时
+    dag_runs = DagRun.query.order_by(DagRun.start_time.desc()).limit(10).all()
+    dag_task_counts = dict(db.session.query(TaskLog.dag_run_id, db.func.count(db.distinct(TaskLog.task_id)))
+                           .filter(TaskLog.dag_run_id.in_([run.id for run in dag_runs]))
+                           .group_by(TaskLog.dag_run_id).all()) if dag_runs else {}
 
     return render_template('tasks/monitor.html',
                            recent_logs=recent_logs,
-                           stats=stats)
+                           stats=stats,
+                           resource_usage=resource_usage,
+                           queue_stats=queue_stats,
+                           queue_summary=queue_summary,
+                           dag_runs=dag_runs,
+                           dag_task_counts=dag_task_counts)
+
+
+@bp.route('/monitor/fire-load')
+@login_required
+def fire_load():
+    """预测未来一段时间内每秒触发的任务数，对比错开触发时间前后的峰值"""
+    scheduler = get_scheduler()
+    if scheduler is None:
+        return jsonify({'error': '调度器未初始化'}), 503
+    window = min(request.args.get('window', 600, type=int), 3600)
+    return jsonify({
+        'projection': scheduler.fire_load_profile(window),
+        'observed': scheduler.fire_rate.stats()
+    })
+
+
+@bp.route('/cron/preview')
+@login_required
+def cron_preview():
+    """校验 cron 表达式并预览接下来的执行时间"""
+    expression = request.args.get('expression', '').strip()
+    count = min(request.args.get('count', 5, type=int), 50)
+    try:
+        cron = compile_cron(expression)
+    except ValueError as e:
+        return jsonify({'valid': False, 'error': str(e)}), 400
+    return jsonify({
+        'valid': True,
+        'description': cron.describe(),
+        'next_runs': [t.strftime('%Y-%m-%d %H:%M:%S') for t in cron.next_fire_times(datetime.now(pytz.timezone('Asia/Shanghai')), count)]
+    })
+
+
+@bp.route('/cron/next-runs')
+@login_required
+def cron_next_runs():
+    """批量预览当前用户可见的周期任务接下来的执行时间"""
+    count = min(request.args.get('count', 5, type=int), 50)
+    query = Task.query if current_user.is_admin else Task.query.filter_by(user_id=current_user.id)
+    tasks = [task for task in query.filter_by(is_active=True).all()
+             if task.schedule_type not in ('once', 'dependent') and task.cron_expression]
+    scheduler = get_scheduler()
+    if scheduler is not None:
+        runs = scheduler.preview_next_runs(tasks, count)
+    else:
+        runs = next_fire_times_batch([task.cron_expression for task in tasks], count=count)
+    return jsonify([{
+        'id': task.id,
+        'name': task.name,
+        'cron_expression': task.cron_expression,
+        'next_runs': [t.strftime('%Y-%m-%d %H:%M:%S') for t in times] if times is not None else None
+    } for task, times in zip(tasks, runs)])
+
+
+@bp.route('/admin/scheduler', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def scheduler_settings():
+    """运行时调整线程池大小和任务默认值，无需重启"""
+    scheduler = get_scheduler()
+    if scheduler is None or scheduler.scheduler is None:
+        flash('调度器未初始化', 'danger')
+        return redirect(url_for('tasks.monitor'))
+
+    if request.method == 'POST':
+        changes = {
+            'max_workers': request.form.get('max_workers'),
+            'max_instances': request.form.get('max_instances'),
+            'misfire_grace_time': request.form.get('misfire_grace_time'),
+            'coalesce': request.form.get('coalesce', '0')
+        }
+        try:
+            changed = scheduler.update_settings(changes, user_id=current_user.id)
+            flash(f'已更新 {len(changed)} 项设置' if changed else '设置未变化', 'success')
+        except ValueError as e:
+            flash(f'设置无效: {e}', 'danger')
+        except Exception as e:
+            flash(f'更新设置失败: {e}', 'danger')
+        return redirect(url_for('tasks.scheduler_settings'))
+
+    history = SchedulerSettingChange.query.order_by(SchedulerSettingChange.id.desc()).limit(50).all()
+    return render_template('tasks/scheduler_settings.html',
+                           settings=scheduler.get_settings(),
+                           fair_share=scheduler.scheduler._lookup_executor('default').stats(),
+                           history=history)
+
+
+@bp.route('/api/scheduler/settings', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def scheduler_settings_api():
+    """查询或修改调度器运行时设置，POST 的 JSON 中只需包含要修改的项"""
+    scheduler = get_scheduler()
+    if scheduler is None or scheduler.scheduler is None:
+        return jsonify({'error': '调度器未初始化'}), 503
+
+    changed = {}
+    if request.method == 'POST':
+        try:
+            changed = scheduler.update_settings(request.get_json(silent=True) or {}, user_id=current_user.id)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'settings': scheduler.get_settings(),
+        'changed': {name: {'old': old, 'new': new} for name, (old, new) in changed.items()}
+    })
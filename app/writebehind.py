@@ -0,0 +1,254 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+
+from flask import current_app
+from sqlalchemy import select
+
+from app.stats import counter_update
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def insert(table, values):
+    """插入一行，提交后 Future 的结果为新行的主键"""
+    return ('insert', table, None, values)
+
+
+def update(table, pk, values):
+    """按主键更新一行，同一批次内对同一行的多次更新合并为一条语句"""
+    return ('update', table, pk, values)
+
+
+def bump(deltas, requires=None):
+    """
+    增减统计计数器，同一批次内合并
+    Args:
+        requires: (表, 主键)，提交时该行已不存在（如执行期间任务被删除，删除时已扣除计数）则不增减
+    """
+    table, pk = requires or (None, None)
+    return ('bump', table, pk, deltas)
+
+
+class _Group:
+    """一次提交的一组操作，组内操作在同一事务中生效"""
+
+    __slots__ = ('ops', 'future', 'enqueued_at')
+
+    def __init__(self, ops):
+        self.ops = ops
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class WriteBehindQueue:
+    """
+    执行记账的后写队列：各执行线程提交的日志插入、日志与任务更新和计数器增量由专用写线程成组提交。
+    写线程取出队列中已有的全部操作（最多 max_batch 组，最多再等待 linger 秒），
+    合并对同一行的更新后在一个事务中执行，多次执行共用一次提交，SQLite 上不再逐次争抢写锁。
+    单组操作的最长落库延迟为 linger 加一次提交的耗时；关闭时先写完队列中的全部操作再返回
+    """
+
+    def __init__(self, engine, max_batch=200, linger=0.01, max_pending=10000):
+        self.engine = engine
+        self.max_batch = int(max_batch)
+        self.linger = linger
+        self._queue = queue.Queue(maxsize=max_pending)  # 写入跟不上时阻塞提交方，避免无限堆积
+        self._conn = None
+        self._thread = None
+        self._stopped = False
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.groups = 0
+        self.failures = 0
+        self.max_batch_seen = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+
+    def start(self):
+        # 写线程独占一个连接：执行线程等待提交结果时可能占满连接池，写线程不能再从池中等待连接
+        self._conn = self.engine.connect()
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def submit(self, *ops):
+        """
+        提交一组操作
+        Returns:
+            Future: 提交成功后结果为组内 insert 的主键（没有 insert 时为 None），失败时为异常
+        """
+        group = _Group(ops)
+        if self._stopped:
+            # 已关闭时同步写入，关闭期间结束的执行也不会丢失
+            self._commit([group])
+        else:
+            self._queue.put(group)
+        return group.future
+
+    def flush(self, timeout=None):
+        """等待此前提交的全部操作落库"""
+        if self._stopped:
+            return True
+        try:
+            self.submit().result(timeout)
+            return True
+        except Exception as e:
+            logger.error(f"Write-behind flush failed: {e}")
+            return False
+
+    def shutdown(self, timeout=30):
+        """停止写线程，返回前写完队列中的全部操作"""
+        with self._lock:
+            if self._stopped or self._thread is None:
+                return
+            self._stopped = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error(f"Write-behind queue not drained within {timeout}s, "
+                         f"{self._queue.qsize()} groups pending")
+            return
+        # 关闭瞬间入队、写线程已错过的操作
+        while True:
+            try:
+                group = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if group is not _STOP:
+                self._commit([group])
+        logger.info(f"Write-behind queue drained ({self.groups} groups in {self.batches} batches)")
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            group = self._queue.get()
+            if group is _STOP:
+                break
+            batch = [group]
+            deadline = time.monotonic() + self.linger
+            while len(batch) < self.max_batch:
+                try:
+                    group = self._queue.get_nowait()
+                except queue.Empty:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        group = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                if group is _STOP:
+                    stopping = True
+                    break
+                batch.append(group)
+            self._commit(batch, dedicated=True)
+
+        # 关闭前写完剩余操作
+        remaining = []
+        while True:
+            try:
+                group = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if group is not _STOP:
+                remaining.append(group)
+        for start in range(0, len(remaining), self.max_batch):
+            self._commit(remaining[start:start + self.max_batch], dedicated=True)
+        self._conn.close()
+
+    def _commit(self, batch, dedicated=False):
+        """
+        Args:
+            dedicated: 是否使用写线程独占的连接（仅写线程内），否则从连接池获取
+        """
+        try:
+            if dedicated:
+                with self._conn.begin():
+                    results = self._execute(self._conn, batch)
+            else:
+                with self.engine.begin() as conn:
+                    results = self._execute(conn, batch)
+        except Exception as e:
+            if len(batch) == 1:
+                self.failures += 1
+                logger.error(f"Write-behind commit failed: {e}", exc_info=True)
+                batch[0].future.set_exception(e)
+                return
+            # 逐组重试，单组的错误不影响同一批次中的其他执行
+            logger.warning(f"Write-behind batch of {len(batch)} failed, retrying groups separately: {e}")
+            for group in batch:
+                self._commit([group], dedicated)
+            return
+
+        now = time.monotonic()
+        self.batches += 1
+        self.groups += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        self.last_latency = now - batch[0].enqueued_at
+        self.max_latency = max(self.max_latency, self.last_latency)
+        for group, result in zip(batch, results):
+            group.future.set_result(result)
+
+    @staticmethod
+    def _execute(conn, batch):
+        """插入按提交顺序执行，更新和计数器增量合并后执行"""
+        results = []
+        updates = {}  # (表名, 主键) -> (表, 合并后的字段)
+        deltas = defaultdict(int)
+        guarded = []  # (表, 主键, 增量)
+        for group in batch:
+            result = None
+            for kind, table, pk, values in group.ops:
+                if kind == 'insert':
+                    result = conn.execute(table.insert().values(**values)).inserted_primary_key[0]
+                elif kind == 'update':
+                    updates.setdefault((table.name, pk), (table, {}))[1].update(values)
+                elif kind == 'bump' and table is not None:
+                    guarded.append((table, pk, values))
+                elif kind == 'bump':
+                    for name, delta in values.items():
+                        deltas[name] += delta
+            results.append(result)
+
+        for (_, pk), (table, values) in updates.items():
+            primary_key = list(table.primary_key.columns)[0]
+            conn.execute(table.update().where(primary_key == pk).values(**values))
+        if guarded:
+            existing = set()
+            for table in {table for table, _, _ in guarded}:
+                primary_key = list(table.primary_key.columns)[0]
+                pks = [pk for t, pk, _ in guarded if t is table]
+                existing |= {(table.name, pk) for (pk,) in conn.execute(select(primary_key).where(primary_key.in_(pks)))}
+            for table, pk, values in guarded:
+                if (table.name, pk) in existing:
+                    for name, delta in values.items():
+                        deltas[name] += delta
+        for name, delta in deltas.items():
+            if delta:
+                conn.execute(counter_update(name, delta))
+        return results
+
+    def stats(self):
+        return {
+            'pending': self._queue.qsize(),
+            'batches': self.batches,
+            'groups': self.groups,
+            'avg_batch': self.groups / self.batches if self.batches else 0.0,
+            'max_batch': self.max_batch_seen,
+            'last_latency': self.last_latency,
+            'max_latency': self.max_latency,
+            'failures': self.failures,
+            'stopped': self._stopped
+        }
+
+
+def get_write_behind():
+    """启用后写队列时返回当前应用的队列，否则返回 None（同步提交）"""
+    return getattr(current_app, 'write_behind', None)
@@ -0,0 +1,120 @@
+"""
+任务列表、日志分页和监控统计查询的基准测试：
+在临时 SQLite 数据库中生成数据，分别在无复合索引和有复合索引时计时并输出查询计划
+
+用法: python benchmarks/query_benchmark.py [--tasks 2000] [--logs 200000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, select, text
+
+from app.models import User, Task, TaskLog
+
+INDEXES = ['ix_tasks_user_id_created_at', 'ix_task_logs_task_id_start_time',
+           'ix_task_logs_status_start_time', 'ix_task_logs_start_time']
+
+
+def populate(engine, task_count, log_count, users=20):
+    now = datetime(2026, 1, 1)
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'is_admin': False}
+            for i in range(1, users + 1)])
+        conn.execute(Task.__table__.insert(), [
+            {'id': i, 'name': f'task{i}', 'script_content': 'print(1)', 'cron_expression': '* * * * *',
+             'schedule_type': 'custom', 'is_active': True, 'user_id': rng.randint(1, users),
+             'created_at': now - timedelta(minutes=i)}
+            for i in range(1, task_count + 1)])
+        statuses = ['SUCCESS'] * 8 + ['FAILED', 'TIMEOUT']
+        batch = []
+        for i in range(1, log_count + 1):
+            batch.append({'task_id': rng.randint(1, task_count), 'status': rng.choice(statuses),
+                          'start_time': now - timedelta(seconds=rng.randint(0, 86400 * 30))})
+            if len(batch) == 10000:
+                conn.execute(TaskLog.__table__.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(TaskLog.__table__.insert(), batch)
+
+
+def queries(task_count):
+    tasks, logs = Task.__table__, TaskLog.__table__
+    task_id = task_count // 2
+    return {
+        'list_tasks': select(tasks).where(tasks.c.user_id == 3)
+        .order_by(tasks.c.created_at.desc()).limit(10),
+        'task_logs': select(logs).where(logs.c.task_id == task_id)
+        .order_by(logs.c.start_time.desc()).limit(20),
+        'task_logs_count': select(func.count()).select_from(logs).where(logs.c.task_id == task_id),
+        'monitor_recent': select(logs).order_by(logs.c.start_time.desc()).limit(10),
+        'monitor_failed': select(func.count()).select_from(logs)
+        .where(logs.c.status.in_(['FAILED', 'TIMEOUT'])),
+        'monitor_timeout': select(func.count()).select_from(logs).where(logs.c.status == 'TIMEOUT'),
+    }
+
+
+def measure(engine, statements, repeat):
+    """各查询的中位耗时（毫秒）和查询计划"""
+    result = {}
+    with engine.connect() as conn:
+        for name, statement in statements.items():
+            compiled = statement.compile(engine, compile_kwargs={'literal_binds': True})
+            plan = ' | '.join(row[-1] for row in conn.execute(text(f'EXPLAIN QUERY PLAN {compiled}')))
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                conn.execute(statement).fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            result[name] = (timings[len(timings) // 2], plan)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=2000)
+    parser.add_argument('--logs', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+    engine = create_engine(f'sqlite:///{path}')
+    Task.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for name in INDEXES:
+            conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
+    populate(engine, args.tasks, args.logs)
+    statements = queries(args.tasks)
+
+    before = measure(engine, statements, args.repeat)
+    with engine.begin() as conn:
+        for table in (Task.__table__, TaskLog.__table__):
+            for index in table.indexes:
+                if index.name in INDEXES:
+                    index.create(conn)
+        conn.execute(text('ANALYZE'))
+    after = measure(engine, statements, args.repeat)
+
+    print(f'tasks={args.tasks} logs={args.logs} repeat={args.repeat}')
+    print(f'{"query":<18}{"before(ms)":>12}{"after(ms)":>12}{"speedup":>10}')
+    for name in statements:
+        old, new = before[name][0], after[name][0]
+        print(f'{name:<18}{old:>12.3f}{new:>12.3f}{old / new if new else 0:>9.1f}x')
+    print()
+    for name in statements:
+        print(f'{name}:\n  before: {before[name][1]}\n  after:  {after[name][1]}')
+    engine.dispose()
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
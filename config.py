@@ -37,10 +37,66 @@ class Config:
     MAX_SCRIPT_SIZE = 1024 * 1024  # 1MB
     TASK_TIMEOUT = 3600  # 1小时
     MAX_RETRIES = 3
-    RETRY_DELAY = 300  # 5分钟
+    RETRY_DELAY = 300  # 5分钟，首次重试的基础等待时间，之后按指数退避
+    RETRY_BACKOFF_MAX = 3600  # 单次重试的最长等待时间
+    RETRY_JITTER = 0.2  # 等待时间随机浮动比例
 
 
     SCHEDULER_MAX_WORKERS = 20
+    # 公平调度：每个用户同时执行的任务数上限，管理员配额和加权公平队列中的权重更高
+    SCHEDULER_USER_MAX_CONCURRENCY = 5
+    SCHEDULER_ADMIN_MAX_CONCURRENCY = 10
+    SCHEDULER_ADMIN_WEIGHT = 2
+    SCHEDULER_OWNER_CACHE_TTL = 60  # 秒，任务归属与优先级的缓存时间
+    # 排队上限：线程全部繁忙时等待执行的任务数，超出后按任务的溢出策略处理
+    SCHEDULER_QUEUE_MAX_DEPTH = 200
+    # 默认溢出策略（可被任务单独覆盖）: queue 排队（队列满时拒绝）, coalesce 与已在排队的同一任务合并,
+    # skip 无空闲线程时跳过本次执行, shed 队列满时挤掉优先级最低的排队任务
+    SCHEDULER_OVERFLOW_POLICY = 'queue'
+    # 脚本执行后端: 'thread' 在调度线程内执行, 'process' 在独立的进程池中执行（可被任务单独覆盖）
+    SCHEDULER_EXECUTION_BACKEND = 'thread'
+    SCHEDULER_PROCESS_WORKERS = os.cpu_count() or 4
+    # forkserver: 工作进程从预先导入了 SCHEDULER_PRELOAD_MODULES 的 fork server 派生（不支持时退回 spawn）
+    SCHEDULER_PROCESS_START_METHOD = 'forkserver'
+    SCHEDULER_PRELOAD_MODULES = []  # 例如 ['pandas', 'requests', 'sqlalchemy']
+    SCHEDULER_PROCESS_PREWARM = True  # 启动时预先拉起全部工作进程
+    # 以 async def main() 为入口的脚本在共享事件循环中并发执行，此处为事件循环线程数
+    SCHEDULER_ASYNC_LOOPS = 2
+    # 脚本输出：内存中最多保留头部和尾部各若干字符，运行中按块写入日志
+    TASK_OUTPUT_HEAD_LIMIT = 512 * 1024
+    TASK_OUTPUT_TAIL_LIMIT = 512 * 1024
+    TASK_OUTPUT_FLUSH_SIZE = 16 * 1024
+    TASK_OUTPUT_FLUSH_INTERVAL = 5  # 秒
+    # 执行结束后超过阈值的输出和错误信息压缩后存入 LOG_BLOB_PATH，执行日志中只保留引用和开头的预览
+    LOG_BLOB_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'blobs')
+    LOG_BLOB_THRESHOLD = 64 * 1024  # 字节
+    LOG_BLOB_PREVIEW_SIZE = 4 * 1024  # 字符
+    LOG_BLOB_GC_GRACE = 3600  # 秒，回收时保留此时间内写入过的内容（写入到执行日志提交之间的内容尚无引用）
+    # 执行日志保留策略（可被任务单独覆盖，0 或 None 表示不限制），超出的日志先汇总到每日统计再删除；
+    # 默认不清理，需显式配置后才会删除历史日志，例如 90 天 / 每个任务 10000 条
+    LOG_RETENTION_DAYS = None
+    LOG_RETENTION_MAX_ROWS = None  # 每个任务
+    LOG_PURGE_INTERVAL = 3600  # 秒，后台清理间隔
+    LOG_PURGE_BATCH_SIZE = 500  # 每个事务删除的条数
+    LOG_PURGE_BATCH_PAUSE = 0.1  # 秒，批次之间的间隔，让出数据库写锁
+    # 执行记账后写：执行日志和任务状态的写入由专用线程成组提交，减少并发执行时 SQLite 写锁的争用；
+    # 最长落库延迟为 LINGER 加一次提交的耗时，关闭调度器时写完全部剩余操作
+    TASK_LOG_WRITE_BEHIND = False
+    TASK_LOG_WRITE_BEHIND_BATCH = 200  # 每次提交最多合并的执行记账组数
+    TASK_LOG_WRITE_BEHIND_LINGER = 0.01  # 秒，取到第一组后继续等待后续操作的时间
+    TASK_LOG_WRITE_BEHIND_MAX_PENDING = 10000  # 队列上限，写入跟不上时阻塞执行线程
+    SCRIPT_CACHE_SIZE = 256  # 脚本字节码缓存容量（按脚本个数）
+    # 预先注入脚本作用域的模块，支持 "module as alias" 写法；其余模块需在脚本中自行 import
+    SCRIPT_NAMESPACE_MODULES = ['os', 'sys', 'time', 'datetime', 'json', 're', 'math', 'random', 'logging']
+    # 多进程/多节点部署：通过数据库租约选出唯一触发任务的实例，主节点失联后最迟 TTL + 续期间隔内切换
+    SCHEDULER_LEASE_ENABLED = True
+    SCHEDULER_LEASE_TTL = 30  # 秒
+    SCHEDULER_LEASE_RENEW_INTERVAL = 10  # 秒，同时是其他实例修改被主节点感知的最长延迟
+    SCHEDULER_INDEX_REFRESH_INTERVAL = 30  # 秒，定期重建下次执行时间索引以反映其他实例的修改
+    # 按任务 ID 为周期型调度（每 N 分钟/每 N 小时等）加入固定的分钟和秒偏移，避免整分整点集中触发
+    SCHEDULER_SPREAD_FIRE_TIMES = False
+    DAG_GRAPH_CACHE_TTL = 30  # 秒，任务依赖图的缓存时间；其他进程或节点修改依赖关系后最迟在此时间后生效
+    SCHEDULER_SYNC_BATCH_SIZE = 500  # 启动时同步任务存储的批量大小
     SCHEDULER_COALESCE = False
     SCHEDULER_MAX_INSTANCES = 1
     SCHEDULER_MISFIRE_GRACE_TIME = 3600
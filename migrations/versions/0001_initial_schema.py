@@ -0,0 +1,74 @@
+"""initial schema
+
+引入迁移之前的基线表结构（users、tasks、task_logs）。
+已用 db.create_all() 建表的数据库执行 flask db stamp 0001_initial 后再升级
+
+Revision ID: 0001_initial
+Revises:
+Create Date: 2026-10-18 02:16:05
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_initial'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 与引入迁移之前的 db.create_all() 所建的表结构一致，后续新增的列和表见之后的版本
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=80), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=False),
+    sa.Column('password_hash', sa.String(length=128), nullable=True),
+    sa.Column('is_admin', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email'),
+    sa.UniqueConstraint('username')
+    )
+    op.create_table('tasks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('script_content', sa.Text(), nullable=False),
+    sa.Column('cron_expression', sa.String(length=100), nullable=False),
+    sa.Column('schedule_type', sa.String(length=20), nullable=False),
+    sa.Column('schedule_config', sa.JSON(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_run', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_status', sa.String(length=50), nullable=True),
+    sa.Column('timeout', sa.Integer(), nullable=True),
+    sa.Column('max_retries', sa.Integer(), nullable=True),
+    sa.Column('retry_count', sa.Integer(), nullable=True),
+    sa.Column('script_source', sa.String(length=20), nullable=True),
+    sa.Column('original_filename', sa.String(length=255), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('task_logs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('task_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('end_time', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('status', sa.String(length=50), nullable=True),
+    sa.Column('log_output', sa.Text(), nullable=True),
+    sa.Column('error_message', sa.Text(), nullable=True),
+    sa.Column('execution_time', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['task_id'], ['tasks.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('task_logs')
+    op.drop_table('tasks')
+    op.drop_table('users')
@@ -0,0 +1,160 @@
+"""scheduler features
+
+执行后端、异步脚本、错峰触发、公平调度、任务存储、DAG、主节点租约和运行时设置等功能新增的列和表。
+已有的列、表和索引跳过，由 db.create_all() 建表的新版本数据库标记为 0001_initial 后升级也不会出错
+
+这些功能的模型修改在引入迁移之前提交，当时没有对应的迁移，本版本统一补上：
+执行后端、进程池预热、重试、资源统计、异步脚本、任务存储、主节点租约、公平调度、错峰触发、DAG、
+溢出策略和运行时设置。早于本版本的提交只能在 db.create_all() 新建的数据库上启动，
+已有数据库需升级到本版本之后的代码再执行 db upgrade
+
+Revision ID: 0001b_scheduler_features
+Revises: 0001_initial
+Create Date: 2026-10-18 02:18:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001b_scheduler_features'
+down_revision = '0001_initial'
+branch_labels = None
+depends_on = None
+
+TASK_COLUMNS = [
+    ('execution_backend', sa.String(length=20)),
+    ('is_async', sa.Boolean()),
+    ('spread_fire_time', sa.Boolean()),
+    ('priority', sa.Integer()),
+    ('overflow_policy', sa.String(length=20)),
+    ('next_run_time', sa.Float()),
+]
+
+TASK_LOG_COLUMNS = [
+    ('start_latency', sa.Float()),
+    ('cold_start', sa.Boolean()),
+    ('attempt', sa.Integer()),
+    ('cpu_user_time', sa.Float()),
+    ('cpu_system_time', sa.Float()),
+    ('peak_memory', sa.BigInteger()),
+    ('io_read_bytes', sa.BigInteger()),
+    ('io_write_bytes', sa.BigInteger()),
+]
+
+# 带外键的列（SQLite 的批量模式要求外键约束命名）
+TASK_LOG_FOREIGN_KEYS = [
+    ('retry_of_id', 'task_logs'),
+    ('dag_run_id', 'dag_runs'),
+]
+
+
+def _columns(inspector, table):
+    return {column['name'] for column in inspector.get_columns(table)}
+
+
+def _indexes(inspector, table):
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('scheduler_leases'):
+        op.create_table('scheduler_leases',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('holder', sa.String(length=200), nullable=True),
+        sa.Column('token', sa.Integer(), nullable=False),
+        sa.Column('expires_at', sa.Float(), nullable=False),
+        sa.Column('acquired_at', sa.Float(), nullable=True),
+        sa.Column('renewed_at', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+        )
+
+    if not inspector.has_table('scheduler_setting_changes'):
+        op.create_table('scheduler_setting_changes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('setting', sa.String(length=50), nullable=False),
+        sa.Column('old_value', sa.JSON(), nullable=True),
+        sa.Column('new_value', sa.JSON(), nullable=True),
+        sa.Column('snapshot', sa.JSON(), nullable=True),
+        sa.Column('instance', sa.String(length=200), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('changed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_scheduler_setting_changes_setting', 'scheduler_setting_changes', ['setting'], unique=False)
+
+    existing = _columns(inspector, 'tasks')
+    missing = [(name, type_) for name, type_ in TASK_COLUMNS if name not in existing]
+    if missing:
+        with op.batch_alter_table('tasks', schema=None) as batch_op:
+            for name, type_ in missing:
+                batch_op.add_column(sa.Column(name, type_, nullable=True))
+    if 'ix_tasks_next_run_time' not in _indexes(inspector, 'tasks'):
+        op.create_index('ix_tasks_next_run_time', 'tasks', ['next_run_time'], unique=False)
+
+    if not inspector.has_table('dag_runs'):
+        op.create_table('dag_runs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('root_task_id', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(length=50), nullable=True),
+        sa.Column('start_time', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('end_time', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('duration', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(['root_task_id'], ['tasks.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_dag_runs_root_task_id', 'dag_runs', ['root_task_id'], unique=False)
+
+    if not inspector.has_table('task_dependencies'):
+        op.create_table('task_dependencies',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('task_id', sa.Integer(), nullable=False),
+        sa.Column('upstream_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['task_id'], ['tasks.id'], ),
+        sa.ForeignKeyConstraint(['upstream_id'], ['tasks.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('task_id', 'upstream_id')
+        )
+        op.create_index('ix_task_dependencies_task_id', 'task_dependencies', ['task_id'], unique=False)
+        op.create_index('ix_task_dependencies_upstream_id', 'task_dependencies', ['upstream_id'], unique=False)
+
+    existing = _columns(inspector, 'task_logs')
+    missing = [(name, type_) for name, type_ in TASK_LOG_COLUMNS if name not in existing]
+    missing_keys = [(name, target) for name, target in TASK_LOG_FOREIGN_KEYS if name not in existing]
+    if missing or missing_keys:
+        with op.batch_alter_table('task_logs', schema=None) as batch_op:
+            for name, type_ in missing:
+                batch_op.add_column(sa.Column(name, type_, nullable=True))
+            for name, target in missing_keys:
+                batch_op.add_column(sa.Column(name, sa.Integer(), nullable=True))
+                batch_op.create_foreign_key(f'fk_task_logs_{name}_{target}', target, [name], ['id'])
+    if 'ix_task_logs_dag_run_id' not in _indexes(inspector, 'task_logs'):
+        op.create_index('ix_task_logs_dag_run_id', 'task_logs', ['dag_run_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('task_logs', schema=None) as batch_op:
+        batch_op.drop_index('ix_task_logs_dag_run_id')
+        for name, _ in reversed(TASK_LOG_FOREIGN_KEYS):
+            batch_op.drop_column(name)
+        for name, _ in reversed(TASK_LOG_COLUMNS):
+            batch_op.drop_column(name)
+
+    op.drop_index('ix_task_dependencies_upstream_id', table_name='task_dependencies')
+    op.drop_index('ix_task_dependencies_task_id', table_name='task_dependencies')
+    op.drop_table('task_dependencies')
+    op.drop_index('ix_dag_runs_root_task_id', table_name='dag_runs')
+    op.drop_table('dag_runs')
+
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        batch_op.drop_index('ix_tasks_next_run_time')
+        for name, _ in reversed(TASK_COLUMNS):
+            batch_op.drop_column(name)
+
+    op.drop_index('ix_scheduler_setting_changes_setting', table_name='scheduler_setting_changes')
+    op.drop_table('scheduler_setting_changes')
+    op.drop_table('scheduler_leases')
@@ -0,0 +1,46 @@
+"""hot query indexes
+
+任务列表、日志分页和监控统计的复合索引。
+db.create_all() 不会为已存在的表补建索引，已有数据库需执行本迁移；索引已存在时跳过
+
+Revision ID: 0002_hot_query_indexes
+Revises: 0001b_scheduler_features
+Create Date: 2026-10-18 02:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_hot_query_indexes'
+down_revision = '0001b_scheduler_features'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    # 任务列表：按用户过滤，按创建时间倒序
+    ('tasks', 'ix_tasks_user_id_created_at', ['user_id', 'created_at']),
+    # 任务日志分页、最近执行记录
+    ('task_logs', 'ix_task_logs_task_id_start_time', ['task_id', 'start_time']),
+    # 监控页按状态统计及按状态筛选的日志
+    ('task_logs', 'ix_task_logs_status_start_time', ['status', 'start_time']),
+    # 全部日志按时间倒序分页
+    ('task_logs', 'ix_task_logs_start_time', ['start_time']),
+]
+
+
+def _existing_indexes(table):
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    for table, name, columns in INDEXES:
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for table, name, _ in reversed(INDEXES):
+        if name in _existing_indexes(table):
+            op.drop_index(name, table_name=table)
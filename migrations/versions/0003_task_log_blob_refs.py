@@ -0,0 +1,41 @@
+"""task log blob refs
+
+执行日志中转存到 BlobStore 的完整输出和错误信息的引用
+
+Revision ID: 0003_task_log_blob_refs
+Revises: 0002_hot_query_indexes
+Create Date: 2026-10-18 03:05:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_task_log_blob_refs'
+down_revision = '0002_hot_query_indexes'
+branch_labels = None
+depends_on = None
+
+COLUMNS = ['output_ref', 'error_ref']
+
+
+def _existing_columns():
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns('task_logs')}
+
+
+def upgrade():
+    missing = [name for name in COLUMNS if name not in _existing_columns()]
+    if not missing:
+        return
+    with op.batch_alter_table('task_logs', schema=None) as batch_op:
+        for name in missing:
+            batch_op.add_column(sa.Column(name, sa.String(length=64), nullable=True))
+            batch_op.create_index(batch_op.f(f'ix_task_logs_{name}'), [name], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('task_logs', schema=None) as batch_op:
+        for name in reversed(COLUMNS):
+            batch_op.drop_index(batch_op.f(f'ix_task_logs_{name}'))
+            batch_op.drop_column(name)
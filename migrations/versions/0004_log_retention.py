@@ -0,0 +1,65 @@
+"""log retention
+
+任务的执行日志保留设置和已清理日志的每日统计
+
+Revision ID: 0004_log_retention
+Revises: 0003_task_log_blob_refs
+Create Date: 2026-10-18 04:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_log_retention'
+down_revision = '0003_task_log_blob_refs'
+branch_labels = None
+depends_on = None
+
+COLUMNS = ['log_retention_days', 'log_max_rows']
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('task_log_daily_stats'):
+        op.create_table('task_log_daily_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('task_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('success_count', sa.Integer(), nullable=False),
+        sa.Column('failure_count', sa.Integer(), nullable=False),
+        sa.Column('timeout_count', sa.Integer(), nullable=False),
+        sa.Column('duration_count', sa.Integer(), nullable=False),
+        sa.Column('total_duration', sa.Float(), nullable=False),
+        sa.Column('min_duration', sa.Float(), nullable=True),
+        sa.Column('max_duration', sa.Float(), nullable=True),
+        sa.Column('p50_duration', sa.Float(), nullable=True),
+        sa.Column('p95_duration', sa.Float(), nullable=True),
+        sa.Column('p99_duration', sa.Float(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['task_id'], ['tasks.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('task_id', 'day')
+        )
+        with op.batch_alter_table('task_log_daily_stats', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_task_log_daily_stats_day'), ['day'], unique=False)
+
+    existing = {column['name'] for column in inspector.get_columns('tasks')}
+    missing = [name for name in COLUMNS if name not in existing]
+    if missing:
+        with op.batch_alter_table('tasks', schema=None) as batch_op:
+            for name in missing:
+                batch_op.add_column(sa.Column(name, sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        for name in reversed(COLUMNS):
+            batch_op.drop_column(name)
+
+    with op.batch_alter_table('task_log_daily_stats', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_task_log_daily_stats_day'))
+
+    op.drop_table('task_log_daily_stats')
@@ -0,0 +1,32 @@
+"""stat counters
+
+监控页的统计计数器，升级后首次启动应用时从原始数据初始化（或执行 flask rebuild-stats）
+
+Revision ID: 0005_stat_counters
+Revises: 0004_log_retention
+Create Date: 2026-10-18 05:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_stat_counters'
+down_revision = '0004_log_retention'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('stat_counters'):
+        return
+    op.create_table('stat_counters',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('stat_counters')
@@ -0,0 +1,31 @@
+"""task paused state
+
+任务存储中暂停的任务与已移除的任务 next_run_time 同为空，暂停状态另存一列，重启后不会被重新调度
+
+Revision ID: 0006_task_paused_state
+Revises: 0005_stat_counters
+Create Date: 2026-10-18 06:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_task_paused_state'
+down_revision = '0005_stat_counters'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('tasks')}
+    if 'is_paused' in existing:
+        return
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_paused', sa.Boolean(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        batch_op.drop_column('is_paused')
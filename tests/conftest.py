@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import Task, User  # noqa: E402
+from config import DevelopmentConfig  # noqa: E402
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    monkeypatch.setattr(DevelopmentConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setattr(DevelopmentConfig, 'SQLALCHEMY_ECHO', False)
+    monkeypatch.setattr(DevelopmentConfig, 'SCHEDULER_PROCESS_PREWARM', False)
+    monkeypatch.setattr(DevelopmentConfig, 'LOG_BLOB_PATH', str(tmp_path / 'blobs'))
+    apps = []
+
+    def make_app():
+        app = create_app('development')
+        apps.append(app)
+        return app
+
+    yield make_app
+    for app in apps:
+        if getattr(app, 'scheduler', None) and app.scheduler.scheduler.running:
+            app.scheduler.shutdown()
+
+
+def create_task(app, script="print(1)", **kwargs):
+    with app.app_context():
+        user = User.query.first()
+        if user is None:
+            user = User(username='u', email='u@example.com')
+            user.set_password('p')
+            db.session.add(user)
+            db.session.commit()
+        task = Task(name=kwargs.pop('name', 't'), script_content=script, cron_expression='*/5 * * * *',
+                    user_id=user.id, **kwargs)
+        db.session.add(task)
+        db.session.commit()
+        app.scheduler.add_job(task)
+        return task.id
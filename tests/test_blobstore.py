@@ -0,0 +1,75 @@
+import os
+import time
+
+import pytest
+
+from app.blobstore import BlobStore, release_blobs
+from app.extensions import db
+from app.models import TaskLog
+from conftest import create_task
+
+TEXT = 'x' * 2048
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(str(tmp_path / 'blobs'), threshold=1024, preview_size=100, gc_grace=60)
+
+
+def _age(store, ref, seconds):
+    old = time.time() - seconds
+    os.utime(store._path(ref), (old, old))
+
+
+def test_offload_keeps_preview_and_stores_content(store):
+    preview, ref = store.offload(TEXT)
+
+    assert ref and len(preview) < len(TEXT)
+    assert store.get(ref) == TEXT
+    assert store.offload('short') == ('short', None)
+
+
+def test_same_content_is_stored_once(store):
+    assert store.put(TEXT) == store.put(TEXT)
+    files = [name for _, _, names in os.walk(store.root) for name in names]
+    assert len(files) == 1
+
+
+def test_recently_written_blob_survives_delete(store):
+    ref = store.put(TEXT)
+
+    assert not store.delete(ref)
+    assert store.get(ref) == TEXT
+
+    _age(store, ref, 120)
+    assert store.delete(ref)
+    assert store.get(ref) is None
+
+
+def test_rewriting_existing_content_refreshes_protection(store):
+    ref = store.put(TEXT)
+    _age(store, ref, 120)
+    # 其他执行写入相同内容（引用尚未提交）
+    store.put(TEXT)
+
+    assert not store.delete(ref)
+    assert store.get(ref) == TEXT
+
+
+def test_release_deletes_only_unreferenced_old_blobs(make_app):
+    app = make_app()
+    task_id = create_task(app)
+    store = app.blob_store
+    store.gc_grace = 60
+    kept, released, fresh = store.put(TEXT), store.put(TEXT + 'a'), store.put(TEXT + 'b')
+    _age(store, kept, 120)
+    _age(store, released, 120)
+    with app.app_context():
+        db.session.add(TaskLog(task_id=task_id, status='SUCCESS', output_ref=kept))
+        db.session.commit()
+
+        assert release_blobs([kept, released, fresh, None]) == 1
+
+    assert store.get(kept) == TEXT
+    assert store.get(released) is None
+    assert store.get(fresh) == TEXT + 'b'
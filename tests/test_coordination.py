@@ -0,0 +1,100 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine, select
+
+from app import coordination
+from app.coordination import LeaseCoordinator
+from app.extensions import db
+from app.models import SchedulerLease, Task, TaskLog
+from app.stats import compute_counters, read_counters
+from conftest import create_task
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'lease.db'}")
+    SchedulerLease.__table__.create(engine)
+    yield engine
+    engine.dispose()
+
+
+def _coordinator(engine, **kwargs):
+    kwargs.setdefault('ttl', 1)
+    kwargs.setdefault('renew_interval', 0.5)
+    coordinator = LeaseCoordinator(engine, **kwargs)
+    coordinator._ensure_row()
+    return coordinator
+
+
+def test_only_one_instance_holds_the_lease(engine):
+    first, second = _coordinator(engine), _coordinator(engine)
+    first.tick()
+    second.tick()
+
+    assert first.holds_lease()
+    assert not second.is_leader and second.leader == first.holder_id
+
+
+def test_expiry_ignores_local_wall_clocks(engine, monkeypatch):
+    first, second = _coordinator(engine, ttl=30, renew_interval=10), _coordinator(engine, ttl=30, renew_interval=10)
+    first.tick()
+    # 本地时钟偏差不影响租约判断：到期时间由数据库时间计算
+    monkeypatch.setattr(coordination.time, 'time', lambda: 4102444800.0)
+    second.tick()
+    first.tick()
+
+    assert first.holds_lease()
+    assert not second.is_leader
+
+
+def test_holder_stops_at_local_deadline_before_lease_expires(engine):
+    first, second = _coordinator(engine), _coordinator(engine)
+    first.tick()
+    # 续期线程停滞：本地截止时间先于数据库中的到期时间
+    time.sleep(1.1)
+    assert first.is_leader and not first.holds_lease()
+
+    second.tick()
+    assert second.holds_lease()
+    # 原主节点续期失败后让出
+    first.tick()
+    assert not first.is_leader
+
+
+def test_release_allows_immediate_takeover(engine):
+    first, second = _coordinator(engine, ttl=30, renew_interval=10), _coordinator(engine, ttl=30, renew_interval=10)
+    first.tick()
+    first.release()
+    second.tick()
+
+    assert not first.is_leader
+    assert second.holds_lease() and second.token == first.token + 1
+    with engine.connect() as conn:
+        assert conn.execute(select(SchedulerLease.__table__.c.holder)).scalar() == second.holder_id
+
+
+def test_run_skipped_on_expired_lease_is_recorded_and_handed_back(make_app):
+    from app.scheduler import execute_task_wrapper
+
+    app = make_app()
+    task_id = create_task(app)
+    coordinator = app.scheduler.coordinator
+    assert coordinator.holds_lease()
+    with app.app_context():
+        scheduled = db.session.get(Task, task_id).next_run_time
+
+    coordinator.deadline = time.monotonic() - 1
+    before = time.time()
+    assert execute_task_wrapper(task_id) == ("Scheduler lease expired", 'SKIPPED')
+
+    assert not coordinator.is_leader
+    assert app.scheduler.missed_runs['lease_expired'] == 1
+    with app.app_context():
+        logs = TaskLog.query.filter_by(task_id=task_id).all()
+        assert [log.status for log in logs] == ['SKIPPED']
+        # 下次执行时间改回本次，由新的主节点按错过宽限时间处理
+        next_run_time = db.session.get(Task, task_id).next_run_time
+        assert before - 1 <= next_run_time <= time.time() < scheduled
+        counters = read_counters()
+        assert counters['executions_total'] == compute_counters()['executions_total'] == 1
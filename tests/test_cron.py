@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+from apscheduler.triggers.cron import CronTrigger
+
+from app.cron import BEIJING_TZ, CRONTAB_FIELDS, compile_cron, validate_cron
+
+EXPRESSIONS = [
+    '* * * * *',
+    '*/5 * * * *',
+    '*/7 * * * *',
+    '0 * * * *',
+    '15,45 9-17 * * mon-fri',
+    '30 2 1 * *',
+    '0 0 29 2 * 2026-2060',
+    '0 12 * jan,jul sun',
+    '10-50/20 */3 * * *',
+    '0 0 31 * *',
+    '5 4 * * 6 2027',
+    '0 9 last * *',
+]
+
+
+def _fields(expression):
+    return dict(zip(CRONTAB_FIELDS, expression.split()), second='0')
+
+
+def _assert_same_fire_times(fields, timezone, start, count=100):
+    compiled = compile_cron(fields, timezone)
+    trigger = CronTrigger(timezone=timezone, **fields)
+    now = start
+    for _ in range(count):
+        expected = trigger.get_next_fire_time(None, now)
+        assert compiled.next_fire_time(now) == expected
+        if expected is None:
+            break
+        now = expected + timedelta(seconds=1)
+
+
+@pytest.mark.parametrize('expression', EXPRESSIONS)
+def test_compiled_cron_matches_cron_trigger(expression):
+    start = BEIJING_TZ.localize(datetime(2026, 1, 30, 23, 59, 30))
+    _assert_same_fire_times(_fields(expression), BEIJING_TZ, start)
+
+
+@pytest.mark.parametrize('expression', ['*/30 * * * *', '0 1 * * *', '0 12 * * *'])
+def test_compiled_cron_matches_cron_trigger_across_dst(expression):
+    timezone = pytz.timezone('America/New_York')
+    start = timezone.localize(datetime(2026, 3, 7, 12, 0))
+    _assert_same_fire_times(_fields(expression), timezone, start)
+
+
+def test_time_skipped_by_dst_moves_to_next_match():
+    timezone = pytz.timezone('America/New_York')
+    compiled = compile_cron(_fields('30 2 * * *'), timezone)
+    fire_time = compiled.next_fire_time(timezone.localize(datetime(2026, 3, 7, 12, 0)))
+    assert fire_time == timezone.localize(datetime(2026, 3, 9, 2, 30))
+
+
+def test_next_fire_time_rounds_up_microseconds():
+    compiled = compile_cron('* * * * *')
+    now = BEIJING_TZ.localize(datetime(2026, 1, 1, 0, 0, 0, 500))
+    assert compiled.next_fire_time(now) == BEIJING_TZ.localize(datetime(2026, 1, 1, 0, 1))
+
+
+@pytest.mark.parametrize('expression', ['', '* * * *', '61 * * * *', '* 24 * * *', '*/0 * * * *', 'a b c d e'])
+def test_invalid_expressions_rejected(expression):
+    valid, error = validate_cron(expression)
+    assert not valid and error
+
+
+def test_compile_cron_is_cached():
+    fields = {'minute': '*/5', 'hour': '*', 'day': '*', 'month': '*', 'day_of_week': '*', 'second': '0'}
+    assert compile_cron('*/5 * * * *') is compile_cron(fields)
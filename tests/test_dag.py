@@ -0,0 +1,183 @@
+import time
+
+import pytest
+
+from app import dag
+from app.extensions import db
+from app.models import DagRun, Task, TaskDependency, TaskLog
+from conftest import create_task
+
+
+@pytest.fixture(autouse=True)
+def _reset_dag_state():
+    # 依赖图缓存和触发记录是模块级状态，各测试之间清空
+    dag.invalidate_dependency_graph()
+    dag._triggered.clear()
+    yield
+    dag.invalidate_dependency_graph()
+    dag._triggered.clear()
+
+
+def _dependent(app, name, upstream_ids):
+    task_id = create_task(app, name=name, schedule_type='dependent')
+    with app.app_context():
+        task = db.session.get(Task, task_id)
+        dag.set_upstreams(task, upstream_ids)
+        db.session.commit()
+    dag.invalidate_dependency_graph()
+    return task_id
+
+
+@pytest.fixture
+def diamond(make_app, monkeypatch):
+    """A -> B、A -> C、B & C -> D，记录被触发的下游任务而不实际执行"""
+    app = make_app()
+    a = create_task(app, name='a')
+    b = _dependent(app, 'b', [a])
+    c = _dependent(app, 'c', [a])
+    d = _dependent(app, 'd', [b, c])
+    triggered = []
+
+    def trigger_task(task, dag_run_id=None):
+        triggered.append((task.id, dag_run_id))
+        return True
+
+    monkeypatch.setattr(app.scheduler, 'trigger_task', trigger_task)
+    return app, (a, b, c, d), triggered
+
+
+def _log(run_id, task_id, status='SUCCESS'):
+    task_log = TaskLog(task_id=task_id, status=status, dag_run_id=run_id)
+    db.session.add(task_log)
+    db.session.commit()
+    return task_log
+
+
+def _begin(a):
+    run_id = dag.begin_dag_run(db.session.get(Task, a))
+    db.session.commit()
+    return run_id
+
+
+def _finish(run_id, *task_ids):
+    """task_ids 的执行记录全部写入后再依次推进，模拟多个上游同时完成"""
+    logs = [_log(run_id, task_id) for task_id in task_ids]
+    for task_id, task_log in zip(task_ids, logs):
+        dag.on_execution_finished(db.session.get(Task, task_id), task_log, 'SUCCESS', False)
+
+
+def test_diamond_triggers_join_once(diamond):
+    app, (a, b, c, d), triggered = diamond
+    with app.app_context():
+        run_id = _begin(a)
+        assert run_id is not None
+
+        _finish(run_id, a)
+        assert sorted(triggered) == [(b, run_id), (c, run_id)]
+
+        # B、C 都已成功后才各自推进：D 只能触发一次
+        triggered.clear()
+        _finish(run_id, b, c)
+        assert triggered == [(d, run_id)]
+
+        _finish(run_id, d)
+        run = db.session.get(DagRun, run_id)
+        assert run.status == 'SUCCESS'
+        assert run.duration is not None
+        assert triggered == [(d, run_id)]
+        assert not any(key[0] == run_id for key in dag._triggered)
+
+
+def test_diamond_waits_for_all_upstreams(diamond):
+    app, (a, b, c, d), triggered = diamond
+    with app.app_context():
+        run_id = _begin(a)
+        _finish(run_id, a)
+        triggered.clear()
+
+        _finish(run_id, b)
+        assert triggered == []
+        _finish(run_id, c)
+        assert triggered == [(d, run_id)]
+
+
+def test_failed_branch_fails_run(diamond):
+    app, (a, b, c, d), triggered = diamond
+    with app.app_context():
+        run_id = _begin(a)
+        _finish(run_id, a)
+        triggered.clear()
+
+        task_log = _log(run_id, b, status='FAILED')
+        dag.on_execution_finished(db.session.get(Task, b), task_log, 'FAILED', False)
+        _finish(run_id, c)
+        assert db.session.get(DagRun, run_id).status == 'FAILED'
+        assert triggered == []
+
+
+def test_trigger_marks_expire_after_ttl(diamond, monkeypatch):
+    app, (a, b, c, d), triggered = diamond
+    with app.app_context():
+        run_id = _begin(a)
+        # 中途被放弃的运行留下的触发记录
+        dag._triggered[(run_id + 100, d)] = time.monotonic() - 10
+        dag._triggered[(run_id + 101, d)] = time.monotonic()
+        monkeypatch.setattr(dag, 'TRIGGERED_TTL', 5)
+
+        _finish(run_id, a)
+        assert (run_id + 100, d) not in dag._triggered
+        assert (run_id + 101, d) in dag._triggered
+        # 本次运行刚写入的触发记录未到期，运行结束前保留
+        assert (run_id, b) in dag._triggered and (run_id, c) in dag._triggered
+
+
+def test_graph_cache_invalidated_on_edit(make_app):
+    app = make_app()
+    a = create_task(app, name='a')
+    b = create_task(app, name='b')
+    c = _dependent(app, 'c', [a])
+    with app.app_context():
+        assert dag._dependency_graph()[0] == {a: [c]}
+
+        # 未清除缓存的修改（如其他进程提交的）在缓存到期前不可见
+        db.session.add(TaskDependency(task_id=c, upstream_id=b))
+        db.session.commit()
+        assert dag._dependency_graph()[0] == {a: [c]}
+
+        dag.invalidate_dependency_graph()
+        assert dag._dependency_graph()[0] == {a: [c], b: [c]}
+
+
+def test_graph_cache_expires_without_invalidation(make_app):
+    app = make_app()
+    a = create_task(app, name='a')
+    c = _dependent(app, 'c', [a])
+    app.config['DAG_GRAPH_CACHE_TTL'] = 0.2
+    with app.app_context():
+        assert dag._dependency_graph()[0] == {a: [c]}
+
+        # 其他进程停用了 c：本进程不会收到清除通知，缓存到期后生效
+        db.session.get(Task, c).is_active = False
+        db.session.commit()
+        assert dag._dependency_graph()[0] == {a: [c]}
+        time.sleep(0.3)
+        assert dag._dependency_graph()[0] == {}
+
+
+def test_edit_view_invalidates_graph(make_app):
+    app = make_app()
+    a = create_task(app, name='a')
+    b = create_task(app, name='b')
+    c = _dependent(app, 'c', [a])
+    with app.app_context():
+        assert dag._dependency_graph()[0] == {a: [c]}
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'u', 'password': 'p'})
+    response = client.post(f'/tasks/{c}/edit', data={
+        'name': 'c', 'description': '', 'script_content': 'print(1)',
+        'schedule_type': 'dependent', 'upstream_ids': [str(b)],
+    })
+    assert response.status_code == 302 and response.location.endswith('/tasks')
+    with app.app_context():
+        assert dag._dependency_graph()[0] == {b: [c]}
@@ -0,0 +1,334 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+import pytz
+from apscheduler.executors.base import MaxInstancesReachedError
+from apscheduler.job import Job
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.date import DateTrigger
+
+from app.fairshare import FairShareExecutor
+
+UTC = pytz.utc
+
+
+def _job(scheduler, job_id, func, max_instances=1):
+    job = Job(scheduler, id=job_id, func=func, args=(), kwargs={}, name=job_id,
+              trigger=DateTrigger(datetime(2030, 1, 1, tzinfo=UTC), timezone=UTC),
+              executor='default', misfire_grace_time=None, coalesce=False,
+              max_instances=max_instances, next_run_time=None)
+    job._jobstore_alias = 'default'
+    return job
+
+
+def _run_time(minute):
+    return [datetime(2030, 1, 1, 0, minute, tzinfo=UTC)]
+
+
+@pytest.fixture
+def scheduler():
+    return BackgroundScheduler(timezone=UTC)
+
+
+def _executor(scheduler, owners, **kwargs):
+    """owners: job_id -> (user_id, is_admin, priority, overflow_policy)"""
+    kwargs.setdefault('max_workers', 1)
+    executor = FairShareExecutor(owner_resolver=lambda job: owners[job.id], **kwargs)
+    executor.start(scheduler, 'default')
+    return executor
+
+
+def _blocker(scheduler, executor, release):
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    executor.submit_job(_job(scheduler, 'blocker', block), _run_time(0))
+    assert started.wait(5)
+
+
+def test_coalesce_merges_fire_into_queued_run(scheduler):
+    runs = []
+    done = threading.Event()
+    release = threading.Event()
+
+    def record():
+        runs.append(1)
+        done.set()
+
+    owners = {'blocker': (1, False, 0, 'queue'), 'job': (1, False, 0, 'coalesce')}
+    executor = _executor(scheduler, owners)
+    _blocker(scheduler, executor, release)
+    job = _job(scheduler, 'job', record, max_instances=1)
+
+    executor.submit_job(job, _run_time(1))
+    # 同一任务已在排队：合并而不是达到 max_instances
+    executor.submit_job(job, _run_time(2))
+    executor.submit_job(job, _run_time(3))
+
+    stats = executor.stats()
+    assert stats['queued'] == 1
+    assert stats['dropped']['coalesced'] == 2
+    queued = executor._queues[1].heap[0]
+    assert queued[4] == _run_time(3)
+
+    release.set()
+    assert done.wait(5)
+    executor.shutdown()
+    assert runs == [1]
+    assert executor._instances.get('job', 0) == 0
+
+
+def test_queue_policy_still_limited_by_max_instances(scheduler):
+    release = threading.Event()
+    owners = {'blocker': (1, False, 0, 'queue'), 'job': (1, False, 0, 'queue')}
+    executor = _executor(scheduler, owners)
+    _blocker(scheduler, executor, release)
+    job = _job(scheduler, 'job', lambda: None, max_instances=1)
+
+    executor.submit_job(job, _run_time(1))
+    with pytest.raises(MaxInstancesReachedError):
+        executor.submit_job(job, _run_time(2))
+    release.set()
+    executor.shutdown()
+
+
+class _Runs:
+    """记录实际执行过的任务"""
+
+    def __init__(self):
+        self.ran = []
+        self._lock = threading.Lock()
+
+    def func(self, name):
+        def run():
+            with self._lock:
+                self.ran.append(name)
+        return run
+
+    def wait(self, count, timeout=5):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if len(self.ran) >= count:
+                    return True
+            time.sleep(0.01)
+        return False
+
+
+def test_queue_policy_runs_queued_job_once_a_thread_frees(scheduler):
+    release, runs = threading.Event(), _Runs()
+    owners = {'blocker': (1, False, 0, 'queue'), 'job': (2, False, 0, 'queue')}
+    executor = _executor(scheduler, owners)
+    _blocker(scheduler, executor, release)
+
+    executor.submit_job(_job(scheduler, 'job', runs.func('job')), _run_time(1))
+    assert executor.stats()['queued'] == 1 and runs.ran == []
+    release.set()
+    assert runs.wait(1)
+    executor.shutdown()
+    assert runs.ran == ['job']
+    assert executor.stats()['dropped'] == dict.fromkeys(('rejected', 'skipped', 'coalesced', 'shed'), 0)
+
+
+def test_skip_policy_drops_when_busy(scheduler):
+    release, runs = threading.Event(), _Runs()
+    owners = {'blocker': (1, False, 0, 'queue'), 'job': (2, False, 0, 'skip')}
+    executor = _executor(scheduler, owners)
+    _blocker(scheduler, executor, release)
+
+    executor.submit_job(_job(scheduler, 'job', runs.func('job')), _run_time(1))
+    stats = executor.stats()
+    assert stats['queued'] == 0
+    assert stats['dropped']['skipped'] == 1
+    assert executor._instances.get('job', 0) == 0
+    release.set()
+    executor.shutdown()
+    assert runs.ran == []
+
+
+def test_skip_policy_runs_when_a_thread_is_free(scheduler):
+    runs = _Runs()
+    executor = _executor(scheduler, {'job': (1, False, 0, 'skip')})
+
+    executor.submit_job(_job(scheduler, 'job', runs.func('job')), _run_time(1))
+    assert runs.wait(1)
+    executor.shutdown()
+    assert runs.ran == ['job']
+    assert executor.stats()['dropped']['skipped'] == 0
+
+
+def test_shed_evicts_lowest_priority_when_full(scheduler):
+    release, runs = threading.Event(), _Runs()
+    owners = {
+        'blocker': (1, False, 0, 'queue'),
+        'low': (1, False, 0, 'queue'),
+        'high': (1, False, 5, 'shed'),
+    }
+    executor = _executor(scheduler, owners, max_queue_depth=1)
+    _blocker(scheduler, executor, release)
+
+    executor.submit_job(_job(scheduler, 'low', runs.func('low')), _run_time(1))
+    executor.submit_job(_job(scheduler, 'high', runs.func('high')), _run_time(1))
+    stats = executor.stats()
+    assert stats['queued'] == 1
+    assert stats['dropped']['shed'] == 1
+    assert executor._recent_drops[-1]['job_id'] == 'low'
+    assert executor._instances.get('low', 0) == 0
+    release.set()
+    assert runs.wait(1)
+    executor.shutdown()
+    assert runs.ran == ['high']
+
+
+def test_shed_rejects_itself_when_queued_jobs_are_not_lower(scheduler):
+    release, runs = threading.Event(), _Runs()
+    owners = {
+        'blocker': (1, False, 0, 'queue'),
+        'queued': (1, False, 5, 'queue'),
+        'new': (1, False, 5, 'shed'),
+    }
+    executor = _executor(scheduler, owners, max_queue_depth=1)
+    _blocker(scheduler, executor, release)
+
+    executor.submit_job(_job(scheduler, 'queued', runs.func('queued')), _run_time(1))
+    executor.submit_job(_job(scheduler, 'new', runs.func('new')), _run_time(1))
+    assert executor.stats()['dropped']['rejected'] == 1
+    release.set()
+    assert runs.wait(1)
+    executor.shutdown()
+    assert runs.ran == ['queued']
+
+
+def test_queue_full_rejects(scheduler):
+    release, runs = threading.Event(), _Runs()
+    owners = {'blocker': (1, False, 0, 'queue'), 'a': (1, False, 0, 'queue'), 'b': (2, False, 0, 'queue')}
+    executor = _executor(scheduler, owners, max_queue_depth=1)
+    _blocker(scheduler, executor, release)
+
+    executor.submit_job(_job(scheduler, 'a', runs.func('a')), _run_time(1))
+    executor.submit_job(_job(scheduler, 'b', runs.func('b')), _run_time(1))
+    assert executor.stats()['dropped']['rejected'] == 1
+    assert executor._instances.get('b', 0) == 0
+    release.set()
+    assert runs.wait(1)
+    executor.shutdown()
+    assert runs.ran == ['a']
+
+
+def test_user_quota_limits_running(scheduler):
+    """用户达到并发配额后其余任务排队，线程空闲后依次执行"""
+    release = threading.Event()
+    finished = threading.Event()
+    order = []
+    lock = threading.Lock()
+
+    def work(name):
+        def run():
+            with lock:
+                order.append(name)
+                if len(order) == len(owners):
+                    finished.set()
+            release.wait(5)
+        return run
+
+    owners = {f'u1-{i}': (1, False, 0, 'queue') for i in range(3)}
+    owners.update({f'u2-{i}': (2, False, 0, 'queue') for i in range(3)})
+    executor = _executor(scheduler, owners, max_workers=4, user_quota=2)
+    for i in range(3):
+        executor.submit_job(_job(scheduler, f'u1-{i}', work(f'u1-{i}')), _run_time(1))
+    for i in range(3):
+        executor.submit_job(_job(scheduler, f'u2-{i}', work(f'u2-{i}')), _run_time(1))
+
+    stats = executor.stats()
+    assert stats['running'] == 4
+    assert stats['queued'] == 2
+    users = {user['user_id']: user for user in stats['users']}
+    assert users[1]['running'] == 2 and users[2]['running'] == 2
+    release.set()
+    assert finished.wait(5)
+    executor.shutdown()
+    assert sorted(order) == sorted(owners)
+
+
+def _tracked_jobs(scheduler, count, release, prefix='job'):
+    """count 个阻塞到 release 的任务，返回 (任务列表, 当前执行数统计)"""
+    lock = threading.Lock()
+    state = {'running': 0, 'peak': 0, 'started': 0}
+
+    def work():
+        with lock:
+            state['running'] += 1
+            state['started'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+        release.wait(5)
+        with lock:
+            state['running'] -= 1
+
+    return [_job(scheduler, f'{prefix}{i}', work) for i in range(count)], state
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_resize_up_dispatches_queued_jobs(scheduler):
+    release = threading.Event()
+    jobs, state = _tracked_jobs(scheduler, 4, release)
+    executor = _executor(scheduler, {job.id: (job.id, False, 0, 'queue') for job in jobs},
+                         max_workers=1, pool_limit=10)
+    for job in jobs:
+        executor.submit_job(job, _run_time(1))
+    assert _wait_for(lambda: state['running'] == 1)
+    assert executor.stats()['queued'] == 3
+
+    executor.resize(3)
+    assert _wait_for(lambda: state['running'] == 3)
+    assert executor.stats()['queued'] == 1
+    release.set()
+    assert _wait_for(lambda: state['started'] == 4)
+    executor.shutdown()
+
+
+def test_resize_down_limits_running_jobs(scheduler):
+    release, later = threading.Event(), threading.Event()
+    jobs, state = _tracked_jobs(scheduler, 3, release)
+    later_jobs, later_state = _tracked_jobs(scheduler, 3, later, prefix='later')
+    executor = _executor(scheduler, {job.id: (job.id, False, 0, 'queue') for job in jobs + later_jobs},
+                         max_workers=3, pool_limit=10)
+    for job in jobs:
+        executor.submit_job(job, _run_time(1))
+    assert _wait_for(lambda: state['running'] == 3)
+
+    executor.resize(1)
+    # 正在执行的任务不受影响，新到期的任务等到执行数回落到新的上限以下
+    for job in later_jobs:
+        executor.submit_job(job, _run_time(1))
+    time.sleep(0.1)
+    assert later_state['started'] == 0
+
+    release.set()
+    assert _wait_for(lambda: later_state['started'] == 1)
+    time.sleep(0.1)
+    assert later_state['running'] == 1 and later_state['started'] == 1
+    later.set()
+    assert _wait_for(lambda: later_state['started'] == 3)
+    assert later_state['peak'] == 1
+    executor.shutdown()
+
+
+def test_resize_beyond_pool_limit_rejected(scheduler):
+    executor = _executor(scheduler, {}, max_workers=2, pool_limit=4)
+    with pytest.raises(ValueError):
+        executor.resize(5)
+    assert executor.max_workers == 2
+    executor.shutdown()
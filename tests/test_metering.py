@@ -0,0 +1,55 @@
+import threading
+import time
+
+import pytest
+
+from app import metering
+from app.metering import ResourceMeter, USAGE_FIELDS
+
+
+def _spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_thread_meter_in_thread():
+    meter = ResourceMeter('thread').start()
+    _spin(0.2)
+    usage = meter.stop()
+
+    assert set(usage) == set(USAGE_FIELDS)
+    assert 0.1 <= usage['cpu_user_time'] + usage['cpu_system_time'] <= 1.0
+    assert usage['peak_memory'] is None
+
+
+@pytest.mark.skipif(metering._thread_cpu(threading.get_native_id())[0] is None, reason='requires /proc')
+def test_thread_meter_read_from_another_thread():
+    meter = ResourceMeter('thread')
+    started, done = threading.Event(), threading.Event()
+
+    def work():
+        meter.start()
+        started.set()
+        _spin(0.3)
+        done.wait(5)
+
+    thread = threading.Thread(target=work)
+    thread.start()
+    assert started.wait(5)
+    time.sleep(0.4)
+    usage = meter.stop(from_other_thread=True)
+    done.set()
+    thread.join()
+
+    # 起止都按 /proc 的时钟周期读取，只包含脚本线程自身的 CPU 时间
+    assert 0.2 <= usage['cpu_user_time'] + usage['cpu_system_time'] <= 0.6
+
+
+def test_process_meter_reports_peak_only_after_reset(monkeypatch):
+    monkeypatch.setattr(metering, '_reset_vm_hwm', lambda: True)
+    assert ResourceMeter('process').start().stop()['peak_memory'] > 0
+
+    # 无法重置时读到的是进程生命周期内的峰值，不作为本次执行的峰值
+    monkeypatch.setattr(metering, '_reset_vm_hwm', lambda: False)
+    assert ResourceMeter('process').start().stop()['peak_memory'] is None
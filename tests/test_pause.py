@@ -0,0 +1,40 @@
+from app.extensions import db
+from app.models import Task
+from conftest import create_task
+
+
+def _task_state(app, task_id):
+    with app.app_context():
+        task = db.session.get(Task, task_id)
+        return task.is_active, task.is_paused, task.next_run_time
+
+
+def test_paused_job_stays_paused_across_restart(make_app):
+    app = make_app()
+    task_id = create_task(app)
+    assert _task_state(app, task_id)[2] is not None
+
+    assert app.scheduler.pause_job(task_id)
+    assert _task_state(app, task_id) == (True, True, None)
+    app.scheduler.shutdown()
+
+    # 重启：启动时补算下次执行时间不应恢复已暂停的任务
+    app = make_app()
+    assert _task_state(app, task_id) == (True, True, None)
+    assert app.scheduler.scheduler.get_job(f'task_{task_id}').next_run_time is None
+
+    assert app.scheduler.resume_job(task_id)
+    is_active, is_paused, next_run_time = _task_state(app, task_id)
+    assert is_active and not is_paused and next_run_time is not None
+
+
+def test_removed_job_is_rescheduled_on_restart(make_app):
+    app = make_app()
+    task_id = create_task(app)
+    # 移除（而非暂停）的活动任务在启动时重新计算下次执行时间
+    app.scheduler.remove_job(task_id)
+    assert _task_state(app, task_id) == (True, False, None)
+    app.scheduler.shutdown()
+
+    app = make_app()
+    assert _task_state(app, task_id)[2] is not None
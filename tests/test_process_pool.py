@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+
+import pytest
+
+from app import executor
+from app.executor import process_pool_stats, run_in_process_pool, shutdown_process_pool
+
+CONFIG = {
+    'SCHEDULER_PROCESS_WORKERS': 2,
+    'SCHEDULER_PROCESS_START_METHOD': 'forkserver',
+    'SCHEDULER_PRELOAD_MODULES': []
+}
+
+# 屏蔽 SIGALRM 后工作进程无法自行中断，只能由父进程终止
+HUNG_SCRIPT = """
+import signal, time
+signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+time.sleep(60)
+"""
+
+
+@pytest.fixture(autouse=True)
+def pool(monkeypatch):
+    monkeypatch.setattr(executor, 'PROCESS_TIMEOUT_GRACE', 1)
+    yield
+    shutdown_process_pool(wait=False)
+
+
+def _workers(pool):
+    return list(pool._processes.values())
+
+
+def _wait_dead(processes, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not any(process.is_alive() for process in processes):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def test_runs_script_in_worker_process():
+    result = run_in_process_pool("import os\nprint(os.getpid())", CONFIG)
+
+    assert result['status'] == 'SUCCESS'
+    assert int(result['output'].strip()) != os.getpid()
+    assert result['usage'] and 'cold_start' in result
+
+
+def test_script_error_is_reported():
+    result = run_in_process_pool("raise ValueError('boom')", CONFIG)
+
+    assert result['status'] == 'FAILED'
+    assert result['error'] == 'boom'
+
+
+def test_timeout_interrupts_worker_without_recycling():
+    recycled = process_pool_stats()['recycled']
+    result = run_in_process_pool("print('start')\nwhile True: pass", CONFIG, timeout=1)
+
+    assert result['status'] == 'TIMEOUT'
+    assert 'start' in result['output']
+    assert process_pool_stats()['recycled'] == recycled
+    assert run_in_process_pool("print('ok')", CONFIG)['status'] == 'SUCCESS'
+
+
+def test_hung_worker_is_killed_and_pool_replaced():
+    recycled = process_pool_stats()['recycled']
+    run_in_process_pool("pass", CONFIG)
+    pool = executor._process_pool
+    workers = _workers(pool)
+
+    result = run_in_process_pool(HUNG_SCRIPT, CONFIG, timeout=1)
+
+    assert result['status'] == 'TIMEOUT'
+    assert process_pool_stats()['recycled'] == recycled + 1
+    assert executor._process_pool is not pool
+    assert _wait_dead(workers)
+    assert pool not in executor._recycling_pools and pool not in executor._pool_inflight
+    # 之后的执行由新建的进程池承担
+    assert run_in_process_pool("print('ok')", CONFIG)['output'].strip() == 'ok'
+
+
+def test_recycling_waits_for_other_running_executions():
+    run_in_process_pool("pass", CONFIG)
+    pool = executor._process_pool
+    workers = _workers(pool)
+    results = {}
+    slow = threading.Thread(target=lambda: results.update(
+        slow=run_in_process_pool("import time\ntime.sleep(3)\nprint('done')", CONFIG, timeout=10)))
+    slow.start()
+    time.sleep(0.5)
+
+    assert run_in_process_pool(HUNG_SCRIPT, CONFIG, timeout=1)['status'] == 'TIMEOUT'
+    assert any(process.is_alive() for process in workers)
+    slow.join(15)
+
+    assert results['slow']['status'] == 'SUCCESS'
+    assert results['slow']['output'].strip() == 'done'
+    assert _wait_dead(workers)
+
+
+def test_abrupt_worker_exit_rebuilds_pool():
+    result = run_in_process_pool("import os\nos._exit(1)", CONFIG)
+
+    assert result['status'] == 'FAILED'
+    assert 'terminated abruptly' in result['error']
+    assert run_in_process_pool("print('ok')", CONFIG)['status'] == 'SUCCESS'
+
+
+def test_kill_workers_terminates_every_worker():
+    pool = executor.get_process_pool(CONFIG)
+    for future in [pool.submit(executor._warmup) for _ in range(2)]:
+        future.result(10)
+    workers = _workers(pool)
+
+    assert executor._kill_workers(pool) == len(workers)
+    assert _wait_dead(workers)
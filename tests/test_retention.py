@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.extensions import db
+from app.models import TaskLog, TaskLogDailyStat
+from app.retention import BEIJING_TZ, _percentile, purge_logs
+from conftest import create_task
+
+
+@pytest.mark.parametrize('values, q, expected', [
+    (list(range(1, 11)), 0.9, 9),
+    (list(range(1, 11)), 0.5, 5),
+    (list(range(1, 11)), 0.95, 10),
+    (list(range(1, 11)), 0.1, 1),
+    ([1, 2], 0.5, 1),
+    ([1, 2, 3], 0.5, 2),
+    ([7], 0.99, 7),
+    (list(range(1, 101)), 0.99, 99),
+    (list(range(1, 101)), 0.0, 1),
+])
+def test_percentile_is_nearest_rank(values, q, expected):
+    assert _percentile(values, q) == expected
+
+
+def test_percentile_of_nothing():
+    assert _percentile([], 0.5) is None
+
+
+def _add_logs(app, task_id, days_ago, count):
+    with app.app_context():
+        start = datetime.now(BEIJING_TZ) - timedelta(days=days_ago)
+        db.session.add_all(TaskLog(task_id=task_id, start_time=start, end_time=start, status='SUCCESS',
+                                   execution_time=float(i + 1)) for i in range(count))
+        db.session.commit()
+
+
+def test_logs_are_kept_unless_retention_is_configured(make_app):
+    app = make_app()
+    task_id = create_task(app)
+    _add_logs(app, task_id, 400, 5)
+
+    with app.app_context():
+        assert purge_logs(app.config)['deleted'] == 0
+        assert TaskLog.query.filter_by(task_id=task_id).count() == 5
+
+
+def test_configured_retention_rolls_up_and_purges(make_app):
+    app = make_app()
+    task_id = create_task(app)
+    _add_logs(app, task_id, 40, 10)
+    _add_logs(app, task_id, 1, 2)
+
+    config = dict(app.config, LOG_RETENTION_DAYS=30, LOG_PURGE_BATCH_PAUSE=0)
+    with app.app_context():
+        assert purge_logs(config)['deleted'] == 10
+        assert TaskLog.query.filter_by(task_id=task_id).count() == 2
+        stat = TaskLogDailyStat.query.filter_by(task_id=task_id).one()
+        assert (stat.count, stat.success_count, stat.duration_count) == (10, 10, 10)
+        assert (stat.min_duration, stat.max_duration, stat.p50_duration, stat.p95_duration) == (1.0, 10.0, 5.0, 10.0)
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.cron import BEIJING_TZ, CRONTAB_FIELDS, compile_cron
+from app.scheduler import spread_cron_fields
+
+
+def _fields(expression):
+    return dict(zip(CRONTAB_FIELDS, expression.split()), second='0')
+
+
+def _hourly_fires(fields):
+    compiled = compile_cron(fields)
+    start = BEIJING_TZ.localize(datetime(2026, 1, 1, 10, 0))
+    return list(compiled.fire_times_between(start, start + timedelta(hours=1) - timedelta(seconds=1)))
+
+
+@pytest.mark.parametrize('step', range(1, 60))
+def test_spread_keeps_interval_schedules_valid(step):
+    fields = _fields(f'*/{step} * * * *')
+    expected = len(_hourly_fires(fields))
+    for task_id in range(1, 120):
+        spread = spread_cron_fields(task_id, fields)
+        fires = _hourly_fires(spread)
+        assert len(fires) == expected, (task_id, spread)
+        assert all(fire.second == int(spread['second']) for fire in fires)
+
+
+def test_spread_offsets_hourly_schedules_within_the_hour():
+    fields = _fields('0 */2 * * *')
+    offsets = set()
+    for task_id in range(1, 200):
+        spread = spread_cron_fields(task_id, fields)
+        assert spread['hour'] == '*/2'
+        fires = _hourly_fires(spread)
+        assert len(fires) == 1
+        offsets.add((fires[0].minute, fires[0].second))
+    # 相邻任务 ID 也应分散到不同的时刻
+    assert len(offsets) > 150
+
+
+def test_spread_is_stable_and_leaves_fixed_times_alone():
+    fields = _fields('*/15 * * * *')
+    assert spread_cron_fields(42, fields) == spread_cron_fields(42, fields)
+    fixed = _fields('30 2 * * *')
+    assert spread_cron_fields(42, fixed) == fixed
@@ -0,0 +1,104 @@
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, select
+
+from app import writebehind
+from app.models import StatCounter
+from app.writebehind import WriteBehindQueue
+
+metadata = MetaData()
+items = Table('items', metadata,
+              Column('id', Integer, primary_key=True),
+              Column('name', String(50), nullable=False),
+              Column('status', String(20)),
+              Column('output', String(200)))
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'wb.db'}")
+    metadata.create_all(engine)
+    StatCounter.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.execute(StatCounter.__table__.insert(), [{'name': 'runs', 'value': 0}, {'name': 'done', 'value': 0}])
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def queue(engine):
+    # 先入队再启动写线程，保证测试中提交的各组落在同一批次
+    queue = WriteBehindQueue(engine, linger=0.05)
+    yield queue
+    queue.shutdown()
+
+
+def _counters(engine):
+    table = StatCounter.__table__
+    with engine.connect() as conn:
+        return dict(conn.execute(select(table.c.name, table.c.value)).all())
+
+
+def _row(engine, pk):
+    with engine.connect() as conn:
+        return conn.execute(select(items).where(items.c.id == pk)).one()
+
+
+def test_groups_share_one_commit(engine, queue):
+    futures = [queue.submit(writebehind.insert(items, {'name': f'item{i}'}),
+                            writebehind.bump({'runs': 1}))
+               for i in range(10)]
+    queue.start()
+    pks = [future.result(5) for future in futures]
+
+    assert pks == sorted(pks) and len(set(pks)) == 10
+    assert queue.batches == 1 and queue.groups == 10
+    assert _counters(engine)['runs'] == 10
+
+
+def test_updates_to_the_same_row_are_merged(engine, queue):
+    pk = queue.submit(writebehind.insert(items, {'name': 'item'}))
+    queue.start()
+    pk = pk.result(5)
+
+    queue.submit(writebehind.update(items, pk, {'status': 'RUNNING'}))
+    queue.submit(writebehind.update(items, pk, {'output': 'hello'}))
+    queue.submit(writebehind.update(items, pk, {'status': 'SUCCESS'})).result(5)
+
+    row = _row(engine, pk)
+    assert (row.status, row.output) == ('SUCCESS', 'hello')
+
+
+def test_failed_group_does_not_affect_others(engine, queue):
+    good = queue.submit(writebehind.insert(items, {'name': 'good'}), writebehind.bump({'runs': 1}))
+    bad = queue.submit(writebehind.insert(items, {'name': None}), writebehind.bump({'runs': 1}))
+    also_good = queue.submit(writebehind.insert(items, {'name': 'also good'}), writebehind.bump({'runs': 1}))
+    queue.start()
+
+    assert good.result(5) and also_good.result(5)
+    with pytest.raises(Exception):
+        bad.result(5)
+    assert queue.failures == 1
+    # 失败组的计数器增量随其事务一起回滚
+    assert _counters(engine)['runs'] == 2
+
+
+def test_guarded_bump_skipped_when_row_is_gone(engine, queue):
+    queue.start()
+    pk = queue.submit(writebehind.insert(items, {'name': 'item'})).result(5)
+
+    queue.submit(writebehind.bump({'done': 1}, requires=(items, pk)))
+    queue.submit(writebehind.bump({'done': 1}, requires=(items, pk + 100)))
+    queue.submit(writebehind.bump({'runs': 1})).result(5)
+
+    assert _counters(engine) == {'runs': 1, 'done': 1}
+
+
+def test_shutdown_drains_and_later_writes_are_synchronous(engine, queue):
+    futures = [queue.submit(writebehind.bump({'runs': 1})) for _ in range(5)]
+    queue.start()
+    queue.shutdown()
+    assert all(future.done() for future in futures)
+
+    future = queue.submit(writebehind.bump({'runs': 1}))
+    assert future.done()
+    assert _counters(engine)['runs'] == 6